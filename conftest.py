@@ -1,2 +1,24 @@
+import pytest
+
 # Настройка для тестов
 pytest_plugins = ["pytest_django"]
+
+
+@pytest.fixture(autouse=True)
+def reset_connection_pools():
+    """Не переносить пулы соединений процесса (и моки pika/SMTP) между тестами"""
+    yield
+    from contacts.mailer import reset_mail_pool
+    from contacts.publisher import reset_publisher
+
+    reset_publisher()
+    reset_mail_pool()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Кэш в памяти процесса общий для всех тестов"""
+    yield
+    from django.core.cache import cache
+
+    cache.clear()
@@ -1,11 +1,28 @@
 from django.contrib import admin
 
-from .models import ContactRequest
+from .models import ContactRequest, ContactRequestBacklog, OutboxMessage
 
 
 @admin.register(ContactRequest)
 class ContactRequestAdmin(admin.ModelAdmin):
-    list_display = ["name", "email", "phone", "created_at", "processed"]
-    list_filter = ["processed", "created_at"]
+    list_display = ["name", "email", "phone", "created_at", "processed", "delivery_status"]
+    list_filter = ["processed", "delivery_status", "created_at"]
+    # icontains по этим полям обслуживают триграммные индексы (миграция 0006)
     search_fields = ["name", "email", "phone"]
-    readonly_fields = ["created_at"]
+    readonly_fields = ["created_at", "processed_at"]
+    # Полный COUNT(*) по таблице на каждой странице списка не нужен
+    show_full_result_count = False
+
+
+@admin.register(ContactRequestBacklog)
+class ContactRequestBacklogAdmin(ContactRequestAdmin):
+    """Необработанные запросы: читаются по частичному индексу contact_unprocessed_idx"""
+
+    list_filter = ["delivery_status", "created_at"]
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ["id", "queue", "created_at", "attempts", "last_error"]
+    list_filter = ["queue"]
+    readonly_fields = ["queue", "payload", "created_at", "attempts", "last_error"]
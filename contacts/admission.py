@@ -0,0 +1,301 @@
+"""
+Контроль допуска для ``POST /api/contacts/``: token bucket и сброс нагрузки.
+
+``AdmissionControlMiddleware`` проверяет запрос до сессий, CSRF и DRF, не
+читая тело, и отклоняет лишнее готовым маленьким ответом:
+
+- 503 - сброс нагрузки. Раз в ``CONTACT_SHED_CHECK_INTERVAL`` секунд процесс
+  одним ``COUNT`` по outbox измеряет задержку БД и число неопубликованных
+  событий, а из кэша берет глубину очереди RabbitMQ, которую записывает
+  воркер (``record_queue_depth``). Если задержка или очередь выше порогов, до
+  следующей проверки запросы отклоняются без обращений к БД и Redis.
+- 429 - token bucket на IP-адрес клиента и общий на всех. Адрес - ``REMOTE_ADDR``;
+  ``X-Forwarded-For`` учитывается, только если задано число доверенных прокси
+  ``CONTACT_THROTTLE_NUM_PROXIES``. Обе корзины
+  проверяются и списываются одним атомарным Lua-скриптом в Redis (время берется
+  у Redis, поэтому часы веб-серверов не влияют). Без ``REDIS_URL`` корзины
+  живут в памяти процесса. Если Redis недоступен, запрос пропускается: защита
+  от флуда не должна ронять прием заявок.
+
+Отказы считаются в ``olki_admission_rejected_total`` по причинам.
+"""
+
+import logging
+import math
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.http import JsonResponse
+from django.urls import reverse
+from redis.exceptions import RedisError
+
+from . import metrics
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+REASON_IP_RATE = "ip_rate"
+REASON_GLOBAL_RATE = "global_rate"
+REASON_BROKER_BACKLOG = "broker_backlog"
+REASON_DB_LATENCY = "db_latency"
+REASON_DB_UNAVAILABLE = "db_unavailable"
+
+GLOBAL_BUCKET_KEY = "throttle:contacts:global"
+
+# IPv6 с зоной укладывается в 64 символа; длиннее в ключ Redis не попадает
+MAX_IDENT_LENGTH = 64
+
+RATE_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# KEYS - ключи корзин; ARGV[1] - цена запроса, далее пары (токенов в секунду, емкость).
+# Возвращает {номер отказавшей корзины или 0, секунд до повтора}
+TOKEN_BUCKET_LUA = """
+local cost = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+local denied = 0
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < cost and (cost - tokens) / rate > wait then
+        wait = (cost - tokens) / rate
+        denied = i
+    end
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    local tokens = levels[i]
+    if denied == 0 then
+        tokens = tokens - cost
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000) + 1000)
+end
+return {denied, tostring(wait)}
+"""
+
+
+def client_ident(request):
+    """Адрес клиента для корзины
+
+    ``X-Forwarded-For`` присылает сам клиент, поэтому из него берется только адрес,
+    записанный последним из ``CONTACT_THROTTLE_NUM_PROXIES`` доверенных прокси.
+    """
+    ident = request.META.get("REMOTE_ADDR", "")
+    num_proxies = settings.CONTACT_THROTTLE_NUM_PROXIES
+    forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if num_proxies and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(",")]
+        ident = addresses[-min(num_proxies, len(addresses))]
+    return ident[:MAX_IDENT_LENGTH]
+
+
+def parse_rate(rate):
+    """``"10/m"`` или ``"10/min"`` -> токенов в секунду"""
+    count, period = rate.split("/")
+    return int(count) / RATE_PERIODS[period[0]]
+
+
+class RedisTokenBuckets:
+    """Корзины в Redis: проверка и списание всех корзин - один EVALSHA"""
+
+    def __init__(self, client):
+        self.script = client.register_script(TOKEN_BUCKET_LUA)
+
+    def take(self, buckets, cost=1):
+        """``buckets`` - ``[(ключ, токенов в секунду, емкость)]``
+
+        Возвращает ``(индекс отказавшей корзины или None, секунд до повтора)``;
+        токены списываются, только если пропускают все корзины.
+        """
+        args = [cost]
+        for _key, rate, capacity in buckets:
+            args += [rate, capacity]
+        denied, wait = self.script(keys=[key for key, _rate, _capacity in buckets], args=args)
+        denied = int(denied)
+        return (denied - 1 if denied else None), float(wait)
+
+
+class LocalTokenBuckets:
+    """Те же корзины в памяти процесса (без Redis, в разработке и тестах)"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.levels = {}
+
+    def take(self, buckets, cost=1):
+        with self.lock:
+            now = self.clock()
+            levels = []
+            denied, wait = None, 0.0
+            for index, (key, rate, capacity) in enumerate(buckets):
+                tokens, ts = self.levels.get(key, (capacity, now))
+                tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+                levels.append(tokens)
+                if tokens < cost and (cost - tokens) / rate > wait:
+                    denied, wait = index, (cost - tokens) / rate
+            for (key, _rate, _capacity), tokens in zip(buckets, levels, strict=True):
+                self.levels[key] = (tokens - cost if denied is None else tokens, now)
+            return denied, wait
+
+
+_token_buckets = None
+
+
+def get_token_buckets():
+    global _token_buckets
+    if _token_buckets is None:
+        if settings.REDIS_URL and not settings.TESTING:
+            client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.1)
+            _token_buckets = RedisTokenBuckets(client)
+        else:
+            _token_buckets = LocalTokenBuckets()
+    return _token_buckets
+
+
+def queue_depth_key(queue_name):
+    return f"admission:queue_depth:{queue_name}"
+
+
+def record_queue_depth(queue_name, depth):
+    """Сохранить глубину очереди для сброса нагрузки в веб-процессах (вызывает воркер)"""
+    try:
+        cache.set(queue_depth_key(queue_name), depth, timeout=settings.CONTACT_SHED_DEPTH_TTL)
+    except RedisError as e:
+        logger.warning("Queue depth not recorded: %r", e)
+
+
+class LoadShedder:
+    """Состояние перегрузки процесса, пересчитываемое не чаще раза в интервал"""
+
+    def __init__(self, check_interval=None, clock=time.monotonic):
+        self.check_interval = (
+            settings.CONTACT_SHED_CHECK_INTERVAL if check_interval is None else check_interval
+        )
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reason = None
+        self.checked_at = None
+
+    def check(self):
+        """Причина сброса нагрузки или ``None``"""
+        now = self.clock()
+        if self.checked_at is not None and now - self.checked_at < self.check_interval:
+            return self.reason
+        # Замеряет один поток, остальные до конца замера используют прошлый результат
+        if self.lock.acquire(blocking=False):
+            try:
+                self.reason = self.sample()
+                self.checked_at = self.clock()
+                metrics.ADMISSION_SHEDDING.set(0 if self.reason is None else 1)
+            finally:
+                self.lock.release()
+        return self.reason
+
+    def sample(self):
+        started = time.perf_counter()
+        try:
+            pending = OutboxMessage.objects.count()
+        except DatabaseError as e:
+            logger.warning("Load shedding probe failed: %r", e)
+            return REASON_DB_UNAVAILABLE
+        latency = time.perf_counter() - started
+        metrics.ADMISSION_DB_PROBE_LATENCY.observe(latency)
+        if settings.CONTACT_SHED_DB_LATENCY and latency > settings.CONTACT_SHED_DB_LATENCY:
+            return REASON_DB_LATENCY
+
+        try:
+            depth = cache.get(queue_depth_key(settings.RABBITMQ_QUEUE_NAME)) or 0
+        except RedisError:
+            depth = 0
+        if settings.CONTACT_SHED_BACKLOG and pending + depth > settings.CONTACT_SHED_BACKLOG:
+            return REASON_BROKER_BACKLOG
+        return None
+
+
+_load_shedder = None
+
+
+def get_load_shedder():
+    global _load_shedder
+    if _load_shedder is None:
+        _load_shedder = LoadShedder()
+    return _load_shedder
+
+
+def _reject(status, reason, retry_after, detail):
+    metrics.ADMISSION_REJECTED.labels(reason=reason).inc()
+    response = JsonResponse({"detail": detail}, status=status)
+    response["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def throttle(request):
+    """429-ответ, если у клиента или у всех кончились токены, иначе ``None``"""
+    buckets = [
+        (
+            f"throttle:contacts:ip:{client_ident(request)}",
+            parse_rate(settings.CONTACT_THROTTLE_IP_RATE),
+            settings.CONTACT_THROTTLE_IP_BURST,
+        ),
+        (
+            GLOBAL_BUCKET_KEY,
+            parse_rate(settings.CONTACT_THROTTLE_GLOBAL_RATE),
+            settings.CONTACT_THROTTLE_GLOBAL_BURST,
+        ),
+    ]
+    try:
+        denied, wait = get_token_buckets().take(buckets)
+    except RedisError as e:
+        metrics.ADMISSION_ERRORS.inc()
+        logger.warning("Throttle check failed, admitting the request: %r", e)
+        return None
+    if denied is None:
+        return None
+    reason = (REASON_IP_RATE, REASON_GLOBAL_RATE)[denied]
+    return _reject(429, reason, wait, "Too many requests, please retry later.")
+
+
+def admit(request):
+    """Ответ-отказ для запроса или ``None``, если запрос можно обрабатывать"""
+    reason = get_load_shedder().check()
+    if reason is not None:
+        return _reject(
+            503,
+            reason,
+            settings.CONTACT_SHED_CHECK_INTERVAL,
+            "The service is overloaded, please retry later.",
+        )
+    return throttle(request)
+
+
+class AdmissionControlMiddleware:
+    """Проверка ``POST /api/contacts/`` до сессий, CSRF и разбора тела в DRF"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.path = None
+
+    def __call__(self, request):
+        if request.method == "POST" and settings.CONTACT_ADMISSION_ENABLED:
+            if self.path is None:
+                self.path = reverse("contact-list")
+            if request.path_info == self.path:
+                with metrics.ADMISSION_LATENCY.time():
+                    rejection = admit(request)
+                if rejection is not None:
+                    return rejection
+        return self.get_response(request)
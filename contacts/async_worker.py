@@ -0,0 +1,357 @@
+"""
+Asyncio-движок воркера уведомлений (``runworker --engine asyncio``).
+
+Сообщения получаются через aio-pika, письма отправляются через aiosmtplib, а
+статусы запросов записываются асинхронным ORM Django. Все сообщения в
+обработке живут в одном event loop, поэтому их число ограничено prefetch, а
+не числом потоков. Очередь и семантика подтверждений те же, что у
+синхронного движка: ack после записи статуса, а упавшие сообщения уходят в
+очереди задержки и dead-letter очередь ``contacts.retries``.
+"""
+
+import asyncio
+import json
+import logging
+import signal
+import time
+from collections import defaultdict
+
+import aio_pika
+import aiosmtplib
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics
+from .admission import record_queue_depth
+from .dedup import KIND_SERVICE_NOTIFICATION, KIND_THANK_YOU, adeliver_once, get_dedup_store
+from .emails import service_notification, thank_you_email
+from .models import ContactRequest
+from .retries import contact_request_id_from
+from .status_updates import amark_processed, observe_end_to_end_lag
+
+logger = logging.getLogger(__name__)
+
+SMTP_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+
+
+class AsyncMailer:
+    """Пул постоянных aiosmtplib-соединений.
+
+    Если настроен не SMTP backend (console, locmem), письма отправляются этим
+    backend в пуле потоков, чтобы движок работал и в разработке, и в тестах.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or settings.EMAIL_POOL_SIZE
+        self.use_smtp = settings.EMAIL_BACKEND == SMTP_BACKEND
+        self._clients = None
+
+    async def send(self, email_message):
+        if not self.use_smtp:
+            await sync_to_async(email_message.send, thread_sensitive=False)()
+            return
+
+        client = await self._acquire()
+        try:
+            for attempt in (1, 2):
+                try:
+                    await self._ensure_connected(client)
+                    started = time.perf_counter()
+                    await client.send_message(
+                        email_message.message(),
+                        sender=email_message.from_email,
+                        recipients=email_message.recipients(),
+                    )
+                except aiosmtplib.SMTPServerDisconnected as e:
+                    metrics.SMTP_SEND_ERRORS.inc()
+                    client.close()
+                    if attempt == 2:
+                        raise
+                    logger.warning("SMTP session dropped, reconnecting: %r", e)
+                except Exception:
+                    metrics.SMTP_SEND_ERRORS.inc()
+                    raise
+                else:
+                    metrics.SMTP_SEND_LATENCY.observe(time.perf_counter() - started)
+                    metrics.SMTP_MESSAGES_SENT.inc()
+                    return
+        finally:
+            self._clients.put_nowait(client)
+
+    async def close(self):
+        if self._clients is None:
+            return
+        while not self._clients.empty():
+            client = self._clients.get_nowait()
+            if client.is_connected:
+                try:
+                    await client.quit()
+                except aiosmtplib.SMTPException:
+                    client.close()
+
+    async def _acquire(self):
+        if self._clients is None:
+            self._clients = asyncio.Queue()
+            for _ in range(self.size):
+                self._clients.put_nowait(
+                    aiosmtplib.SMTP(
+                        hostname=settings.EMAIL_HOST,
+                        port=settings.EMAIL_PORT,
+                        # EMAIL_USE_SSL - неявный TLS (порт 465), EMAIL_USE_TLS - STARTTLS
+                        use_tls=settings.EMAIL_USE_SSL,
+                        start_tls=settings.EMAIL_USE_TLS,
+                        timeout=settings.EMAIL_TIMEOUT,
+                    )
+                )
+        return await self._clients.get()
+
+    async def _ensure_connected(self, client):
+        if client.is_connected:
+            metrics.SMTP_CONNECTION_REUSES.inc()
+            return
+        await client.connect()
+        if settings.EMAIL_HOST_USER:
+            await client.login(settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD)
+        metrics.SMTP_CONNECTIONS_OPENED.inc()
+
+
+class AsyncStatusBuffer:
+    """Копит обработанные сообщения и подтверждает их после одного UPDATE"""
+
+    def __init__(self, max_size=None, max_delay=None, digest=None):
+        self.max_size = max_size or settings.WORKER_STATUS_BATCH_SIZE
+        self.max_delay = settings.WORKER_STATUS_FLUSH_INTERVAL if max_delay is None else max_delay
+        self.digest = digest
+        self.pending = []
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, message, contact_request_id, status=ContactRequest.DeliveryStatus.SENT):
+        self.pending.append((message, contact_request_id, status))
+
+    async def flush(self):
+        async with self._lock:
+            pending, self.pending = self.pending, []
+            if not pending:
+                return
+            ids_by_status = defaultdict(list)
+            for _message, contact_request_id, status in pending:
+                if contact_request_id is not None:
+                    ids_by_status[status].append(contact_request_id)
+            sent_ids = ids_by_status.get(ContactRequest.DeliveryStatus.SENT)
+            try:
+                await sync_to_async(close_old_connections)()
+                if self.digest is not None and sent_ids:
+                    with metrics.WORKER_STAGE_LATENCY.labels(stage="digest").time():
+                        await self.digest.asend(sent_ids)
+                with metrics.WORKER_STAGE_LATENCY.labels(stage="status_update").time():
+                    for status, ids in ids_by_status.items():
+                        await amark_processed(ids, status)
+            except Exception as e:
+                # Сообщения останутся неподтвержденными до следующей попытки
+                logger.error("Error writing contact request statuses: %r", e)
+                self.pending = pending + self.pending
+                return
+            metrics.WORKER_STATUS_UPDATES.inc()
+            metrics.WORKER_STATUS_BATCH_SIZE.observe(len(pending))
+            for message, _contact_request_id, _status in pending:
+                await message.ack()
+                metrics.WORKER_MESSAGES_ACKED.inc()
+
+
+class AsyncWorker:
+    """Консьюмер очереди уведомлений на одном event loop"""
+
+    def __init__(
+        self,
+        prefetch=None,
+        status_buffer=None,
+        mailer=None,
+        retry_policy=None,
+        dedup=None,
+        queue_depth_interval=None,
+        stdout=None,
+    ):
+        self.status_buffer = AsyncStatusBuffer() if status_buffer is None else status_buffer
+        self.prefetch = prefetch or self.status_buffer.max_size
+        self.mailer = mailer or AsyncMailer()
+        self.retry_policy = retry_policy
+        self.dedup = dedup or get_dedup_store()
+        self.queue_depth_interval = queue_depth_interval
+        self.stdout = stdout
+        self.channel = None
+        self.tasks = set()
+        self.stopping = None
+
+    async def run(self):
+        """Обрабатывать сообщения до ``stop()``, переподключаясь при ошибках соединения"""
+        self.stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop)
+        try:
+            while not self.stopping.is_set():
+                try:
+                    await self.consume()
+                except (aio_pika.exceptions.AMQPConnectionError, OSError):
+                    if self.stopping.is_set():
+                        break
+                    self.write("RabbitMQ connection failed. Retrying in 5 seconds...")
+                    await asyncio.sleep(5)
+        finally:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(signum)
+            await self.mailer.close()
+
+    def stop(self):
+        self.stopping.set()
+
+    async def consume(self):
+        connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
+        async with connection:
+            channel = self.channel = await connection.channel()
+            await channel.set_qos(prefetch_count=self.prefetch)
+            queue = await channel.declare_queue(settings.RABBITMQ_QUEUE_NAME, durable=True)
+            if self.retry_policy is not None:
+                for name, arguments in self.retry_policy.queues():
+                    await channel.declare_queue(name, durable=True, arguments=arguments)
+            consumer_tag = await queue.consume(self.on_message)
+            background = [asyncio.create_task(self.flush_periodically())]
+            if self.queue_depth_interval:
+                background.append(
+                    asyncio.create_task(self.sample_queue_depth_periodically(connection))
+                )
+            self.write("Waiting for messages. To exit press CTRL+C")
+
+            await self.stopping.wait()
+
+            # Перестаем брать сообщения и дообрабатываем полученные
+            await queue.cancel(consumer_tag)
+            if self.tasks:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+            for task in background:
+                task.cancel()
+            await self.status_buffer.flush()
+
+    async def on_message(self, message):
+        metrics.WORKER_MESSAGES_CONSUMED.inc()
+        task = asyncio.create_task(self.process(message))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def process(self, message):
+        try:
+            with metrics.WORKER_STAGE_LATENCY.labels(stage="decode").time():
+                data = json.loads(message.body)
+            # Отбрасываем соединения с БД, которые сервер закрыл, пока воркер простаивал
+            # (ORM работает в потоке sync_to_async, там же и проверяем)
+            await sync_to_async(close_old_connections)()
+            contact_request_id = await self.process_message(data)
+        except Exception as e:
+            self.write(f"Error processing message: {e}")
+            if self.retry_policy is None:
+                await message.nack(requeue=False)
+                metrics.WORKER_MESSAGES_NACKED.inc()
+                return
+            if not await self.reschedule(message, e):
+                await message.ack()
+                metrics.WORKER_MESSAGES_ACKED.inc()
+                return
+            self.status_buffer.add(
+                message,
+                contact_request_id_from(message.body),
+                ContactRequest.DeliveryStatus.FAILED,
+            )
+        else:
+            self.status_buffer.add(message, contact_request_id)
+
+        buffered = len(self.status_buffer)
+        if buffered >= self.status_buffer.max_size or buffered + len(self.tasks) > self.prefetch:
+            await self.status_buffer.flush()
+
+    async def reschedule(self, message, error):
+        """Опубликовать копию сообщения на следующий уровень повтора, вернуть True для DLQ"""
+        routing_key, headers, dead = self.retry_policy.route(message.headers, error)
+        await self.channel.default_exchange.publish(
+            aio_pika.Message(
+                message.body,
+                headers=headers,
+                content_type=message.content_type or "application/json",
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=routing_key,
+        )
+        return dead
+
+    async def process_message(self, data):
+        """Отправить письма параллельно (кроме уже отправленных) и вернуть id запроса.
+
+        В режиме сводки уведомление сервисным учеткам отправит буфер статусов.
+        """
+        contact_request_id = data.get("contact_request_id")
+        name = data.get("name")
+        email = data.get("email")
+        thank_you = thank_you_email(name, email)
+        deliveries = [
+            adeliver_once(
+                self.dedup,
+                contact_request_id,
+                KIND_THANK_YOU,
+                lambda: self.send(thank_you, "thank_you"),
+            )
+        ]
+        if self.status_buffer.digest is None or contact_request_id is None:
+            notification = service_notification(
+                name, email, data.get("phone", ""), data.get("message", "")
+            )
+            deliveries.append(
+                adeliver_once(
+                    self.dedup,
+                    contact_request_id,
+                    KIND_SERVICE_NOTIFICATION,
+                    lambda: self.send(notification, "service_notification"),
+                )
+            )
+        # Дожидаемся всех писем: при сбое одного остальные не бросаются недоотправленными,
+        # а их маркеры дедупликации успевают закрыться
+        for result in await asyncio.gather(*deliveries, return_exceptions=True):
+            if isinstance(result, BaseException):
+                raise result
+        observe_end_to_end_lag(data.get("created_at"))
+        return contact_request_id
+
+    async def send(self, email_message, stage):
+        with metrics.WORKER_STAGE_LATENCY.labels(stage=stage).time():
+            await self.mailer.send(email_message)
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.status_buffer.max_delay)
+            await self.status_buffer.flush()
+
+    async def sample_queue_depth_periodically(self, connection):
+        """Записывать глубину очередей пассивным declare на отдельном канале"""
+        queue_names = [settings.RABBITMQ_QUEUE_NAME]
+        if self.retry_policy is not None:
+            queue_names += [name for name, _arguments in self.retry_policy.queues()]
+        channel = await connection.channel()
+        try:
+            while True:
+                for queue_name in queue_names:
+                    queue = await channel.declare_queue(queue_name, passive=True)
+                    metrics.WORKER_QUEUE_DEPTH.labels(queue=queue_name).set(
+                        queue.declaration_result.message_count
+                    )
+                    await sync_to_async(record_queue_depth)(
+                        queue_name, queue.declaration_result.message_count
+                    )
+                await asyncio.sleep(self.queue_depth_interval)
+        except aio_pika.exceptions.AMQPError as e:
+            logger.warning("Queue depth sampling failed: %r", e)
+
+    def write(self, text):
+        if self.stdout is not None:
+            self.stdout.write(text)
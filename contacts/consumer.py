@@ -0,0 +1,257 @@
+"""
+Консьюмер RabbitMQ с пулом исполнителей.
+
+Сообщения обрабатываются в пуле потоков или процессов, а подтверждения
+(ack/nack) всегда отправляются из потока соединения: BlockingConnection не
+потокобезопасен, поэтому результаты возвращаются в него через
+``add_callback_threadsafe``. Число сообщений в обработке ограничено
+``prefetch``: брокер не выдает больше неподтвержденных сообщений.
+
+Если задан ``status_buffer``, успешно обработанные сообщения подтверждаются
+не сразу, а пачкой после записи их статусов в БД. Если задан ``retry_policy``,
+упавшие сообщения переносятся в очереди задержки или dead-letter очередь
+(см. ``contacts.retries``) вместо отбрасывания. Если задан
+``queue_depth_interval``, консьюмер периодически записывает глубину своих
+очередей в метрику ``olki_worker_queue_depth`` пассивным ``queue_declare``
+и в кэш для сброса нагрузки в веб-процессах (``contacts.admission``).
+"""
+
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pika
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from . import metrics
+from .admission import record_queue_depth
+from .models import ContactRequest
+from .retries import contact_request_id_from
+
+logger = logging.getLogger(__name__)
+
+POOL_THREAD = "thread"
+POOL_PROCESS = "process"
+POOL_CHOICES = [POOL_THREAD, POOL_PROCESS]
+
+
+# Соединения с БД, унаследованные дочерним процессом пула. Ссылки держим до выхода
+# процесса (пул завершает его через os._exit): иначе сборщик мусора закроет их
+_inherited_connections = []
+
+
+def _init_process_worker():
+    # Унаследованные при fork соединения с БД нельзя ни использовать, ни закрывать:
+    # psycopg2 при закрытии отправляет Terminate по общему сокету и завершает сессию
+    # родителя. Забываем их, дочерний процесс откроет свои
+    for connection in connections.all(initialized_only=True):
+        if connection.connection is not None:
+            _inherited_connections.append(connection.connection)
+            connection.connection = None
+
+
+def _run_handler(handler, body):
+    # Отбрасываем соединения с БД, которые сервер закрыл, пока поток простаивал
+    close_old_connections()
+    return handler(body)
+
+
+class Consumer:
+    """Получает сообщения из очереди и обрабатывает их ``handler(body)``"""
+
+    def __init__(
+        self,
+        handler,
+        queue_name=None,
+        concurrency=1,
+        prefetch=None,
+        pool=POOL_THREAD,
+        url=None,
+        status_buffer=None,
+        retry_policy=None,
+        queue_depth_interval=None,
+    ):
+        self.handler = handler
+        self.queue_name = queue_name or settings.RABBITMQ_QUEUE_NAME
+        self.concurrency = max(1, concurrency)
+        self.status_buffer = status_buffer
+        self.retry_policy = retry_policy
+        self.queue_depth_interval = queue_depth_interval
+        # Буферизованные сообщения тоже занимают prefetch, поэтому по умолчанию
+        # окно вмещает целую пачку статусов
+        batch_size = status_buffer.max_size if status_buffer is not None else 1
+        self.prefetch = prefetch or max(self.concurrency, batch_size)
+        self.pool = pool
+        self.parameters = pika.URLParameters(url or settings.RABBITMQ_URL)
+
+        self.connection = None
+        self.channel = None
+        self.stats_channel = None
+        self.executor = None
+        self.in_flight = 0
+        self.stopping = False
+
+    def run(self):
+        """Подключиться и обрабатывать сообщения до вызова ``stop()``"""
+        self.connection = pika.BlockingConnection(self.parameters)
+        try:
+            self.channel = self.connection.channel()
+            self.channel.queue_declare(queue=self.queue_name, durable=True)
+            if self.retry_policy is not None:
+                self.retry_policy.declare(self.channel)
+            self.channel.basic_qos(prefetch_count=self.prefetch)
+            self.executor = self._create_executor()
+            self.channel.basic_consume(queue=self.queue_name, on_message_callback=self.on_message)
+            if self.status_buffer is not None:
+                self.connection.call_later(self.status_buffer.max_delay, self._on_flush_timer)
+            if self.queue_depth_interval:
+                self.connection.call_later(0, self._on_queue_depth_timer)
+            if not self.stopping:
+                self.channel.start_consuming()
+            self._drain()
+        finally:
+            self._close()
+
+    def stop(self):
+        """Перестать принимать сообщения и дождаться обработки уже полученных.
+
+        Безопасно вызывать из обработчика сигнала или другого потока.
+        """
+        self.stopping = True
+        if self.connection is not None and self.connection.is_open:
+            self.connection.add_callback_threadsafe(self._stop_consuming)
+
+    def on_message(self, _channel, method, properties, body):
+        metrics.WORKER_MESSAGES_CONSUMED.inc()
+        if self.executor is None:
+            try:
+                result = _run_handler(self.handler, body)
+            except Exception as e:
+                self.settle(method.delivery_tag, None, e, body, properties)
+            else:
+                self.settle(method.delivery_tag, result, None)
+            return
+
+        self.in_flight += 1
+        future = self.executor.submit(_run_handler, self.handler, body)
+        future.add_done_callback(
+            functools.partial(self._on_done, method.delivery_tag, body, properties)
+        )
+
+    def settle(self, delivery_tag, result, error, body=None, properties=None):
+        """Подтвердить сообщение (вызывается только в потоке соединения)"""
+        status = ContactRequest.DeliveryStatus.SENT
+        if error is not None:
+            logger.error("Error processing message %s: %r", delivery_tag, error)
+            if self.retry_policy is None:
+                self.channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+                metrics.WORKER_MESSAGES_NACKED.inc()
+                return
+            dead = self.retry_policy.reschedule(self.channel, body, properties, error)
+            if not dead or self.status_buffer is None:
+                self._ack(delivery_tag)
+                return
+            # Запрос больше не будет обработан: записываем статус failed вместе с остальными
+            result, status = contact_request_id_from(body), ContactRequest.DeliveryStatus.FAILED
+
+        if self.status_buffer is None:
+            self._ack(delivery_tag)
+        else:
+            self.status_buffer.add(delivery_tag, result, status)
+            buffered = len(self.status_buffer)
+            # Если окно prefetch заполнено, новых сообщений не будет до подтверждения
+            if (
+                buffered >= self.status_buffer.max_size
+                or buffered + self.in_flight >= self.prefetch
+            ):
+                self.flush()
+
+    def flush(self):
+        """Записать накопленные статусы в БД и подтвердить их сообщения"""
+        if self.status_buffer is None or not len(self.status_buffer):
+            return
+        try:
+            close_old_connections()
+            delivery_tags = self.status_buffer.flush()
+        except Exception as e:
+            # Статусы остаются в буфере до следующей попытки
+            logger.error("Error writing contact request statuses: %r", e)
+            return
+        if self.channel is not None and self.channel.is_open:
+            for delivery_tag in delivery_tags:
+                self._ack(delivery_tag)
+
+    def sample_queue_depth(self):
+        """Записать число готовых сообщений в основной очереди, очередях повторов и DLQ"""
+        queue_names = [self.queue_name]
+        if self.retry_policy is not None:
+            queue_names += [name for name, _arguments in self.retry_policy.queues()]
+        try:
+            # Отдельный канал: ошибка passive declare закрывает канал, но не консьюмер
+            if self.stats_channel is None or not self.stats_channel.is_open:
+                self.stats_channel = self.connection.channel()
+            for queue_name in queue_names:
+                declared = self.stats_channel.queue_declare(queue=queue_name, passive=True)
+                metrics.WORKER_QUEUE_DEPTH.labels(queue=queue_name).set(
+                    declared.method.message_count
+                )
+                record_queue_depth(queue_name, declared.method.message_count)
+        except pika.exceptions.ChannelClosed as e:
+            logger.warning("Queue depth sampling failed: %r", e)
+            self.stats_channel = None
+
+    def _ack(self, delivery_tag):
+        self.channel.basic_ack(delivery_tag=delivery_tag)
+        metrics.WORKER_MESSAGES_ACKED.inc()
+
+    def _on_flush_timer(self):
+        self.flush()
+        if self.connection.is_open:
+            self.connection.call_later(self.status_buffer.max_delay, self._on_flush_timer)
+
+    def _on_queue_depth_timer(self):
+        self.sample_queue_depth()
+        if self.connection.is_open:
+            self.connection.call_later(self.queue_depth_interval, self._on_queue_depth_timer)
+
+    def _on_done(self, delivery_tag, body, properties, future):
+        # Выполняется в потоке пула: передаем результат в поток соединения
+        self.connection.add_callback_threadsafe(
+            functools.partial(self._complete, delivery_tag, body, properties, future)
+        )
+
+    def _complete(self, delivery_tag, body, properties, future):
+        self.in_flight -= 1
+        error = future.exception()
+        self.settle(delivery_tag, None if error else future.result(), error, body, properties)
+
+    def _create_executor(self):
+        if self.concurrency == 1:
+            return None
+        if self.pool == POOL_PROCESS:
+            return ProcessPoolExecutor(
+                max_workers=self.concurrency,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_process_worker,
+            )
+        return ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="runworker")
+
+    def _stop_consuming(self):
+        if self.channel is not None and self.channel.is_open:
+            self.channel.stop_consuming()
+
+    def _drain(self):
+        """Дождаться завершения задач в пуле, продолжая обслуживать соединение"""
+        while self.in_flight and self.connection.is_open:
+            self.connection.process_data_events(time_limit=0.1)
+
+    def _close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        # Письма уже отправлены: записываем статусы, даже если подтвердить сообщения нельзя
+        self.flush()
+        if self.connection.is_open:
+            self.connection.close()
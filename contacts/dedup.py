@@ -0,0 +1,202 @@
+"""
+Дедупликация писем воркера при повторной доставке сообщений.
+
+Если воркер упал между отправкой письма и ``basic_ack``, брокер доставит
+сообщение еще раз. Перед отправкой каждого письма воркер занимает маркер
+``(contact_request_id, вид письма)`` одной атомарной операцией (``SET NX`` в
+Redis через кэш Django или INSERT в таблицу маркеров):
+
+- маркер занят - письмо отправляется, после отправки маркер становится ``done``;
+- маркер ``done`` - письмо уже отправлено, дубликат пропускается без SMTP;
+- маркер ``in_progress`` - письмо сейчас отправляет другой обработчик (или
+  упавший воркер не успел снять маркер), сообщение уходит на повтор и будет
+  обработано после истечения короткого TTL маркера.
+
+Если Redis недоступен, операции выполняются через таблицу маркеров в БД.
+"""
+
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from . import metrics
+from .models import NotificationMarker
+
+logger = logging.getLogger(__name__)
+
+KIND_THANK_YOU = "thank_you"
+KIND_SERVICE_NOTIFICATION = "service_notification"
+
+CLAIMED = "claimed"
+IN_PROGRESS = NotificationMarker.State.IN_PROGRESS.value
+DONE = NotificationMarker.State.DONE.value
+
+
+class NotificationInProgress(Exception):
+    """Письмо сейчас отправляет другой обработчик, сообщение нужно повторить позже"""
+
+
+class CacheDedupStore:
+    """Маркеры в кэше Django (Redis): ``add`` атомарен и стоит один запрос"""
+
+    def __init__(self, cache_backend=None, in_progress_ttl=None, done_ttl=None):
+        self.cache = cache_backend or cache
+        self.in_progress_ttl = in_progress_ttl or settings.DEDUP_IN_PROGRESS_TTL
+        self.done_ttl = done_ttl or settings.DEDUP_DONE_TTL
+
+    @staticmethod
+    def key(contact_request_id, kind):
+        return f"dedup:{kind}:{contact_request_id}"
+
+    def claim(self, contact_request_id, kind):
+        key = self.key(contact_request_id, kind)
+        if self.cache.add(key, IN_PROGRESS, self.in_progress_ttl):
+            return CLAIMED
+        return DONE if self.cache.get(key) == DONE else IN_PROGRESS
+
+    def complete(self, contact_request_id, kind):
+        self.cache.set(self.key(contact_request_id, kind), DONE, self.done_ttl)
+
+    def release(self, contact_request_id, kind):
+        self.cache.delete(self.key(contact_request_id, kind))
+
+
+class DatabaseDedupStore:
+    """Маркеры в таблице ``NotificationMarker`` с уникальным ключом"""
+
+    def __init__(self, in_progress_ttl=None, done_ttl=None):
+        self.in_progress_ttl = in_progress_ttl or settings.DEDUP_IN_PROGRESS_TTL
+        self.done_ttl = done_ttl or settings.DEDUP_DONE_TTL
+
+    def claim(self, contact_request_id, kind):
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.in_progress_ttl)
+        try:
+            with transaction.atomic():
+                NotificationMarker.objects.create(
+                    contact_request_id=contact_request_id,
+                    kind=kind,
+                    state=IN_PROGRESS,
+                    expires_at=expires_at,
+                )
+            return CLAIMED
+        except IntegrityError:
+            pass
+
+        markers = NotificationMarker.objects.filter(
+            contact_request_id=contact_request_id, kind=kind
+        )
+        # Истекший маркер забираем условным UPDATE, чтобы его получил только один обработчик
+        if markers.filter(expires_at__lte=now).update(state=IN_PROGRESS, expires_at=expires_at):
+            return CLAIMED
+        state = markers.values_list("state", flat=True).first()
+        return DONE if state == DONE else IN_PROGRESS
+
+    def complete(self, contact_request_id, kind):
+        NotificationMarker.objects.update_or_create(
+            contact_request_id=contact_request_id,
+            kind=kind,
+            defaults={
+                "state": DONE,
+                "expires_at": timezone.now() + timedelta(seconds=self.done_ttl),
+            },
+        )
+
+    def release(self, contact_request_id, kind):
+        NotificationMarker.objects.filter(
+            contact_request_id=contact_request_id, kind=kind, state=IN_PROGRESS
+        ).delete()
+
+    def purge_expired(self):
+        """Удалить истекшие маркеры, вернуть их число"""
+        deleted, _ = NotificationMarker.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class DedupStore:
+    """Хранилище маркеров: основное (Redis) с fallback в БД при его недоступности"""
+
+    def __init__(self, primary=None, fallback=None):
+        self.primary = primary
+        self.fallback = fallback or DatabaseDedupStore()
+
+    def claim(self, contact_request_id, kind):
+        return self._call("claim", contact_request_id, kind)
+
+    def complete(self, contact_request_id, kind):
+        self._call("complete", contact_request_id, kind)
+
+    def release(self, contact_request_id, kind):
+        self._call("release", contact_request_id, kind)
+
+    def _call(self, method, *args):
+        if self.primary is not None:
+            try:
+                return getattr(self.primary, method)(*args)
+            except (RedisError, OSError) as e:
+                metrics.DEDUP_FALLBACKS.inc()
+                logger.warning("Dedup cache unavailable, using the database: %r", e)
+        return getattr(self.fallback, method)(*args)
+
+
+def get_dedup_store():
+    """Вернуть хранилище маркеров согласно ``DEDUP_BACKEND``"""
+    primary = CacheDedupStore() if settings.DEDUP_BACKEND == "redis" else None
+    return DedupStore(primary=primary)
+
+
+def _skip(contact_request_id, kind, state):
+    metrics.DEDUP_SKIPPED.labels(kind=kind, state=state).inc()
+    if state == IN_PROGRESS:
+        raise NotificationInProgress(
+            f"{kind} for ContactRequest {contact_request_id} is in progress"
+        )
+    logger.info("Skipping duplicate %s for ContactRequest %s", kind, contact_request_id)
+
+
+def deliver_once(store, contact_request_id, kind, send):
+    """Вызвать ``send()``, если письмо этого вида по запросу еще не отправлялось.
+
+    Возвращает False, если письмо уже отправлено, и выбрасывает
+    ``NotificationInProgress``, если его сейчас отправляет другой обработчик.
+    """
+    if contact_request_id is None:
+        send()
+        return True
+
+    state = store.claim(contact_request_id, kind)
+    if state != CLAIMED:
+        _skip(contact_request_id, kind, state)
+        return False
+    try:
+        send()
+    except BaseException:
+        store.release(contact_request_id, kind)
+        raise
+    store.complete(contact_request_id, kind)
+    return True
+
+
+async def adeliver_once(store, contact_request_id, kind, send):
+    """Асинхронный вариант ``deliver_once``: ``send`` - корутинная функция"""
+    if contact_request_id is None:
+        await send()
+        return True
+
+    state = await sync_to_async(store.claim)(contact_request_id, kind)
+    if state != CLAIMED:
+        _skip(contact_request_id, kind, state)
+        return False
+    try:
+        await send()
+    except BaseException:
+        await sync_to_async(store.release)(contact_request_id, kind)
+        raise
+    await sync_to_async(store.complete)(contact_request_id, kind)
+    return True
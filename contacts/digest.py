@@ -0,0 +1,92 @@
+"""
+Сводные уведомления сервисным учеткам.
+
+В режиме сводки воркер сразу отправляет только письмо с благодарностью
+клиенту, а уведомления о новых запросах копит вместе со статусами в буфере
+(``StatusUpdateBuffer``/``AsyncStatusBuffer``). При сбросе буфера по размеру,
+таймеру или остановке воркера все запросы пачки уходят одним письмом на
+``SERVICE_EMAIL``; сообщения подтверждаются только после отправки сводки и
+записи статусов, поэтому при падении воркера они будут доставлены повторно.
+Уже попавшие в отправленную сводку запросы отсекаются маркерами дедупликации.
+"""
+
+from asgiref.sync import sync_to_async
+
+from . import metrics
+from .dedup import CLAIMED, DONE, KIND_SERVICE_NOTIFICATION, get_dedup_store
+from .emails import service_digest
+from .mailer import get_mail_pool
+from .models import ContactRequest
+
+
+def _send_with_mail_pool(email_message):
+    get_mail_pool().send_messages([email_message])
+
+
+class ServiceDigest:
+    """Сборка и отправка сводки по пачке обработанных запросов"""
+
+    def __init__(self, send_email=None, asend_email=None, dedup=None):
+        self.send_email = send_email or _send_with_mail_pool
+        self.asend_email = asend_email
+        self.dedup = dedup or get_dedup_store()
+
+    def prepare(self, contact_request_ids):
+        """Вернуть письмо-сводку и id запросов: вошедших в нее и занятых ею
+
+        Письмо - None, если слать нечего. Маркеры из второго списка заняла эта
+        сводка, при сбое отправки снимаются только они.
+        """
+        included, claimed = [], []
+        for contact_request_id in dict.fromkeys(contact_request_ids):
+            state = self.dedup.claim(contact_request_id, KIND_SERVICE_NOTIFICATION)
+            # Маркер in_progress оставляем в сводке: его владелец мог упасть, а дубль
+            # строки в сводке лучше потерянного запроса. Снимать такой маркер при сбое
+            # нельзя - он чужой
+            if state == DONE:
+                continue
+            included.append(contact_request_id)
+            if state == CLAIMED:
+                claimed.append(contact_request_id)
+        contact_requests = list(ContactRequest.objects.filter(id__in=included).order_by("id"))
+        if not contact_requests:
+            return None, included, claimed
+        return service_digest(contact_requests), included, claimed
+
+    def finish(self, included, claimed, sent):
+        if sent:
+            for contact_request_id in included:
+                self.dedup.complete(contact_request_id, KIND_SERVICE_NOTIFICATION)
+            metrics.WORKER_DIGESTS_SENT.inc()
+            metrics.WORKER_DIGEST_SIZE.observe(len(included))
+        else:
+            for contact_request_id in claimed:
+                self.dedup.release(contact_request_id, KIND_SERVICE_NOTIFICATION)
+
+    def send(self, contact_request_ids):
+        """Отправить сводку по запросам, вернуть число запросов в ней"""
+        email_message, included, claimed = self.prepare(contact_request_ids)
+        if email_message is None:
+            self.finish(included, claimed, sent=False)
+            return 0
+        try:
+            self.send_email(email_message)
+        except BaseException:
+            self.finish(included, claimed, sent=False)
+            raise
+        self.finish(included, claimed, sent=True)
+        return len(included)
+
+    async def asend(self, contact_request_ids):
+        """Асинхронный вариант ``send`` через ``asend_email``"""
+        email_message, included, claimed = await sync_to_async(self.prepare)(contact_request_ids)
+        if email_message is None:
+            await sync_to_async(self.finish)(included, claimed, sent=False)
+            return 0
+        try:
+            await self.asend_email(email_message)
+        except BaseException:
+            await sync_to_async(self.finish)(included, claimed, sent=False)
+            raise
+        await sync_to_async(self.finish)(included, claimed, sent=True)
+        return len(included)
@@ -0,0 +1,54 @@
+"""Письма, которые воркер отправляет по запросу на контакт"""
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+
+def thank_you_email(name, email):
+    """Письмо с благодарностью пользователю"""
+    subject = "Спасибо за ваш запрос!"
+    message = f"""
+Здравствуйте, {name}!
+
+Спасибо за ваш интерес к нашей продукции. Мы получили ваш запрос и свяжемся с вами в ближайшее время.
+
+С уважением,
+Команда OLKI Paint
+        """
+    return EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [email])
+
+
+def service_notification(name, email, phone, user_message):
+    """Уведомление сервисным учеткам о новом заказе"""
+    subject = f"Новый запрос на контакт от {name}"
+    message = f"""
+Поступил новый запрос на контакт:
+
+Имя: {name}
+Email: {email}
+Телефон: {phone or "не указан"}
+Сообщение: {user_message or "не указано"}
+
+Пожалуйста, свяжитесь с клиентом в ближайшее время.
+        """
+    return EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [settings.SERVICE_EMAIL])
+
+
+def service_digest(contact_requests):
+    """Сводное уведомление сервисным учеткам о нескольких новых запросах"""
+    subject = f"Новые запросы на контакт: {len(contact_requests)}"
+    entries = "\n\n".join(
+        f"""{number}. {contact_request.name}
+Email: {contact_request.email}
+Телефон: {contact_request.phone or "не указан"}
+Сообщение: {contact_request.message or "не указано"}"""
+        for number, contact_request in enumerate(contact_requests, start=1)
+    )
+    message = f"""
+Поступили новые запросы на контакт:
+
+{entries}
+
+Пожалуйста, свяжитесь с клиентами в ближайшее время.
+        """
+    return EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [settings.SERVICE_EMAIL])
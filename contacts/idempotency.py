@@ -0,0 +1,152 @@
+"""
+Повторы ``POST /api/contacts/``: Idempotency-Key и схлопывание дублей.
+
+Двойной клик и повтор запроса мобильным клиентом не должны создавать второй
+запрос на контакт, второе событие в outbox и еще два письма. Перед созданием
+``Submission`` одним ``GET`` из кэша (Redis) ищет сохраненный ответ:
+
+- с заголовком ``Idempotency-Key`` ответ хранится ``CONTACT_IDEMPOTENCY_TTL``
+  секунд и отдается на любой повтор с тем же ключом. Тот же ключ с другим телом -
+  422, повтор во время выполнения первого запроса - 409;
+- без ключа одинаковые (email, хэш сообщения) в течение
+  ``CONTACT_DUPLICATE_WINDOW`` секунд схлопываются в уже созданный запрос.
+
+Первый запрос занимает ключ атомарным ``add`` со статусом ``in_progress`` и
+коротким TTL (упавший процесс не заблокирует ключ надолго). Повторенный ответ
+помечается заголовком ``Idempotent-Replayed: true``. Если Redis недоступен,
+запрос выполняется как обычно.
+"""
+
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+KIND_KEY = "idempotency_key"
+KIND_DUPLICATE = "duplicate"
+
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+
+class SubmissionInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The same request is still being processed, retry later."
+    default_code = "request_in_progress"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used with a different request body."
+    default_code = "idempotency_key_reused"
+
+
+def _digest(*parts):
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def fingerprint(data, fields):
+    """Хэш записываемых полей тела запроса: тот же ключ обязан приходить с тем же телом"""
+    values = [data.get(name) for name, field in fields.items() if not field.read_only]
+    return _digest(json.dumps(values, default=str))
+
+
+class Submission:
+    """Ключ повтора одного POST и сохраненный для него ответ"""
+
+    def __init__(self, key, kind, ttl, request_fingerprint=None):
+        self.key = key
+        self.kind = kind
+        self.ttl = ttl
+        self.fingerprint = request_fingerprint
+        self.claimed = False
+
+    @classmethod
+    def from_request(cls, request, fields):
+        """``Submission`` для запроса или ``None``, если повторы не отслеживаются"""
+        idempotency_key = request.headers.get(HEADER)
+        if idempotency_key is not None:
+            if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+                raise ValidationError(
+                    {HEADER: [f"Must be between 1 and {MAX_KEY_LENGTH} characters."]}
+                )
+            return cls(
+                f"idempotency:contacts:key:{_digest(idempotency_key)}",
+                KIND_KEY,
+                settings.CONTACT_IDEMPOTENCY_TTL,
+                fingerprint(request.data, fields),
+            )
+
+        email = str(request.data.get("email") or "").strip().lower()
+        if not settings.CONTACT_DUPLICATE_WINDOW or not email:
+            return None
+        message = str(request.data.get("message") or "").strip()
+        return cls(
+            f"idempotency:contacts:submission:{_digest(email, message)}",
+            KIND_DUPLICATE,
+            settings.CONTACT_DUPLICATE_WINDOW,
+        )
+
+    def claim(self):
+        """Сохраненный ответ для повтора или ``None``, если запрос нужно выполнить"""
+        try:
+            record = cache.get(self.key)
+            if record is None:
+                pending = {"state": IN_PROGRESS, "fingerprint": self.fingerprint}
+                if cache.add(self.key, pending, settings.CONTACT_IDEMPOTENCY_LOCK_TTL):
+                    self.claimed = True
+                    return None
+                record = cache.get(self.key)
+        except RedisError as e:
+            metrics.CONTACT_IDEMPOTENCY_ERRORS.inc()
+            logger.warning("Idempotency cache unavailable, processing the request: %r", e)
+            return None
+        if record is None:
+            return None
+
+        if record["fingerprint"] != self.fingerprint:
+            raise IdempotencyKeyReused()
+        if record["state"] == IN_PROGRESS:
+            raise SubmissionInProgress()
+        metrics.CONTACT_REPLAYS.labels(kind=self.kind).inc()
+        return Response(record["data"], status=record["status"], headers={REPLAYED_HEADER: "true"})
+
+    def complete(self, response):
+        """Сохранить ответ на выполненный запрос для повторов"""
+        if not self.claimed:
+            return
+        record = {
+            "state": DONE,
+            "fingerprint": self.fingerprint,
+            "status": response.status_code,
+            "data": response.data,
+        }
+        try:
+            cache.set(self.key, record, self.ttl)
+        except RedisError as e:
+            metrics.CONTACT_IDEMPOTENCY_ERRORS.inc()
+            logger.warning("Response for %s not stored: %r", self.kind, e)
+
+    def release(self):
+        """Освободить ключ, если запрос не выполнен (ошибка валидации или сбой)"""
+        if not self.claimed:
+            return
+        try:
+            cache.delete(self.key)
+        except RedisError as e:
+            metrics.CONTACT_IDEMPOTENCY_ERRORS.inc()
+            logger.warning("Idempotency claim for %s not released: %r", self.kind, e)
@@ -0,0 +1,184 @@
+"""
+Пул долгоживущих SMTP-соединений воркера.
+
+``django.core.mail.send_mail`` без явного ``connection`` открывает и закрывает
+SMTP-сессию (с TLS и авторизацией) на каждое письмо. Пул держит открытыми
+несколько соединений почтового backend, проверяет простаивавшие соединения
+командой NOOP и переподключается, если сервер разорвал сессию. Сам пул
+реализует ``send_messages``, поэтому передается в ``send_mail(connection=...)``.
+"""
+
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager, suppress
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых соединение нужно открыть заново и повторить отправку
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError)
+
+
+class MailerError(Exception):
+    """Не удалось получить SMTP-соединение из пула"""
+
+
+class PooledMailConnection:
+    """Соединение почтового backend, переиспользуемое между письмами"""
+
+    def __init__(self, connection_factory):
+        self.connection_factory = connection_factory
+        self.backend = None
+        self.last_used = 0.0
+
+    def ensure_open(self, health_check_interval):
+        if self.backend is None:
+            self.backend = self.connection_factory()
+
+        smtp = getattr(self.backend, "connection", None)
+        idle = time.monotonic() - self.last_used
+        if smtp is not None and idle > health_check_interval and not self._is_alive(smtp):
+            self.close()
+
+        if self.backend.open():
+            metrics.SMTP_CONNECTIONS_OPENED.inc()
+        else:
+            metrics.SMTP_CONNECTION_REUSES.inc()
+
+    def send_messages(self, email_messages):
+        sent = self.backend.send_messages(email_messages)
+        self.last_used = time.monotonic()
+        return sent
+
+    def close(self):
+        if self.backend is not None:
+            with suppress(smtplib.SMTPException, OSError):
+                self.backend.close()
+
+    @staticmethod
+    def _is_alive(smtp):
+        try:
+            return smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+
+class MailConnectionPool:
+    """Потокобезопасный пул соединений для отправки писем"""
+
+    def __init__(
+        self,
+        size=None,
+        health_check_interval=None,
+        acquire_timeout=None,
+        connection_factory=None,
+    ):
+        self.size = size or settings.EMAIL_POOL_SIZE
+        self.health_check_interval = (
+            settings.EMAIL_HEALTH_CHECK_INTERVAL
+            if health_check_interval is None
+            else health_check_interval
+        )
+        self.acquire_timeout = (
+            settings.EMAIL_POOL_ACQUIRE_TIMEOUT if acquire_timeout is None else acquire_timeout
+        )
+        connection_factory = connection_factory or (lambda: get_connection(fail_silently=False))
+
+        self._pool = queue.LifoQueue(maxsize=self.size)
+        for _ in range(self.size):
+            self._pool.put(PooledMailConnection(connection_factory))
+
+    def __deepcopy__(self, memo):
+        # locmem backend копирует письмо вместе с его connection; пул общий для процесса
+        return self
+
+    @contextmanager
+    def acquire(self):
+        """Взять соединение из пула на время отправки"""
+        try:
+            pooled = self._pool.get(timeout=self.acquire_timeout)
+        except queue.Empty as e:
+            raise MailerError("Timed out waiting for an SMTP connection") from e
+        try:
+            yield pooled
+        finally:
+            self._pool.put(pooled)
+
+    def send_messages(self, email_messages):
+        """Отправить письма по одному соединению, переподключившись при разрыве сессии"""
+        if not email_messages:
+            return 0
+
+        with self.acquire() as pooled:
+            for attempt in (1, 2):
+                try:
+                    pooled.ensure_open(self.health_check_interval)
+                    started = time.perf_counter()
+                    sent = pooled.send_messages(email_messages)
+                except RECONNECT_ERRORS as e:
+                    metrics.SMTP_SEND_ERRORS.inc()
+                    pooled.close()
+                    if attempt == 2:
+                        raise
+                    logger.warning("SMTP session dropped, reconnecting: %r", e)
+                except Exception:
+                    metrics.SMTP_SEND_ERRORS.inc()
+                    raise
+                else:
+                    metrics.SMTP_SEND_LATENCY.observe(time.perf_counter() - started)
+                    metrics.SMTP_MESSAGES_SENT.inc(sent or 0)
+                    return sent
+
+    def close(self):
+        """Закрыть все простаивающие соединения пула"""
+        pooled_connections = []
+        while True:
+            try:
+                pooled_connections.append(self._pool.get_nowait())
+            except queue.Empty:
+                break
+        for pooled in pooled_connections:
+            pooled.close()
+            self._pool.put(pooled)
+
+
+_mail_pool = None
+_mail_pool_lock = threading.Lock()
+
+
+def get_mail_pool():
+    """Вернуть пул SMTP-соединений текущего процесса"""
+    global _mail_pool
+    if _mail_pool is None:
+        with _mail_pool_lock:
+            if _mail_pool is None:
+                _mail_pool = MailConnectionPool()
+    return _mail_pool
+
+
+def reset_mail_pool():
+    """Закрыть и забыть пул SMTP-соединений текущего процесса"""
+    global _mail_pool
+    with _mail_pool_lock:
+        pool, _mail_pool = _mail_pool, None
+    if pool is not None:
+        pool.close()
+
+
+def _forget_mail_pool_after_fork():
+    # Сокеты родительского процесса нельзя использовать в дочернем
+    global _mail_pool, _mail_pool_lock
+    _mail_pool = None
+    _mail_pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_mail_pool_after_fork)
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from contacts.partitions import (
+    archivable_months,
+    archive_to_file,
+    archive_to_table,
+    has_unprocessed,
+    is_partitioned,
+    partition_name,
+)
+
+
+class Command(BaseCommand):
+    help = "Move old, fully processed months of contact requests to NDJSON.gz files or a cold table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=settings.CONTACT_ARCHIVE_AFTER_MONTHS,
+            help="Archive months that ended at least this many months ago",
+        )
+        parser.add_argument(
+            "--to",
+            choices=["file", "table"],
+            default="file",
+            help="NDJSON.gz files (partition dropped) or the cold archive table (PostgreSQL)",
+        )
+        parser.add_argument(
+            "--directory", default=settings.CONTACT_ARCHIVE_DIR, help="Where archive files go"
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only list what would move")
+
+    def handle(self, *_args, **options):
+        if options["older_than"] < settings.CONTACT_HOT_MONTHS:
+            raise CommandError(
+                f"--older-than must be at least CONTACT_HOT_MONTHS ({settings.CONTACT_HOT_MONTHS})"
+            )
+        if options["to"] == "table" and not is_partitioned():
+            raise CommandError("The cold table needs partitioned contact requests (PostgreSQL)")
+
+        archived = 0
+        for month in archivable_months(options["older_than"]):
+            name = partition_name(month)
+            if has_unprocessed(month):
+                self.stderr.write(self.style.WARNING(f"Skipped {name}: has unprocessed requests"))
+                continue
+            if options["dry_run"]:
+                self.stdout.write(f"Would archive {name}")
+                continue
+            if options["to"] == "table":
+                archive_to_table(month)
+                self.stdout.write(f"Moved {name} to the archive table")
+            else:
+                path = archive_to_file(month, options["directory"])
+                self.stdout.write(f"Archived {name} to {path}")
+            archived += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} months"))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from contacts.partitions import (
+    backfill_batch,
+    default_partition_rows,
+    drop_unpartitioned_table,
+    has_unpartitioned_table,
+)
+
+
+class Command(BaseCommand):
+    help = "Move contact requests left by the partitioning migration into the partitions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Rows moved per transaction"
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches to limit the load on the database",
+        )
+
+    def handle(self, *_args, **options):
+        if not has_unpartitioned_table():
+            self.stdout.write("No unpartitioned contact requests, nothing to do")
+            return
+
+        moved = 0
+        while True:
+            count = backfill_batch(options["batch_size"])
+            if not count:
+                break
+            moved += count
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Moved {moved} rows")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        if not drop_unpartitioned_table():
+            self.stderr.write(
+                self.style.WARNING("Rows are left in the unpartitioned table, rerun the command")
+            )
+            return
+        self.stdout.write(f"Moved {moved} rows, the unpartitioned table is dropped")
+        stray = default_partition_rows()
+        if stray:
+            self.stderr.write(
+                self.style.WARNING(
+                    f"{stray} rows are in the default partition; run manage_partitions "
+                    "or create partitions for their months"
+                )
+            )
+        self.stdout.write(self.style.SUCCESS("Backfill complete"))
@@ -0,0 +1,83 @@
+import pika
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from contacts.retries import ATTEMPT_HEADER, ERROR_HEADER, RetryPolicy
+
+
+class Command(BaseCommand):
+    help = "Inspect the worker dead-letter queue or replay its messages into the main queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--replay",
+            action="store_true",
+            help="Move dead letters back to the main queue with a fresh retry budget",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Maximum number of messages to show or replay (default: 20 shown, all replayed)",
+        )
+
+    def handle(self, *_args, **options):
+        policy = RetryPolicy()
+        connection = pika.BlockingConnection(pika.URLParameters(settings.RABBITMQ_URL))
+        try:
+            channel = connection.channel()
+            declared = channel.queue_declare(queue=policy.dead_letter_queue, durable=True)
+            count = declared.method.message_count
+            self.stdout.write(f"{count} messages in {policy.dead_letter_queue}")
+
+            if options["replay"]:
+                limit = count if options["limit"] is None else min(options["limit"], count)
+                replayed = self.replay(channel, policy, limit)
+                self.stdout.write(
+                    self.style.SUCCESS(f"Replayed {replayed} messages to {policy.queue_name}")
+                )
+            else:
+                limit = 20 if options["limit"] is None else options["limit"]
+                self.inspect(channel, policy, min(limit, count))
+        finally:
+            # Просмотренные, но не подтвержденные сообщения брокер вернет в очередь
+            connection.close()
+
+    def inspect(self, channel, policy, limit):
+        for _ in range(limit):
+            method, properties, body = channel.basic_get(policy.dead_letter_queue)
+            if method is None:
+                break
+            headers = properties.headers or {}
+            self.stdout.write(
+                f"attempts={headers.get(ATTEMPT_HEADER, 0)} "
+                f"error={headers.get(ERROR_HEADER, '')} "
+                f"body={body.decode(errors='replace')}"
+            )
+
+    def replay(self, channel, policy, limit):
+        """Переложить сообщения в основную очередь, подтверждая каждое после публикации"""
+        channel.confirm_delivery()
+        replayed = 0
+        for _ in range(limit):
+            method, properties, body = channel.basic_get(policy.dead_letter_queue)
+            if method is None:
+                break
+            headers = {
+                key: value
+                for key, value in (properties.headers or {}).items()
+                if key not in (ATTEMPT_HEADER, ERROR_HEADER)
+            }
+            channel.basic_publish(
+                exchange="",
+                routing_key=policy.queue_name,
+                body=body,
+                properties=pika.BasicProperties(
+                    content_type=properties.content_type,
+                    delivery_mode=2,
+                    headers=headers,
+                ),
+            )
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+            replayed += 1
+        return replayed
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from contacts.partitions import default_partition_rows, ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly partitions of the contact request table (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=settings.CONTACT_PARTITIONS_AHEAD,
+            help="Months after the current one that must have a partition",
+        )
+
+    def handle(self, *_args, **options):
+        if not is_partitioned():
+            self.stdout.write(
+                "Contact requests are not partitioned on this database, nothing to do"
+            )
+            return
+
+        # Запускать по расписанию (cron) хотя бы раз в месяц
+        for name in ensure_partitions(options["ahead"]):
+            self.stdout.write(f"Created {name}")
+        stray = default_partition_rows()
+        if stray:
+            self.stderr.write(
+                self.style.WARNING(
+                    f"{stray} rows are in the default partition; rerun with a larger --ahead "
+                    "or create partitions for their months"
+                )
+            )
+        self.stdout.write(self.style.SUCCESS("Partitions are up to date"))
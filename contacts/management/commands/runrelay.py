@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from contacts.metrics import start_http_server
+from contacts.outbox import drain
+from contacts.publisher import PublisherError, get_publisher
+
+
+class Command(BaseCommand):
+    help = "Relay outbox events to RabbitMQ in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.OUTBOX_RELAY_BATCH_SIZE,
+            help="Number of outbox messages published per broker round-trip",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.OUTBOX_RELAY_INTERVAL,
+            help="Seconds to sleep when the outbox is empty",
+        )
+        parser.add_argument("--once", action="store_true", help="Drain the outbox once and exit")
+        parser.add_argument(
+            "--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port"
+        )
+
+    def handle(self, *_args, **options):
+        batch_size = options["batch_size"]
+        interval = options["interval"]
+        if options["metrics_port"]:
+            start_http_server(options["metrics_port"])
+
+        publisher = get_publisher()
+        self.stdout.write(self.style.SUCCESS("Starting outbox relay..."))
+
+        try:
+            while True:
+                try:
+                    relayed, elapsed = drain(publisher, batch_size)
+                except PublisherError as e:
+                    if options["once"]:
+                        raise CommandError(f"Outbox not relayed: {e}") from e
+                    self.stdout.write(
+                        self.style.WARNING(f"{e}. Retrying in {settings.OUTBOX_RELAY_RETRY_DELAY}s")
+                    )
+                    time.sleep(settings.OUTBOX_RELAY_RETRY_DELAY)
+                    continue
+
+                if relayed:
+                    self.stdout.write(
+                        f"Relayed {relayed} messages in {elapsed:.3f}s "
+                        f"({relayed / max(elapsed, 1e-9):.0f} msg/s)"
+                    )
+                if options["once"]:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS("Stopping outbox relay..."))
+        finally:
+            publisher.close()
@@ -1,115 +1,280 @@
+import asyncio
 import json
+import signal
+import threading
 import time
 
 import pika
 from django.conf import settings
 from django.core.mail import send_mail
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from contacts.models import ContactRequest
+from contacts import metrics
+from contacts.consumer import POOL_CHOICES, POOL_PROCESS, Consumer
+from contacts.dedup import (
+    KIND_SERVICE_NOTIFICATION,
+    KIND_THANK_YOU,
+    DatabaseDedupStore,
+    deliver_once,
+    get_dedup_store,
+)
+from contacts.digest import ServiceDigest
+from contacts.emails import service_notification, thank_you_email
+from contacts.mailer import get_mail_pool, reset_mail_pool
+from contacts.metrics import start_http_server
+from contacts.retries import RetryPolicy
+from contacts.status_updates import StatusUpdateBuffer, mark_processed, observe_end_to_end_lag
+
+ENGINE_BLOCKING = "blocking"
+ENGINE_ASYNCIO = "asyncio"
+
+_process_command = None
+
+
+def process_delivery(body):
+    """Обработать сообщение в дочернем процессе пула (``--pool process``).
+
+    Дочерний процесс наследует при fork команду, настроенную в ``handle``.
+    """
+    global _process_command
+    if _process_command is None:
+        _process_command = Command()
+    return _process_command.handle_delivery(body)
 
 
 class Command(BaseCommand):
     help = "Run RabbitMQ consumer for email notifications"
+    service_digest = False
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--engine",
+            choices=[ENGINE_BLOCKING, ENGINE_ASYNCIO],
+            default=settings.WORKER_ENGINE,
+            help="Blocking pika consumer with a worker pool, or a single asyncio event loop",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.WORKER_CONCURRENCY,
+            help="Number of messages processed in parallel",
+        )
+        parser.add_argument(
+            "--prefetch",
+            type=int,
+            default=settings.WORKER_PREFETCH,
+            help="Maximum number of unacknowledged messages (defaults to --concurrency)",
+        )
+        parser.add_argument(
+            "--pool",
+            choices=POOL_CHOICES,
+            default=settings.WORKER_POOL,
+            help="Run handlers in a thread pool or in a prefork process pool",
+        )
+        parser.add_argument(
+            "--status-batch-size",
+            type=int,
+            default=settings.WORKER_STATUS_BATCH_SIZE,
+            help="Number of processed requests marked with a single UPDATE",
+        )
+        parser.add_argument(
+            "--status-flush-interval",
+            type=float,
+            default=settings.WORKER_STATUS_FLUSH_INTERVAL,
+            help="Maximum seconds a processed request waits for its status UPDATE",
+        )
+        parser.add_argument(
+            "--service-digest",
+            action="store_true",
+            default=settings.WORKER_SERVICE_DIGEST,
+            help="Send service notifications as one digest email per batch",
+        )
+        parser.add_argument(
+            "--digest-size",
+            type=int,
+            default=settings.WORKER_DIGEST_SIZE,
+            help="Maximum number of contact requests in one digest email",
+        )
+        parser.add_argument(
+            "--digest-interval",
+            type=float,
+            default=settings.WORKER_DIGEST_INTERVAL,
+            help="Maximum seconds a service notification waits for its digest",
+        )
+        parser.add_argument(
+            "--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port"
+        )
+        parser.add_argument(
+            "--queue-depth-interval",
+            type=float,
+            default=settings.WORKER_QUEUE_DEPTH_INTERVAL,
+            help="Seconds between queue depth samples (0 disables sampling)",
+        )
+
+    def handle(self, *_args, **options):
         self.stdout.write(self.style.SUCCESS("Starting RabbitMQ consumer..."))
+        if options["metrics_port"]:
+            start_http_server(options["metrics_port"])
+        DatabaseDedupStore().purge_expired()
+        self.service_digest = options["service_digest"]
 
-        while True:
-            try:
-                connection = pika.BlockingConnection(pika.URLParameters(settings.RABBITMQ_URL))
-                channel = connection.channel()
-                channel.queue_declare(queue=settings.RABBITMQ_QUEUE_NAME, durable=True)
+        if options["engine"] == ENGINE_ASYNCIO:
+            self.run_asyncio(options)
+            return
 
-                self.stdout.write(self.style.SUCCESS("Waiting for messages. To exit press CTRL+C"))
+        global _process_command
+        self.consumer = None
+        self.stopping = False
+        previous_handlers = self.install_signal_handlers()
+        handler = process_delivery if options["pool"] == POOL_PROCESS else self.handle_delivery
+        _process_command = self
 
-                def callback(ch, method, _properties, body):
-                    try:
-                        message = json.loads(body)
-                        self.process_message(message)
-                        ch.basic_ack(delivery_tag=method.delivery_tag)
-                        self.stdout.write(self.style.SUCCESS(f"Processed message: {message}"))
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f"Error processing message: {e}"))
-                        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
-
-                channel.basic_qos(prefetch_count=1)
-                channel.basic_consume(
-                    queue=settings.RABBITMQ_QUEUE_NAME, on_message_callback=callback
-                )
+        try:
+            self.consume(handler, options)
+        finally:
+            _process_command = None
+            for signum, previous in previous_handlers.items():
+                signal.signal(signum, previous)
+            reset_mail_pool()
 
-                channel.start_consuming()
+        self.stdout.write(self.style.SUCCESS("Stopping consumer..."))
+
+    def consume(self, handler, options):
+        """Обрабатывать сообщения, переподключаясь при обрыве соединения"""
+        while not self.stopping:
+            self.consumer = Consumer(
+                handler,
+                concurrency=options["concurrency"],
+                prefetch=options["prefetch"],
+                pool=options["pool"],
+                status_buffer=StatusUpdateBuffer(
+                    **self.status_window(options),
+                    digest=ServiceDigest() if self.service_digest else None,
+                ),
+                retry_policy=RetryPolicy(),
+                queue_depth_interval=options["queue_depth_interval"],
+            )
+            try:
+                self.stdout.write(self.style.SUCCESS("Waiting for messages. To exit press CTRL+C"))
+                self.consumer.run()
             except pika.exceptions.AMQPConnectionError:
+                if self.stopping:
+                    break
                 self.stdout.write(
                     self.style.WARNING("RabbitMQ connection failed. Retrying in 5 seconds...")
                 )
                 time.sleep(5)
             except KeyboardInterrupt:
-                self.stdout.write(self.style.SUCCESS("Stopping consumer..."))
-                if "channel" in locals():
-                    channel.stop_consuming()
-                if "connection" in locals():
-                    connection.close()
                 break
 
-    def process_message(self, message):
-        """Обработать сообщение: отправить письма"""
+    def run_asyncio(self, options):
+        """Запустить asyncio-движок (aio-pika + aiosmtplib + async ORM)"""
+        try:
+            from contacts.async_worker import AsyncMailer, AsyncStatusBuffer, AsyncWorker
+        except ImportError as e:
+            raise CommandError(
+                "The asyncio engine requires aio-pika and aiosmtplib: pip install -e '.[async]'"
+            ) from e
+
+        mailer = AsyncMailer()
+        digest = ServiceDigest(asend_email=mailer.send) if self.service_digest else None
+        worker = AsyncWorker(
+            prefetch=options["prefetch"],
+            status_buffer=AsyncStatusBuffer(**self.status_window(options), digest=digest),
+            mailer=mailer,
+            retry_policy=RetryPolicy(),
+            queue_depth_interval=options["queue_depth_interval"],
+            stdout=self.stdout,
+        )
+        asyncio.run(worker.run())
+        self.stdout.write(self.style.SUCCESS("Stopping consumer..."))
+
+    def status_window(self, options):
+        """Размер и интервал пачки статусов; в режиме сводки пачка совпадает со сводкой"""
+        if self.service_digest:
+            return {"max_size": options["digest_size"], "max_delay": options["digest_interval"]}
+        return {
+            "max_size": options["status_batch_size"],
+            "max_delay": options["status_flush_interval"],
+        }
+
+    def install_signal_handlers(self):
+        """SIGTERM/SIGINT: перестать брать сообщения и дообработать полученные"""
+        previous_handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                previous_handlers[signum] = signal.signal(signum, self.stop)
+        return previous_handlers
+
+    def stop(self, *_args):
+        self.stopping = True
+        if self.consumer is not None:
+            self.consumer.stop()
+
+    def handle_delivery(self, body):
+        """Декодировать и обработать тело сообщения из очереди.
+
+        Статус запроса записывает консьюмер пачкой, поэтому возвращается только его id.
+        """
+        try:
+            with metrics.WORKER_STAGE_LATENCY.labels(stage="decode").time():
+                message = json.loads(body)
+            contact_request_id = self.process_message(message, defer_status_update=True)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error processing message: {e}"))
+            raise
+        self.stdout.write(self.style.SUCCESS(f"Processed message: {message}"))
+        return contact_request_id
+
+    def process_message(self, message, defer_status_update=False):
+        """Обработать сообщение: отправить письма, пропуская уже отправленные"""
         contact_request_id = message.get("contact_request_id")
         name = message.get("name")
         email = message.get("email")
         phone = message.get("phone", "")
         user_message = message.get("message", "")
+        dedup = get_dedup_store()
 
         # Отправляем письмо пользователю с благодарностью
-        self.send_thank_you_email(name, email)
+        deliver_once(
+            dedup,
+            contact_request_id,
+            KIND_THANK_YOU,
+            lambda: self.send_thank_you_email(name, email),
+        )
 
-        # Отправляем уведомление сервисным учеткам
-        self.send_service_notification(name, email, phone, user_message)
+        # Отправляем уведомление сервисным учеткам (в режиме сводки его отправит буфер статусов)
+        digested = self.service_digest and defer_status_update and contact_request_id is not None
+        if not digested:
+            deliver_once(
+                dedup,
+                contact_request_id,
+                KIND_SERVICE_NOTIFICATION,
+                lambda: self.send_service_notification(name, email, phone, user_message),
+            )
 
         # Помечаем запрос как обработанный
-        try:
-            contact_request = ContactRequest.objects.get(id=contact_request_id)
-            contact_request.processed = True
-            contact_request.save()
-        except ContactRequest.DoesNotExist:
+        observe_end_to_end_lag(message.get("created_at"))
+        if not defer_status_update and not mark_processed([contact_request_id]):
             self.stdout.write(self.style.WARNING(f"ContactRequest {contact_request_id} not found"))
+        return contact_request_id
 
     def send_thank_you_email(self, name, email):
         """Отправить письмо с благодарностью пользователю"""
-        subject = "Спасибо за ваш запрос!"
-        message = f"""
-Здравствуйте, {name}!
-
-Спасибо за ваш интерес к нашей продукции. Мы получили ваш запрос и свяжемся с вами в ближайшее время.
-
-С уважением,
-Команда OLKI Paint
-        """
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [email],
-            fail_silently=False,
-        )
+        with metrics.WORKER_STAGE_LATENCY.labels(stage="thank_you").time():
+            self.send_email(thank_you_email(name, email))
 
     def send_service_notification(self, name, email, phone, user_message):
         """Отправить уведомление сервисным учеткам о новом заказе"""
-        subject = f"Новый запрос на контакт от {name}"
-        message = f"""
-Поступил новый запрос на контакт:
+        with metrics.WORKER_STAGE_LATENCY.labels(stage="service_notification").time():
+            self.send_email(service_notification(name, email, phone, user_message))
 
-Имя: {name}
-Email: {email}
-Телефон: {phone or "не указан"}
-Сообщение: {user_message or "не указано"}
-
-Пожалуйста, свяжитесь с клиентом в ближайшее время.
-        """
+    def send_email(self, email_message):
         send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [settings.SERVICE_EMAIL],
+            email_message.subject,
+            email_message.body,
+            email_message.from_email,
+            email_message.to,
             fail_silently=False,
+            connection=get_mail_pool(),
         )
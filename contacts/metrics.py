@@ -0,0 +1,210 @@
+import os
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+from prometheus_client import start_http_server as _start_http_server
+
+# Пул соединений публикатора RabbitMQ
+RABBITMQ_POOL_SIZE = Gauge(
+    "olki_rabbitmq_pool_size",
+    "Maximum number of pooled RabbitMQ publisher connections",
+)
+RABBITMQ_POOL_IN_USE = Gauge(
+    "olki_rabbitmq_pool_in_use",
+    "Number of RabbitMQ publisher connections currently checked out",
+)
+RABBITMQ_RECONNECTS = Counter(
+    "olki_rabbitmq_reconnects_total",
+    "Number of RabbitMQ publisher connections (re)opened",
+)
+RABBITMQ_PUBLISHED = Counter(
+    "olki_rabbitmq_published_total",
+    "Number of messages published to RabbitMQ",
+    ["queue"],
+)
+RABBITMQ_PUBLISH_ERRORS = Counter(
+    "olki_rabbitmq_publish_errors_total",
+    "Number of failed RabbitMQ publish attempts",
+    ["queue"],
+)
+RABBITMQ_PUBLISH_LATENCY = Histogram(
+    "olki_rabbitmq_publish_seconds",
+    "Time spent publishing a message to RabbitMQ, including the confirm",
+    ["queue"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+RABBITMQ_BATCH_PUBLISH_LATENCY = Histogram(
+    "olki_rabbitmq_batch_publish_seconds",
+    "Time spent publishing a batch of messages to RabbitMQ, including the commit",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+# Transactional outbox и relay
+OUTBOX_RELAYED = Counter(
+    "olki_outbox_relayed_total",
+    "Number of outbox messages published to RabbitMQ by the relay",
+)
+OUTBOX_RELAY_FAILURES = Counter(
+    "olki_outbox_relay_failures_total",
+    "Number of outbox batches that failed to publish",
+)
+OUTBOX_BATCH_SIZE = Histogram(
+    "olki_outbox_batch_size",
+    "Number of outbox messages published per batch",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+OUTBOX_LAG = Histogram(
+    "olki_outbox_lag_seconds",
+    "Time between writing an outbox message and publishing it",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+OUTBOX_PENDING = Gauge(
+    "olki_outbox_pending",
+    "Number of outbox messages waiting to be published",
+)
+
+# SMTP-соединения воркера
+SMTP_CONNECTIONS_OPENED = Counter(
+    "olki_smtp_connections_opened_total",
+    "Number of SMTP connections opened (each one costs a full handshake)",
+)
+SMTP_CONNECTION_REUSES = Counter(
+    "olki_smtp_connection_reuses_total",
+    "Number of sends that reused an already open SMTP connection",
+)
+SMTP_MESSAGES_SENT = Counter(
+    "olki_smtp_messages_sent_total",
+    "Number of emails sent through the SMTP connection pool",
+)
+SMTP_SEND_ERRORS = Counter(
+    "olki_smtp_send_errors_total",
+    "Number of failed SMTP send attempts",
+)
+SMTP_SEND_LATENCY = Histogram(
+    "olki_smtp_send_seconds",
+    "Time spent sending a batch of emails over a pooled SMTP connection",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# Пакетная запись статусов воркером
+WORKER_STATUS_UPDATES = Counter(
+    "olki_worker_status_updates_total",
+    "Number of bulk UPDATE statements issued for processed contact requests",
+)
+WORKER_STATUS_BATCH_SIZE = Histogram(
+    "olki_worker_status_batch_size",
+    "Number of messages acknowledged per status flush",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+
+# Повторы и dead-letter очередь воркера
+WORKER_RETRIES = Counter(
+    "olki_worker_retries_total",
+    "Number of failed messages scheduled for a delayed retry",
+    ["delay"],
+)
+WORKER_DEAD_LETTERED = Counter(
+    "olki_worker_dead_lettered_total",
+    "Number of messages moved to the dead-letter queue",
+)
+
+# Дедупликация писем при повторной доставке
+DEDUP_SKIPPED = Counter(
+    "olki_dedup_skipped_total",
+    "Number of emails skipped because a dedup marker already existed",
+    ["kind", "state"],
+)
+DEDUP_FALLBACKS = Counter(
+    "olki_dedup_fallbacks_total",
+    "Number of dedup operations served by the database because the cache was unavailable",
+)
+
+# Сводные уведомления сервисным учеткам
+WORKER_DIGESTS_SENT = Counter(
+    "olki_worker_digests_sent_total",
+    "Number of digest emails sent to SERVICE_EMAIL",
+)
+WORKER_DIGEST_SIZE = Histogram(
+    "olki_worker_digest_size",
+    "Number of contact requests listed in one digest email",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+
+# Обработка сообщений воркером
+WORKER_MESSAGES_CONSUMED = Counter(
+    "olki_worker_messages_consumed_total",
+    "Number of messages delivered to the worker",
+)
+WORKER_MESSAGES_ACKED = Counter(
+    "olki_worker_messages_acked_total",
+    "Number of messages acknowledged by the worker (processed, retried or dead-lettered)",
+)
+WORKER_MESSAGES_NACKED = Counter(
+    "olki_worker_messages_nacked_total",
+    "Number of messages rejected by the worker without requeue",
+)
+WORKER_STAGE_LATENCY = Histogram(
+    "olki_worker_stage_seconds",
+    "Time spent in each message processing stage",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+WORKER_END_TO_END_LAG = Histogram(
+    "olki_worker_end_to_end_lag_seconds",
+    "Time from ContactRequest creation to the worker finishing its emails",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 1800, 3600, 7200),
+)
+WORKER_QUEUE_DEPTH = Gauge(
+    "olki_worker_queue_depth",
+    "Number of ready messages in a RabbitMQ queue, sampled by the worker",
+    ["queue"],
+)
+
+# Контроль допуска POST /api/contacts/ (contacts/admission.py)
+ADMISSION_REJECTED = Counter(
+    "olki_admission_rejected_total",
+    "Number of contact submissions rejected before reaching the view",
+    ["reason"],
+)
+ADMISSION_ERRORS = Counter(
+    "olki_admission_errors_total",
+    "Number of throttle checks that failed and admitted the request",
+)
+ADMISSION_SHEDDING = Gauge(
+    "olki_admission_shedding",
+    "1 while this process sheds contact submissions because of overload",
+    multiprocess_mode="max",
+)
+ADMISSION_LATENCY = Histogram(
+    "olki_admission_check_seconds",
+    "Time spent deciding whether to admit a contact submission",
+    buckets=(0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+)
+ADMISSION_DB_PROBE_LATENCY = Histogram(
+    "olki_admission_db_probe_seconds",
+    "Latency of the periodic database probe used for load shedding",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+# Повторы POST /api/contacts/ (contacts/idempotency.py)
+CONTACT_REPLAYS = Counter(
+    "olki_contact_replays_total",
+    "Number of contact submissions answered with a stored response instead of a new write",
+    ["kind"],
+)
+CONTACT_IDEMPOTENCY_ERRORS = Counter(
+    "olki_contact_idempotency_errors_total",
+    "Number of idempotency cache operations that failed",
+)
+
+
+def start_http_server(port):
+    """Отдавать метрики на порту.
+
+    Если задан ``PROMETHEUS_MULTIPROC_DIR``, в ответ входят и метрики дочерних
+    процессов (prefork пул воркера).
+    """
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    _start_http_server(port, registry=registry)
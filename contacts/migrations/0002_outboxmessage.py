@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contacts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxMessage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("queue", models.CharField(max_length=200, verbose_name="Очередь")),
+                ("payload", models.JSONField(verbose_name="Сообщение")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="Попыток публикации"),
+                ),
+                ("last_error", models.TextField(blank=True, verbose_name="Последняя ошибка")),
+            ],
+            options={
+                "verbose_name": "Событие outbox",
+                "verbose_name_plural": "События outbox",
+                "ordering": ["id"],
+            },
+        ),
+    ]
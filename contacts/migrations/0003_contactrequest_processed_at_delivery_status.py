@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:07
+
+from django.db import migrations, models
+
+
+def mark_processed_as_sent(apps, _schema_editor):
+    ContactRequest = apps.get_model("contacts", "ContactRequest")
+    ContactRequest.objects.filter(processed=True).update(delivery_status="sent")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contacts", "0002_outboxmessage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contactrequest",
+            name="delivery_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Ожидает отправки"),
+                    ("sent", "Письма отправлены"),
+                    ("failed", "Ошибка отправки"),
+                ],
+                default="pending",
+                max_length=20,
+                verbose_name="Статус отправки писем",
+            ),
+        ),
+        migrations.AddField(
+            model_name="contactrequest",
+            name="processed_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Дата обработки"),
+        ),
+        migrations.RunPython(mark_processed_as_sent, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contacts", "0003_contactrequest_processed_at_delivery_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationMarker",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "contact_request_id",
+                    models.BigIntegerField(verbose_name="ID запроса на контакт"),
+                ),
+                ("kind", models.CharField(max_length=50, verbose_name="Тип письма")),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[("in_progress", "Отправляется"), ("done", "Отправлено")],
+                        max_length=20,
+                        verbose_name="Состояние",
+                    ),
+                ),
+                ("expires_at", models.DateTimeField(db_index=True, verbose_name="Истекает")),
+            ],
+            options={
+                "verbose_name": "Маркер отправки письма",
+                "verbose_name_plural": "Маркеры отправки писем",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("contact_request_id", "kind"), name="notification_marker_unique"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contacts", "0004_notificationmarker"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="contactrequest",
+            options={
+                "ordering": ["-created_at", "-id"],
+                "verbose_name": "Запрос на контакт",
+                "verbose_name_plural": "Запросы на контакт",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="contactrequest",
+            index=models.Index(fields=["-created_at", "-id"], name="contact_created_at_id_idx"),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:44
+
+from django.db import migrations, models
+
+# Поиск админки (icontains) строит UPPER(колонка::text) LIKE UPPER('%...%'):
+# триграммный индекс должен быть по тому же выражению
+SEARCH_COLUMNS = ["name", "email", "phone"]
+
+CREATE_TRGM_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    *(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS contact_{column}_trgm_idx "
+        f"ON contacts_contactrequest USING gin (UPPER({column}::text) gin_trgm_ops)"
+        for column in SEARCH_COLUMNS
+    ),
+]
+
+DROP_TRGM_SQL = [
+    f"DROP INDEX CONCURRENTLY IF EXISTS contact_{column}_trgm_idx" for column in SEARCH_COLUMNS
+]
+
+
+def run_on_postgres(statements):
+    def run(_apps, schema_editor):
+        if schema_editor.connection.vendor == "postgresql":
+            for statement in statements:
+                schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не выполняется в транзакции и не блокирует запись
+    atomic = False
+
+    dependencies = [
+        ("contacts", "0005_created_at_id_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContactRequestBacklog",
+            fields=[],
+            options={
+                "verbose_name": "Необработанный запрос",
+                "verbose_name_plural": "Необработанные запросы",
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("contacts.contactrequest",),
+        ),
+        migrations.AddIndex(
+            model_name="contactrequest",
+            index=models.Index(
+                condition=models.Q(("processed", False)),
+                fields=["-created_at", "-id"],
+                name="contact_unprocessed_idx",
+            ),
+        ),
+        migrations.RunPython(run_on_postgres(CREATE_TRGM_SQL), run_on_postgres(DROP_TRGM_SQL)),
+    ]
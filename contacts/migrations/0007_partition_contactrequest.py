@@ -0,0 +1,93 @@
+from datetime import date
+
+from django.db import migrations
+
+TABLE = "contacts_contactrequest"
+OLD_TABLE = "contacts_contactrequest_unpartitioned"
+ARCHIVE_TABLE = "contacts_contactrequest_archive"
+SEQUENCE = "contacts_contactrequest_id_seq"
+
+# Секции вперед от текущего месяца; дальше их создает manage_partitions
+PARTITIONS_AHEAD = 3
+
+TRGM_COLUMNS = ["name", "email", "phone"]
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_table(apps, schema_editor):
+    """Пересоздать таблицу секционированной по месяцам created_at
+
+    Строки не копируются: прежняя таблица остается под именем ``OLD_TABLE``, и
+    ``backfill_partitions`` переносит их пачками в отдельных транзакциях. Миграция
+    меняет только схему пустых таблиц, поэтому блокировка держится недолго.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    execute = schema_editor.execute
+    execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+    # Имена ключа, индексов и последовательности освобождаются для новой таблицы;
+    # перенос строк читает прежнюю таблицу только по первичному ключу
+    execute(f"ALTER TABLE {OLD_TABLE} RENAME CONSTRAINT {TABLE}_pkey TO {OLD_TABLE}_pkey")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [OLD_TABLE, f"{OLD_TABLE}_pkey"],
+        )
+        indexes = [name for (name,) in cursor.fetchall()]
+    for name in indexes:
+        execute(f"DROP INDEX {name}")
+    execute(f"ALTER TABLE {OLD_TABLE} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+    execute(f"ALTER TABLE {OLD_TABLE} ALTER COLUMN id DROP DEFAULT")
+    execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE}")
+    # Колонки и NOT NULL как у старой таблицы; identity не переносится, id выдает SEQUENCE
+    execute(f"CREATE TABLE {TABLE} (LIKE {OLD_TABLE}) PARTITION BY RANGE (created_at)")
+    execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(created_at), NOW() FROM {OLD_TABLE}")
+        first, now = cursor.fetchone()
+    current = date(now.year, now.month, 1)
+    month = date(first.year, first.month, 1) if first else current
+    while month <= add_months(current, PARTITIONS_AHEAD):
+        end = add_months(month, 1)
+        execute(
+            f"CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        month = end
+
+    # Уникальность на секционированной таблице обязана включать created_at
+    execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, created_at)")
+    model = apps.get_model("contacts", "ContactRequest")
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+    for column in TRGM_COLUMNS:
+        execute(
+            f"CREATE INDEX contact_{column}_trgm_idx ON {TABLE} "
+            f"USING gin (UPPER({column}::text) gin_trgm_ops)"
+        )
+
+    execute(f"CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+    execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+    # id продолжают нумерацию прежней таблицы: перенесенные строки сохраняют свои id
+    execute(f"SELECT setval('{SEQUENCE}', COALESCE(MAX(id), 0) + 1, false) FROM {OLD_TABLE}")
+    if first is None:
+        execute(f"DROP TABLE {OLD_TABLE}")
+
+    # Холодная таблица: archive_contacts --to table переносит в нее старые секции
+    execute(f"CREATE TABLE {ARCHIVE_TABLE} (LIKE {TABLE}) PARTITION BY RANGE (created_at)")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contacts", "0006_backlog_indexes"),
+    ]
+
+    operations = [
+        # Обратно не секционируем: секционированная таблица совместима с прежней схемой
+        migrations.RunPython(partition_table, migrations.RunPython.noop),
+    ]
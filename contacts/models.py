@@ -1,20 +1,111 @@
 from django.db import models
 
 
+class ContactRequestQuerySet(models.QuerySet):
+    def unprocessed(self):
+        """Необработанные запросы: условие частичного индекса contact_unprocessed_idx"""
+        return self.filter(processed=False)
+
+
 class ContactRequest(models.Model):
     """Модель запроса на контакт"""
 
+    class DeliveryStatus(models.TextChoices):
+        PENDING = "pending", "Ожидает отправки"
+        SENT = "sent", "Письма отправлены"
+        FAILED = "failed", "Ошибка отправки"
+
     name = models.CharField(max_length=200, verbose_name="Имя")
     email = models.EmailField(verbose_name="Email")
     phone = models.CharField(max_length=20, verbose_name="Телефон", blank=True)
     message = models.TextField(verbose_name="Сообщение", blank=True)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     processed = models.BooleanField(default=False, verbose_name="Обработано")
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата обработки")
+    delivery_status = models.CharField(
+        max_length=20,
+        choices=DeliveryStatus.choices,
+        default=DeliveryStatus.PENDING,
+        verbose_name="Статус отправки писем",
+    )
+
+    objects = ContactRequestQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Запрос на контакт"
         verbose_name_plural = "Запросы на контакт"
-        ordering = ["-created_at"]
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            # Порядок списка и keyset-пагинация (olki_backend/pagination.py)
+            models.Index(fields=["-created_at", "-id"], name="contact_created_at_id_idx"),
+            # Очередь необработанных запросов: в индексе только они, поэтому он
+            # остается маленьким при любом размере таблицы
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(processed=False),
+                name="contact_unprocessed_idx",
+            ),
+        ]
+        # Триграммные индексы для поиска в админке создает миграция 0006 (только PostgreSQL)
 
     def __str__(self):
         return f"{self.name} ({self.email})"
+
+
+class BacklogManager(models.Manager.from_queryset(ContactRequestQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().unprocessed()
+
+
+class ContactRequestBacklog(ContactRequest):
+    """Необработанные запросы на контакт (раздел админки для отдела продаж)"""
+
+    objects = BacklogManager()
+
+    class Meta:
+        proxy = True
+        verbose_name = "Необработанный запрос"
+        verbose_name_plural = "Необработанные запросы"
+
+
+class OutboxMessage(models.Model):
+    """Событие для RabbitMQ, записанное в одной транзакции с изменением данных"""
+
+    queue = models.CharField(max_length=200, verbose_name="Очередь")
+    payload = models.JSONField(verbose_name="Сообщение")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток публикации")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+
+    class Meta:
+        verbose_name = "Событие outbox"
+        verbose_name_plural = "События outbox"
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.queue} #{self.id}"
+
+
+class NotificationMarker(models.Model):
+    """Маркер отправки письма по запросу (DB fallback хранилища дедупликации)"""
+
+    class State(models.TextChoices):
+        IN_PROGRESS = "in_progress", "Отправляется"
+        DONE = "done", "Отправлено"
+
+    contact_request_id = models.BigIntegerField(verbose_name="ID запроса на контакт")
+    kind = models.CharField(max_length=50, verbose_name="Тип письма")
+    state = models.CharField(max_length=20, choices=State.choices, verbose_name="Состояние")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Истекает")
+
+    class Meta:
+        verbose_name = "Маркер отправки письма"
+        verbose_name_plural = "Маркеры отправки писем"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["contact_request_id", "kind"], name="notification_marker_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.contact_request_id}: {self.state}"
@@ -0,0 +1,98 @@
+"""
+Transactional outbox для событий RabbitMQ.
+
+API записывает событие в таблицу ``OutboxMessage`` в той же транзакции, что и
+сами данные, а команда ``runrelay`` пачками публикует накопленные события и
+удаляет их из таблицы.
+"""
+
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import OutboxMessage
+from .publisher import PublisherError, get_publisher
+
+
+def enqueue(payload, queue_name=None):
+    """Записать событие в outbox (вызывать внутри транзакции изменения данных)"""
+    return OutboxMessage.objects.create(
+        queue=queue_name or settings.RABBITMQ_QUEUE_NAME, payload=payload
+    )
+
+
+def enqueue_many(payloads, queue_name=None):
+    """Записать пачку событий одним INSERT (вызывать внутри транзакции изменения данных)"""
+    queue = queue_name or settings.RABBITMQ_QUEUE_NAME
+    return OutboxMessage.objects.bulk_create(
+        [OutboxMessage(queue=queue, payload=payload) for payload in payloads]
+    )
+
+
+def enqueue_contact_request(contact_request):
+    """Записать событие о новом запросе на контакт для воркера уведомлений"""
+    return enqueue(
+        {
+            "contact_request_id": contact_request.id,
+            "name": contact_request.name,
+            "email": contact_request.email,
+            "phone": contact_request.phone,
+            "message": contact_request.message,
+            "created_at": contact_request.created_at.isoformat(),
+        }
+    )
+
+
+def relay_batch(publisher=None, batch_size=None):
+    """Опубликовать одну пачку событий из outbox, вернуть число опубликованных"""
+    publisher = publisher or get_publisher()
+    batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+    error = None
+
+    with transaction.atomic():
+        # SKIP LOCKED позволяет запускать несколько relay параллельно
+        batch = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True).order_by("id")[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        ids = [message.id for message in batch]
+        try:
+            publisher.publish_batch([(message.queue, message.payload) for message in batch])
+        except PublisherError as e:
+            error = e
+            OutboxMessage.objects.filter(id__in=ids).update(
+                attempts=F("attempts") + 1, last_error=str(e)
+            )
+        else:
+            OutboxMessage.objects.filter(id__in=ids).delete()
+
+    if error is not None:
+        metrics.OUTBOX_RELAY_FAILURES.inc()
+        raise error
+
+    now = timezone.now()
+    for message in batch:
+        metrics.OUTBOX_LAG.observe((now - message.created_at).total_seconds())
+    metrics.OUTBOX_BATCH_SIZE.observe(len(batch))
+    metrics.OUTBOX_RELAYED.inc(len(batch))
+    return len(batch)
+
+
+def drain(publisher=None, batch_size=None):
+    """Публиковать пачки, пока outbox не опустеет; вернуть (число событий, секунды)"""
+    batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+    started = time.perf_counter()
+    total = 0
+    while True:
+        relayed = relay_batch(publisher, batch_size)
+        total += relayed
+        if relayed < batch_size:
+            break
+    metrics.OUTBOX_PENDING.set(OutboxMessage.objects.count())
+    return total, time.perf_counter() - started
@@ -0,0 +1,255 @@
+"""
+Помесячное секционирование запросов на контакт и архивирование старых месяцев.
+
+На PostgreSQL ``contacts_contactrequest`` секционирована по диапазонам
+``created_at`` (миграция 0007): секция ``contacts_contactrequest_pYYYY_MM`` на
+календарный месяц (UTC) и секция DEFAULT для строк вне созданных диапазонов.
+Первичный ключ в БД - ``(id, created_at)``: уникальность на секционированной
+таблице обязана включать ключ секционирования; для ORM первичным ключом
+остается ``id``, его выдает общая последовательность.
+
+Миграция меняет только схему: строки прежней таблицы переносит
+``backfill_partitions`` пачками по ``id``, каждая пачка - отдельная короткая
+транзакция. Пока перенос не закончен, старые строки не видны через ORM.
+
+``manage_partitions`` заранее создает секции на ``CONTACT_PARTITIONS_AHEAD``
+месяцев вперед. ``archive_contacts`` выносит месяцы старше
+``CONTACT_ARCHIVE_AFTER_MONTHS``, в которых не осталось необработанных
+запросов: в NDJSON.gz через ``COPY`` (секция затем удаляется) или в холодную
+таблицу ``contacts_contactrequest_archive`` переносом секции
+(DETACH/ATTACH, без копирования строк). Миграции, меняющие колонки
+``ContactRequest``, должны менять и холодную таблицу.
+
+На других СУБД (SQLite в разработке и тестах) секций нет: архивирование в файл
+выгружает строки месяца запросом и удаляет их.
+"""
+
+import gzip
+import os
+import re
+from datetime import UTC, date, datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from olki_backend.export import export_chunks
+
+from .models import ContactRequest
+
+TABLE = "contacts_contactrequest"
+ARCHIVE_TABLE = "contacts_contactrequest_archive"
+DEFAULT_PARTITION = f"{TABLE}_default"
+# Таблица до секционирования: миграция 0007 оставляет в ней строки для backfill_partitions
+UNPARTITIONED_TABLE = f"{TABLE}_unpartitioned"
+
+PARTITION_RE = re.compile(r"_p(\d{4})_(\d{2})$")
+
+# Однобайтовые QUOTE и DELIMITER, которых не бывает в JSON: COPY в формате csv
+# отдает строки row_to_json как есть, без экранирования обратных слешей
+COPY_NDJSON_SQL = (
+    "COPY (SELECT row_to_json(t) FROM {table} t ORDER BY id) TO STDOUT "
+    "WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"
+)
+
+
+def month_start(moment):
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """``[начало, конец)`` месяца как aware datetime в UTC"""
+    end = add_months(month, 1)
+    return (
+        datetime(month.year, month.month, 1, tzinfo=UTC),
+        datetime(end.year, end.month, 1, tzinfo=UTC),
+    )
+
+
+def partition_name(month, table=TABLE):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def hot_since(now=None):
+    """Начало самой старой горячей секции (``CONTACT_HOT_MONTHS`` месяцев с текущим)"""
+    current = month_start(now or timezone.now())
+    return month_bounds(add_months(current, 1 - settings.CONTACT_HOT_MONTHS))[0]
+
+
+def archive_cutoff(older_than_months, now=None):
+    """Первый месяц, который еще не архивируется"""
+    return add_months(month_start(now or timezone.now()), -older_than_months)
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def partitions(table=TABLE):
+    """Месяцы помесячных секций таблицы по возрастанию"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [table],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_RE.search(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+def create_partition_sql(month, table=TABLE):
+    """SQL для секции месяца; строки этого месяца из DEFAULT переносятся в нее
+
+    PostgreSQL не создаст секцию, если подходящие строки лежат в DEFAULT, поэтому
+    секция собирается отдельной таблицей и подключается через ATTACH.
+    """
+    name = partition_name(month, table)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    default = f"{table}_default"
+    return [
+        f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        f"WITH moved AS (DELETE FROM {default} WHERE created_at >= '{start}' "
+        f"AND created_at < '{end}' RETURNING *) INSERT INTO {name} SELECT * FROM moved",
+        f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')",
+    ]
+
+
+def ensure_partitions(ahead=None, now=None):
+    """Создать недостающие секции с текущего месяца на ``ahead`` вперед; вернуть их имена"""
+    ahead = settings.CONTACT_PARTITIONS_AHEAD if ahead is None else ahead
+    current = month_start(now or timezone.now())
+    existing = set(partitions())
+    created = []
+    for offset in range(ahead + 1):
+        month = add_months(current, offset)
+        if month in existing:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            for statement in create_partition_sql(month):
+                cursor.execute(statement)
+        created.append(partition_name(month))
+    return created
+
+
+def has_unpartitioned_table():
+    """Остались ли строки, которые миграция 0007 не перенесла"""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [UNPARTITIONED_TABLE])
+        return cursor.fetchone()[0] is not None
+
+
+def backfill_batch(batch_size):
+    """Перенести до ``batch_size`` строк прежней таблицы (по возрастанию id); вернуть число"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        # SKIP LOCKED: параллельные запуски берут разные пачки, а не ждут друг друга
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {UNPARTITIONED_TABLE} WHERE id IN ("
+            f"SELECT id FROM {UNPARTITIONED_TABLE} ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED"
+            f") RETURNING *) INSERT INTO {TABLE} SELECT * FROM moved",
+            [batch_size],
+        )
+        return cursor.rowcount
+
+
+def drop_unpartitioned_table():
+    """Удалить прежнюю таблицу, если в ней не осталось строк; вернуть True, если удалена"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {UNPARTITIONED_TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {UNPARTITIONED_TABLE})")
+        if cursor.fetchone()[0]:
+            return False
+        cursor.execute(f"DROP TABLE {UNPARTITIONED_TABLE}")
+    return True
+
+
+def default_partition_rows():
+    """Строки в DEFAULT: их месяцам не хватает секций"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {DEFAULT_PARTITION}")
+        return cursor.fetchone()[0]
+
+
+def archivable_months(older_than_months, now=None):
+    """Месяцы старше порога, которые можно архивировать"""
+    cutoff = archive_cutoff(older_than_months, now)
+    if is_partitioned():
+        return [month for month in partitions() if month < cutoff]
+    moments = ContactRequest.objects.filter(created_at__lt=month_bounds(cutoff)[0]).datetimes(
+        "created_at", "month", tzinfo=UTC
+    )
+    return [month_start(moment) for moment in moments]
+
+
+def has_unprocessed(month):
+    start, end = month_bounds(month)
+    rows = ContactRequest.objects.filter(created_at__gte=start, created_at__lt=end)
+    return rows.unprocessed().exists()
+
+
+def archive_path(directory, month):
+    return Path(directory) / f"{partition_name(month)}.ndjson.gz"
+
+
+def _write_atomically(path, write):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.partial")
+    with gzip.open(partial, "wb") as stream:
+        write(stream)
+    os.replace(partial, path)
+
+
+def archive_to_file(month, directory):
+    """Выгрузить месяц в ``<directory>/<секция>.ndjson.gz`` и удалить его из таблицы"""
+    path = archive_path(directory, month)
+    name = partition_name(month)
+    if is_partitioned():
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Запись в секцию блокируется на время COPY, чтение и остальные секции - нет
+            cursor.execute(f"LOCK TABLE {name} IN SHARE MODE")
+            _write_atomically(
+                path, lambda stream: cursor.copy_expert(COPY_NDJSON_SQL.format(table=name), stream)
+            )
+            # ACCESS EXCLUSIVE на родителе держится только до COMMIT сразу после DROP
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+        return path
+
+    start, end = month_bounds(month)
+    rows = ContactRequest.objects.filter(created_at__gte=start, created_at__lt=end).order_by("pk")
+    fields = [field.attname for field in ContactRequest._meta.concrete_fields]
+    with transaction.atomic():
+        _write_atomically(path, lambda stream: stream.writelines(export_chunks(rows, fields)))
+        rows.delete()
+    return path
+
+
+def archive_to_table(month):
+    """Перенести секцию месяца в холодную таблицу без копирования строк"""
+    if not is_partitioned():
+        raise RuntimeError(f"{TABLE} is not partitioned, the cold table needs PostgreSQL")
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        cursor.execute(
+            f"ALTER TABLE {ARCHIVE_TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+    return name
@@ -0,0 +1,231 @@
+"""
+Пул долгоживущих соединений для публикации сообщений в RabbitMQ.
+
+Один экземпляр ``RabbitMQPublisher`` живет в каждом процессе: соединения
+открываются лениво, очереди объявляются один раз на соединение, а при обрыве
+соединение переоткрывается и публикация повторяется.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager, suppress
+
+import pika
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PublisherError(Exception):
+    """Не удалось опубликовать сообщение в RabbitMQ"""
+
+
+class PooledConnection:
+    """Соединение с RabbitMQ и его канал для публикации"""
+
+    def __init__(self, parameters, confirms):
+        self.parameters = parameters
+        self.confirms = confirms
+        self.connection = None
+        self.channel = None
+        self.tx_channel = None
+        self.declared_queues = set()
+
+    @property
+    def is_open(self):
+        return (
+            self.connection is not None
+            and self.connection.is_open
+            and self.channel is not None
+            and self.channel.is_open
+        )
+
+    def open(self):
+        self.close()
+        self.connection = pika.BlockingConnection(self.parameters)
+        self.channel = self.connection.channel()
+        if self.confirms:
+            self.channel.confirm_delivery()
+        self.declared_queues = set()
+        metrics.RABBITMQ_RECONNECTS.inc()
+
+    def ensure_open(self):
+        if self.is_open:
+            # Обрабатываем heartbeat-кадры, накопившиеся пока соединение простаивало
+            self.connection.process_data_events(time_limit=0)
+        if not self.is_open:
+            self.open()
+
+    def declare_queue(self, queue_name):
+        if queue_name not in self.declared_queues:
+            self.channel.queue_declare(queue=queue_name, durable=True)
+            self.declared_queues.add(queue_name)
+
+    def publish(self, queue_name, body, channel=None):
+        self.declare_queue(queue_name)
+        (channel or self.channel).basic_publish(
+            exchange="",
+            routing_key=queue_name,
+            body=body,
+            properties=pika.BasicProperties(
+                content_type="application/json",
+                delivery_mode=2,  # make message persistent
+            ),
+        )
+
+    def publish_batch(self, items):
+        """Опубликовать пачку сообщений в одной транзакции канала.
+
+        BlockingChannel в режиме confirm ждет подтверждение каждого сообщения
+        отдельно, поэтому пачка публикуется в транзакционном канале: брокер
+        подтверждает все сообщения одним ответом на tx.commit.
+        """
+        if self.tx_channel is None or not self.tx_channel.is_open:
+            self.tx_channel = self.connection.channel()
+            self.tx_channel.tx_select()
+        for queue_name, body in items:
+            self.publish(queue_name, body, channel=self.tx_channel)
+        self.tx_channel.tx_commit()
+
+    def close(self):
+        connection, self.connection, self.channel = self.connection, None, None
+        self.tx_channel = None
+        if connection is not None and connection.is_open:
+            with suppress(pika.exceptions.AMQPError):
+                connection.close()
+
+
+class RabbitMQPublisher:
+    """Потокобезопасный пул соединений для публикации сообщений"""
+
+    def __init__(
+        self, url=None, queue_name=None, pool_size=None, confirms=None, acquire_timeout=None
+    ):
+        self.parameters = pika.URLParameters(url or settings.RABBITMQ_URL)
+        self.queue_name = queue_name or settings.RABBITMQ_QUEUE_NAME
+        self.pool_size = pool_size or settings.RABBITMQ_PUBLISHER_POOL_SIZE
+        self.confirms = settings.RABBITMQ_PUBLISHER_CONFIRMS if confirms is None else confirms
+        self.acquire_timeout = (
+            settings.RABBITMQ_PUBLISHER_ACQUIRE_TIMEOUT
+            if acquire_timeout is None
+            else acquire_timeout
+        )
+
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        for _ in range(self.pool_size):
+            self._pool.put(PooledConnection(self.parameters, self.confirms))
+        self._in_use = 0
+        self._lock = threading.Lock()
+        metrics.RABBITMQ_POOL_SIZE.set(self.pool_size)
+
+    @contextmanager
+    def acquire(self):
+        """Взять соединение из пула на время публикации"""
+        try:
+            pooled = self._pool.get(timeout=self.acquire_timeout)
+        except queue.Empty as e:
+            raise PublisherError("Timed out waiting for a RabbitMQ connection") from e
+
+        self._track_in_use(1)
+        try:
+            yield pooled
+        finally:
+            self._track_in_use(-1)
+            self._pool.put(pooled)
+
+    def publish(self, message, queue_name=None):
+        """Опубликовать сообщение, переподключившись один раз при обрыве соединения"""
+        queue_name = queue_name or self.queue_name
+        body = json.dumps(message)
+
+        started = time.perf_counter()
+        self._with_retry(queue_name, lambda pooled: pooled.publish(queue_name, body))
+        metrics.RABBITMQ_PUBLISH_LATENCY.labels(queue=queue_name).observe(
+            time.perf_counter() - started
+        )
+        metrics.RABBITMQ_PUBLISHED.labels(queue=queue_name).inc()
+
+    def publish_batch(self, messages):
+        """Опубликовать пачку сообщений ``[(queue_name, message), ...]`` за один commit"""
+        items = [(queue_name or self.queue_name, json.dumps(m)) for queue_name, m in messages]
+        if not items:
+            return
+
+        started = time.perf_counter()
+        self._with_retry("batch", lambda pooled: pooled.publish_batch(items))
+        metrics.RABBITMQ_BATCH_PUBLISH_LATENCY.observe(time.perf_counter() - started)
+        for queue_name, _body in items:
+            metrics.RABBITMQ_PUBLISHED.labels(queue=queue_name).inc()
+
+    def _with_retry(self, queue_name, operation):
+        with self.acquire() as pooled:
+            for attempt in (1, 2):
+                try:
+                    pooled.ensure_open()
+                    return operation(pooled)
+                except pika.exceptions.AMQPError as e:
+                    metrics.RABBITMQ_PUBLISH_ERRORS.labels(queue=queue_name).inc()
+                    pooled.close()
+                    if attempt == 2:
+                        raise PublisherError(f"Failed to publish to {queue_name}: {e!r}") from e
+                    logger.warning("RabbitMQ publish failed, reconnecting: %r", e)
+
+    def stats(self):
+        return {"pool_size": self.pool_size, "in_use": self._in_use}
+
+    def close(self):
+        """Закрыть все простаивающие соединения пула"""
+        pooled_connections = []
+        while True:
+            try:
+                pooled_connections.append(self._pool.get_nowait())
+            except queue.Empty:
+                break
+        for pooled in pooled_connections:
+            pooled.close()
+            self._pool.put(pooled)
+
+    def _track_in_use(self, delta):
+        with self._lock:
+            self._in_use += delta
+            metrics.RABBITMQ_POOL_IN_USE.set(self._in_use)
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher():
+    """Вернуть публикатор текущего процесса, создав его при первом обращении"""
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = RabbitMQPublisher()
+    return _publisher
+
+
+def reset_publisher():
+    """Закрыть и забыть публикатор текущего процесса"""
+    global _publisher
+    with _publisher_lock:
+        publisher, _publisher = _publisher, None
+    if publisher is not None:
+        publisher.close()
+
+
+def _forget_publisher_after_fork():
+    # Сокеты родительского процесса нельзя использовать в дочернем
+    global _publisher, _publisher_lock
+    _publisher = None
+    _publisher_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_publisher_after_fork)
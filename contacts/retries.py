@@ -0,0 +1,106 @@
+"""
+Повторная обработка сообщений воркера с экспоненциальной задержкой.
+
+Упавшее сообщение не отбрасывается, а публикуется в очередь задержки своего
+уровня (``<queue>.retry.<ms>``). У такой очереди нет консьюмеров: брокер держит
+сообщение ``x-message-ttl`` миллисекунд и через ``x-dead-letter-exchange``
+возвращает его в основную очередь. Ожидание не занимает ни воркер, ни CPU, а
+у каждого уровня своя очередь с одинаковым TTL, поэтому сообщения в ней
+истекают по порядку. Номер попытки хранится в заголовке ``x-retry-attempt``;
+после последнего уровня (или при заведомо неисправимой ошибке) сообщение
+попадает в dead-letter очередь, откуда его можно вернуть командой
+``deadletters --replay``.
+"""
+
+import json
+import logging
+
+import pika
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ATTEMPT_HEADER = "x-retry-attempt"
+ERROR_HEADER = "x-last-error"
+MAX_ERROR_LENGTH = 500
+
+# Битое сообщение повторять бессмысленно: оно сразу уходит в dead-letter очередь
+NON_RETRYABLE_ERRORS = (ValueError,)
+
+
+def contact_request_id_from(body):
+    """Достать id запроса на контакт из тела сообщения, если его можно разобрать"""
+    try:
+        return json.loads(body).get("contact_request_id")
+    except (ValueError, AttributeError):
+        return None
+
+
+class RetryPolicy:
+    """Уровни задержки и маршрутизация упавших сообщений"""
+
+    def __init__(self, queue_name=None, delays=None, dead_letter_queue=None):
+        self.queue_name = queue_name or settings.RABBITMQ_QUEUE_NAME
+        self.delays = list(settings.WORKER_RETRY_DELAYS if delays is None else delays)
+        self.dead_letter_queue = dead_letter_queue or f"{self.queue_name}.dead"
+
+    def retry_queue(self, delay):
+        return f"{self.queue_name}.retry.{int(delay * 1000)}"
+
+    def queues(self):
+        """Очереди задержки и dead-letter очередь с аргументами для объявления"""
+        declared = [
+            (
+                self.retry_queue(delay),
+                {
+                    "x-message-ttl": int(delay * 1000),
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": self.queue_name,
+                },
+            )
+            for delay in self.delays
+        ]
+        declared.append((self.dead_letter_queue, None))
+        return declared
+
+    def declare(self, channel):
+        for name, arguments in self.queues():
+            channel.queue_declare(queue=name, durable=True, arguments=arguments)
+
+    def route(self, headers, error):
+        """Вернуть (очередь, заголовки, dead) для следующей попытки сообщения"""
+        headers = dict(headers or {})
+        attempt = int(headers.get(ATTEMPT_HEADER, 0)) + 1
+        headers[ATTEMPT_HEADER] = attempt
+        headers[ERROR_HEADER] = repr(error)[:MAX_ERROR_LENGTH]
+
+        if isinstance(error, NON_RETRYABLE_ERRORS) or attempt > len(self.delays):
+            metrics.WORKER_DEAD_LETTERED.inc()
+            logger.error("Message dead-lettered after %s attempts: %r", attempt, error)
+            return self.dead_letter_queue, headers, True
+
+        delay = self.delays[attempt - 1]
+        metrics.WORKER_RETRIES.labels(delay=f"{delay:g}").inc()
+        logger.warning("Retrying message in %ss (attempt %s): %r", delay, attempt, error)
+        return self.retry_queue(delay), headers, False
+
+    def reschedule(self, channel, body, properties, error):
+        """Опубликовать копию сообщения на следующий уровень, вернуть True для dead-letter.
+
+        Исходное сообщение подтверждает вызывающий код после публикации, поэтому
+        при обрыве соединения оно будет доставлено повторно, а не потеряно.
+        """
+        routing_key, headers, dead = self.route(getattr(properties, "headers", None), error)
+        channel.basic_publish(
+            exchange="",
+            routing_key=routing_key,
+            body=body,
+            properties=pika.BasicProperties(
+                content_type=getattr(properties, "content_type", None) or "application/json",
+                delivery_mode=2,
+                headers=headers,
+            ),
+        )
+        return dead
@@ -8,5 +8,15 @@ class ContactRequestSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ContactRequest
-        fields = ["id", "name", "email", "phone", "message", "created_at", "processed"]
-        read_only_fields = ["created_at", "processed"]
+        fields = [
+            "id",
+            "name",
+            "email",
+            "phone",
+            "message",
+            "created_at",
+            "processed",
+            "processed_at",
+            "delivery_status",
+        ]
+        read_only_fields = ["created_at", "processed", "processed_at", "delivery_status"]
@@ -0,0 +1,105 @@
+"""
+Пакетная запись статусов обработки запросов на контакт.
+
+Воркер не сохраняет каждую строку отдельно (SELECT + UPDATE всех колонок), а
+копит id обработанных запросов и записывает их одним
+``UPDATE ... WHERE id IN (...)`` на пачку или интервал времени. Сообщения
+подтверждаются в RabbitMQ только после записи статуса.
+
+Если задан ``digest`` (``contacts.digest.ServiceDigest``), перед записью
+статусов по запросам пачки отправляется одно сводное уведомление.
+
+UPDATE ограничен горячими секциями таблицы (``contacts.partitions.hot_since``):
+по условию на ``created_at`` PostgreSQL отбрасывает старые секции еще при
+планировании. Только если обновилось меньше строк, чем передано id (повторная
+доставка старого сообщения), оставшиеся ищутся в более старых секциях.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import metrics
+from .models import ContactRequest
+from .partitions import hot_since
+
+
+def _status_values(status):
+    return {"processed": True, "processed_at": timezone.now(), "delivery_status": status}
+
+
+def mark_processed(contact_request_ids, status=ContactRequest.DeliveryStatus.SENT):
+    """Отметить запросы обработанными одним UPDATE, вернуть число обновленных строк"""
+    if not contact_request_ids:
+        return 0
+    rows = ContactRequest.objects.filter(id__in=contact_request_ids)
+    since = hot_since()
+    values = _status_values(status)
+    updated = rows.filter(created_at__gte=since).update(**values)
+    if updated < len(set(contact_request_ids)):
+        updated += rows.filter(created_at__lt=since).update(**values)
+    return updated
+
+
+async def amark_processed(contact_request_ids, status=ContactRequest.DeliveryStatus.SENT):
+    """Асинхронный вариант ``mark_processed`` для asyncio-воркера"""
+    if not contact_request_ids:
+        return 0
+    rows = ContactRequest.objects.filter(id__in=contact_request_ids)
+    since = hot_since()
+    values = _status_values(status)
+    updated = await rows.filter(created_at__gte=since).aupdate(**values)
+    if updated < len(set(contact_request_ids)):
+        updated += await rows.filter(created_at__lt=since).aupdate(**values)
+    return updated
+
+
+def observe_end_to_end_lag(created_at):
+    """Записать задержку от создания запроса (ISO-строка из сообщения) до его обработки"""
+    created_at = parse_datetime(created_at) if created_at else None
+    if created_at is not None:
+        metrics.WORKER_END_TO_END_LAG.observe((timezone.now() - created_at).total_seconds())
+
+
+class StatusUpdateBuffer:
+    """Буфер статусов обработанных сообщений до следующей записи в БД"""
+
+    def __init__(self, max_size=None, max_delay=None, digest=None):
+        self.max_size = max_size or settings.WORKER_STATUS_BATCH_SIZE
+        self.max_delay = settings.WORKER_STATUS_FLUSH_INTERVAL if max_delay is None else max_delay
+        self.digest = digest
+        self.pending = []
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, delivery_tag, contact_request_id, status=ContactRequest.DeliveryStatus.SENT):
+        self.pending.append((delivery_tag, contact_request_id, status))
+
+    def flush(self):
+        """Записать накопленные статусы и вернуть delivery tag для подтверждения"""
+        pending, self.pending = self.pending, []
+        ids_by_status = defaultdict(list)
+        for _delivery_tag, contact_request_id, status in pending:
+            if contact_request_id is not None:
+                ids_by_status[status].append(contact_request_id)
+
+        try:
+            sent_ids = ids_by_status.get(ContactRequest.DeliveryStatus.SENT)
+            if self.digest is not None and sent_ids:
+                with metrics.WORKER_STAGE_LATENCY.labels(stage="digest").time():
+                    self.digest.send(sent_ids)
+            with metrics.WORKER_STAGE_LATENCY.labels(stage="status_update").time():
+                for status, ids in ids_by_status.items():
+                    mark_processed(ids, status)
+                    metrics.WORKER_STATUS_UPDATES.inc()
+        except Exception:
+            # Сообщения останутся неподтвержденными, статус будет записан при повторной доставке
+            self.pending = pending + self.pending
+            raise
+
+        if pending:
+            metrics.WORKER_STATUS_BATCH_SIZE.observe(len(pending))
+        return [delivery_tag for delivery_tag, _id, _status in pending]
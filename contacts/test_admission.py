@@ -0,0 +1,200 @@
+from unittest.mock import MagicMock
+
+import pytest
+from django.core.cache import cache
+from django.db import DatabaseError
+from prometheus_client import REGISTRY
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.test import APIClient
+
+from . import admission
+from .admission import (
+    REASON_BROKER_BACKLOG,
+    REASON_DB_LATENCY,
+    REASON_DB_UNAVAILABLE,
+    LoadShedder,
+    LocalTokenBuckets,
+    RedisTokenBuckets,
+    client_ident,
+    parse_rate,
+    queue_depth_key,
+    record_queue_depth,
+)
+from .models import ContactRequest, OutboxMessage
+
+CONTACT = {"name": "Клиент", "email": "client@example.com", "message": "Здравствуйте"}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def rejected(reason):
+    return REGISTRY.get_sample_value("olki_admission_rejected_total", {"reason": reason}) or 0
+
+
+@pytest.fixture
+def admission_enabled(settings, monkeypatch):
+    settings.CONTACT_ADMISSION_ENABLED = True
+    settings.CONTACT_THROTTLE_IP_RATE = "1/m"
+    settings.CONTACT_THROTTLE_IP_BURST = 2
+    settings.CONTACT_THROTTLE_GLOBAL_RATE = "100/m"
+    settings.CONTACT_THROTTLE_GLOBAL_BURST = 100
+    settings.CONTACT_SHED_BACKLOG = 1000
+    settings.CONTACT_SHED_DB_LATENCY = 0
+    # Одинаковые заявки иначе схлопнулись бы в одну (contacts/idempotency.py)
+    settings.CONTACT_DUPLICATE_WINDOW = 0
+    clock = FakeClock()
+    monkeypatch.setattr(admission, "_token_buckets", LocalTokenBuckets(clock))
+    monkeypatch.setattr(admission, "_load_shedder", LoadShedder(check_interval=1, clock=clock))
+    return clock
+
+
+def post(remote_addr="10.0.0.1", **headers):
+    return APIClient().post(
+        "/api/contacts/", CONTACT, format="json", REMOTE_ADDR=remote_addr, **headers
+    )
+
+
+class TestTokenBuckets:
+    def test_parse_rate(self):
+        assert parse_rate("10/s") == 10
+        assert parse_rate("120/min") == 2
+        assert parse_rate("36/h") == 0.01
+
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        buckets = LocalTokenBuckets(clock)
+        bucket = [("ip", 0.5, 2)]
+        assert buckets.take(bucket) == (None, 0.0)
+        assert buckets.take(bucket) == (None, 0.0)
+        assert buckets.take(bucket) == (0, 2.0)
+        clock.now += 2
+        assert buckets.take(bucket) == (None, 0.0)
+
+    def test_denied_request_takes_no_tokens(self):
+        buckets = LocalTokenBuckets(FakeClock())
+        ip, shared = ("ip", 1, 1), ("global", 1, 3)
+        assert buckets.take([ip, shared])[0] is None
+        assert buckets.take([ip, shared])[0] == 0
+        # Отказ по IP не списал общий токен: у других клиентов осталось два
+        assert buckets.take([("other", 1, 5), shared])[0] is None
+        assert buckets.take([("other", 1, 5), shared])[0] is None
+        assert buckets.take([("other", 1, 5), shared])[0] == 1
+
+    def test_redis_buckets_run_one_script(self):
+        client = MagicMock()
+        client.register_script.return_value.return_value = [2, "0.25"]
+        buckets = RedisTokenBuckets(client)
+
+        assert buckets.take([("ip", 0.5, 2), ("global", 5, 60)]) == (1, 0.25)
+        client.register_script.return_value.assert_called_once_with(
+            keys=["ip", "global"], args=[1, 0.5, 2, 5, 60]
+        )
+        client.register_script.return_value.return_value = [0, "0"]
+        assert buckets.take([("ip", 0.5, 2)]) == (None, 0.0)
+
+
+@pytest.mark.django_db
+class TestThrottling:
+    def test_per_ip_bucket(self, admission_enabled):
+        before = rejected("ip_rate")
+        assert post().status_code == 201
+        assert post().status_code == 201
+
+        response = post()
+        assert response.status_code == 429
+        assert response["Retry-After"] == "60"
+        assert response.json() == {"detail": "Too many requests, please retry later."}
+        assert rejected("ip_rate") == before + 1
+        assert ContactRequest.objects.count() == 2
+
+        assert post(remote_addr="10.0.0.2").status_code == 201
+        admission_enabled.now += 60
+        assert post().status_code == 201
+
+    def test_forwarded_for_is_ignored_without_proxies(self, admission_enabled):
+        for i in range(2):
+            assert post(HTTP_X_FORWARDED_FOR=f"192.0.2.{i}").status_code == 201
+        assert post(HTTP_X_FORWARDED_FOR="192.0.2.99").status_code == 429
+
+    def test_client_ident(self, rf, settings):
+        settings.CONTACT_THROTTLE_NUM_PROXIES = 0
+        request = rf.post("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="192.0.2.1")
+        assert client_ident(request) == "10.0.0.1"
+
+        settings.CONTACT_THROTTLE_NUM_PROXIES = 1
+        # Левую запись подставил клиент, правую дописал доверенный прокси
+        request = rf.post("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="6.6.6.6, 192.0.2.1")
+        assert client_ident(request) == "192.0.2.1"
+        request = rf.post("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="x" * 1000)
+        assert client_ident(request) == "x" * 64
+
+    def test_global_bucket(self, admission_enabled, settings):
+        settings.CONTACT_THROTTLE_GLOBAL_BURST = 2
+        assert post("10.0.0.1").status_code == 201
+        assert post("10.0.0.2").status_code == 201
+        assert post("10.0.0.3").status_code == 429
+
+    def test_other_requests_pass(self, admission_enabled, settings):
+        settings.CONTACT_THROTTLE_IP_BURST = 1
+        assert post().status_code == 201
+        client = APIClient(REMOTE_ADDR="10.0.0.1")
+        assert client.get("/api/contacts/").status_code == 200
+        assert client.post("/api/products/", {}, format="json").status_code != 429
+
+    def test_disabled(self, admission_enabled, settings):
+        settings.CONTACT_ADMISSION_ENABLED = False
+        for _ in range(3):
+            assert post().status_code == 201
+
+    def test_redis_failure_admits(self, admission_enabled, monkeypatch):
+        failing = MagicMock()
+        failing.take.side_effect = RedisConnectionError("down")
+        monkeypatch.setattr(admission, "_token_buckets", failing)
+        before = REGISTRY.get_sample_value("olki_admission_errors_total") or 0
+
+        assert post().status_code == 201
+        assert REGISTRY.get_sample_value("olki_admission_errors_total") == before + 1
+
+
+@pytest.mark.django_db
+class TestLoadShedding:
+    def test_outbox_backlog(self, admission_enabled, settings):
+        settings.CONTACT_SHED_BACKLOG = 2
+        OutboxMessage.objects.bulk_create(OutboxMessage(payload={}) for _ in range(3))
+        before = rejected(REASON_BROKER_BACKLOG)
+
+        response = post()
+        assert response.status_code == 503
+        assert response["Retry-After"] == "1"
+        assert rejected(REASON_BROKER_BACKLOG) == before + 1
+        assert not ContactRequest.objects.exists()
+        assert REGISTRY.get_sample_value("olki_admission_shedding") == 1
+
+        # До следующей проверки решение не пересчитывается
+        OutboxMessage.objects.all().delete()
+        assert post().status_code == 503
+        admission_enabled.now += 1
+        assert post().status_code == 201
+        assert REGISTRY.get_sample_value("olki_admission_shedding") == 0
+
+    def test_queue_depth_from_worker(self, admission_enabled, settings):
+        record_queue_depth(settings.RABBITMQ_QUEUE_NAME, 1001)
+        assert cache.get(queue_depth_key(settings.RABBITMQ_QUEUE_NAME)) == 1001
+        assert post().status_code == 503
+
+    def test_db_latency(self, settings):
+        settings.CONTACT_SHED_DB_LATENCY = 1e-9
+        assert LoadShedder(check_interval=1).check() == REASON_DB_LATENCY
+
+    def test_db_unavailable(self, monkeypatch):
+        def count():
+            raise DatabaseError("connection refused")
+
+        monkeypatch.setattr(OutboxMessage.objects, "count", count)
+        assert LoadShedder(check_interval=1).sample() == REASON_DB_UNAVAILABLE
@@ -0,0 +1,312 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aiosmtplib
+import pytest
+from asgiref.sync import async_to_sync
+from django.core import mail
+from django.core.management import call_command
+
+from .async_worker import AsyncMailer, AsyncStatusBuffer, AsyncWorker
+from .dedup import CacheDedupStore, DedupStore
+from .digest import ServiceDigest
+from .emails import thank_you_email
+from .models import ContactRequest
+from .retries import ATTEMPT_HEADER, RetryPolicy
+
+
+def incoming(payload):
+    message = MagicMock()
+    message.body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    message.ack = AsyncMock()
+    message.nack = AsyncMock()
+    return message
+
+
+@pytest.fixture
+def contact_request(db):
+    return ContactRequest.objects.create(name="Иван", email="ivan@example.com")
+
+
+def payload(contact_request):
+    return {
+        "contact_request_id": contact_request.id,
+        "name": contact_request.name,
+        "email": contact_request.email,
+        "phone": "",
+        "message": "",
+    }
+
+
+@pytest.mark.django_db
+class TestAsyncWorker:
+    def test_process_sends_emails_and_acks_after_update(self, contact_request):
+        worker = AsyncWorker(status_buffer=AsyncStatusBuffer(max_size=10, max_delay=1))
+        message = incoming(payload(contact_request))
+
+        async_to_sync(worker.process)(message)
+
+        assert len(mail.outbox) == 2
+        assert {m.subject for m in mail.outbox} == {
+            "Спасибо за ваш запрос!",
+            f"Новый запрос на контакт от {contact_request.name}",
+        }
+        message.ack.assert_not_awaited()
+
+        async_to_sync(worker.status_buffer.flush)()
+
+        message.ack.assert_awaited_once()
+        contact_request.refresh_from_db()
+        assert contact_request.processed is True
+        assert contact_request.delivery_status == ContactRequest.DeliveryStatus.SENT
+
+    def test_process_flushes_when_batch_full(self, contact_request):
+        worker = AsyncWorker(status_buffer=AsyncStatusBuffer(max_size=1, max_delay=1))
+        message = incoming(payload(contact_request))
+        async_to_sync(worker.process)(message)
+        message.ack.assert_awaited_once()
+
+    def test_process_nacks_invalid_message(self):
+        worker = AsyncWorker(stdout=MagicMock())
+        message = incoming(b"not json")
+
+        async_to_sync(worker.process)(message)
+
+        message.nack.assert_awaited_once_with(requeue=False)
+        assert len(worker.status_buffer) == 0
+        assert "Error processing message" in worker.stdout.write.call_args[0][0]
+
+    def test_process_reschedules_failed_message(self, contact_request):
+        worker = AsyncWorker(retry_policy=RetryPolicy(delays=[5]), mailer=AsyncMock())
+        worker.mailer.send.side_effect = ConnectionError("smtp down")
+        worker.channel = AsyncMock()
+        message = incoming(payload(contact_request))
+        message.headers = {}
+        message.content_type = "application/json"
+
+        async_to_sync(worker.process)(message)
+
+        published, kwargs = worker.channel.default_exchange.publish.call_args
+        assert kwargs["routing_key"] == "email_notifications.retry.5000"
+        assert published[0].headers[ATTEMPT_HEADER] == 1
+        message.ack.assert_awaited_once()
+        message.nack.assert_not_awaited()
+
+    def test_process_dead_letters_and_marks_failed(self, contact_request):
+        worker = AsyncWorker(
+            status_buffer=AsyncStatusBuffer(max_size=1, max_delay=1),
+            retry_policy=RetryPolicy(delays=[5]),
+            mailer=AsyncMock(),
+        )
+        worker.mailer.send.side_effect = ConnectionError("smtp down")
+        worker.channel = AsyncMock()
+        message = incoming(payload(contact_request))
+        message.headers = {ATTEMPT_HEADER: 1}
+        message.content_type = None
+
+        async_to_sync(worker.process)(message)
+
+        kwargs = worker.channel.default_exchange.publish.call_args.kwargs
+        assert kwargs["routing_key"] == "email_notifications.dead"
+        message.ack.assert_awaited_once()
+        contact_request.refresh_from_db()
+        assert contact_request.delivery_status == ContactRequest.DeliveryStatus.FAILED
+
+    @patch("contacts.async_worker.close_old_connections")
+    def test_process_drops_stale_db_connections(self, mock_close, contact_request):
+        worker = AsyncWorker(status_buffer=AsyncStatusBuffer(max_size=1, max_delay=1))
+        async_to_sync(worker.process)(incoming(payload(contact_request)))
+        # Перед обработкой сообщения и перед записью статусов
+        assert mock_close.call_count == 2
+
+    def test_failed_email_waits_for_the_other(self, contact_request):
+        sent = []
+
+        async def send(email_message):
+            if email_message.to == [contact_request.email]:
+                raise ConnectionError("smtp down")
+            await asyncio.sleep(0.01)
+            sent.append(email_message.subject)
+
+        worker = AsyncWorker(mailer=AsyncMock(send=send))
+        with pytest.raises(ConnectionError):
+            async_to_sync(worker.process_message)(payload(contact_request))
+        assert sent == [f"Новый запрос на контакт от {contact_request.name}"]
+
+    @patch("contacts.async_worker.amark_processed", new_callable=AsyncMock)
+    def test_flush_error_keeps_messages_unacked(self, mock_mark_processed):
+        mock_mark_processed.side_effect = RuntimeError("db down")
+        buffer = AsyncStatusBuffer(max_size=10, max_delay=1)
+        message = incoming({})
+        buffer.add(message, 1)
+
+        asyncio.run(buffer.flush())
+
+        message.ack.assert_not_awaited()
+        assert len(buffer) == 1
+
+    @patch("contacts.async_worker.amark_processed", new_callable=AsyncMock)
+    @patch("contacts.async_worker.aio_pika.connect_robust", new_callable=AsyncMock)
+    def test_run_consumes_until_stopped(self, mock_connect, mock_mark_processed, contact_request):
+        worker = AsyncWorker(
+            status_buffer=AsyncStatusBuffer(max_size=10, max_delay=0.01),
+            retry_policy=RetryPolicy(delays=[5]),
+            # asyncio.run выполняет ORM вне потока теста, поэтому маркеры - в кэше
+            dedup=DedupStore(primary=CacheDedupStore()),
+        )
+        message = incoming(payload(contact_request))
+
+        connection = MagicMock()
+        channel = AsyncMock()
+        queue = AsyncMock()
+        connection.channel = AsyncMock(return_value=channel)
+        channel.declare_queue.return_value = queue
+        mock_connect.return_value = connection
+
+        async def consume(callback):
+            await callback(message)
+            asyncio.get_running_loop().call_later(0.05, worker.stop)
+            return "ctag"
+
+        queue.consume.side_effect = consume
+
+        asyncio.run(worker.run())
+
+        channel.set_qos.assert_awaited_once_with(prefetch_count=10)
+        declared = [c.args[0] for c in channel.declare_queue.await_args_list]
+        assert declared == [
+            "email_notifications",
+            "email_notifications.retry.5000",
+            "email_notifications.dead",
+        ]
+        queue.cancel.assert_awaited_once_with("ctag")
+        message.ack.assert_awaited_once()
+        mock_mark_processed.assert_awaited_with(
+            [contact_request.id], ContactRequest.DeliveryStatus.SENT
+        )
+
+    @patch("contacts.async_worker.asyncio.sleep", new_callable=AsyncMock)
+    @patch("contacts.async_worker.aio_pika.connect_robust", new_callable=AsyncMock)
+    def test_run_retries_connection(self, mock_connect, mock_sleep):
+        worker = AsyncWorker()
+
+        def fail_then_stop(*_args, **_kwargs):
+            if mock_connect.await_count == 2:
+                worker.stop()
+            raise ConnectionRefusedError
+
+        mock_connect.side_effect = fail_then_stop
+
+        asyncio.run(worker.run())
+
+        assert mock_connect.await_count == 2
+        mock_sleep.assert_awaited_once_with(5)
+
+
+class TestAsyncMailer:
+    @pytest.fixture(autouse=True)
+    def smtp_settings(self, settings):
+        settings.EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+        settings.EMAIL_HOST_USER = "user"
+        settings.EMAIL_HOST_PASSWORD = "secret"
+
+    @patch("contacts.async_worker.aiosmtplib.SMTP")
+    def test_reuses_smtp_connection(self, mock_smtp):
+        client = mock_smtp.return_value
+        client.is_connected = False
+        client.connect = AsyncMock(side_effect=lambda: setattr(client, "is_connected", True))
+        client.login = AsyncMock()
+        client.send_message = AsyncMock()
+        client.quit = AsyncMock()
+
+        async def send_two():
+            mailer = AsyncMailer(size=1)
+            await mailer.send(thank_you_email("Иван", "ivan@example.com"))
+            await mailer.send(thank_you_email("Петр", "petr@example.com"))
+            await mailer.close()
+
+        asyncio.run(send_two())
+
+        client.connect.assert_awaited_once()
+        client.login.assert_awaited_once_with("user", "secret")
+        assert client.send_message.await_count == 2
+        assert client.send_message.call_args.kwargs["recipients"] == ["petr@example.com"]
+        client.quit.assert_awaited_once()
+
+    @patch("contacts.async_worker.aiosmtplib.SMTP")
+    def test_implicit_tls(self, mock_smtp, settings):
+        settings.EMAIL_USE_SSL = True
+        settings.EMAIL_USE_TLS = False
+
+        asyncio.run(AsyncMailer(size=1)._acquire())
+
+        kwargs = mock_smtp.call_args.kwargs
+        assert (kwargs["use_tls"], kwargs["start_tls"]) == (True, False)
+
+    @patch("contacts.async_worker.aiosmtplib.SMTP")
+    def test_reconnects_after_disconnect(self, mock_smtp):
+        client = mock_smtp.return_value
+        client.is_connected = True
+        client.connect = AsyncMock()
+        client.login = AsyncMock()
+        client.close = MagicMock(side_effect=lambda: setattr(client, "is_connected", False))
+        client.send_message = AsyncMock(
+            side_effect=[aiosmtplib.SMTPServerDisconnected("bye"), None]
+        )
+
+        asyncio.run(AsyncMailer(size=1).send(thank_you_email("Иван", "ivan@example.com")))
+
+        client.connect.assert_awaited_once()
+        assert client.send_message.await_count == 2
+
+    @patch("contacts.async_worker.aiosmtplib.SMTP")
+    def test_raises_other_errors(self, mock_smtp):
+        client = mock_smtp.return_value
+        client.is_connected = True
+        client.send_message = AsyncMock(side_effect=aiosmtplib.SMTPRecipientsRefused([]))
+
+        with pytest.raises(aiosmtplib.SMTPRecipientsRefused):
+            asyncio.run(AsyncMailer(size=1).send(thank_you_email("Иван", "ivan@example.com")))
+
+
+@pytest.mark.django_db
+class TestRunWorkerAsyncioEngine:
+    @patch("contacts.async_worker.AsyncWorker.run", new_callable=AsyncMock)
+    def test_engine_asyncio(self, mock_run):
+        call_command("runworker", "--engine", "asyncio", "--prefetch", "500")
+        mock_run.assert_awaited_once()
+
+    def test_engine_asyncio_requires_optional_dependencies(self):
+        from django.core.management.base import CommandError
+
+        with (
+            patch.dict("sys.modules", {"contacts.async_worker": None}),
+            pytest.raises(CommandError, match="aio-pika"),
+        ):
+            call_command("runworker", "--engine", "asyncio")
+
+
+@pytest.mark.django_db
+def test_digest_mode_sends_service_notifications_in_one_email(db):
+    first = ContactRequest.objects.create(name="Иван", email="ivan@example.com")
+    second = ContactRequest.objects.create(name="Петр", email="petr@example.com")
+    mailer = AsyncMailer()
+    worker = AsyncWorker(
+        status_buffer=AsyncStatusBuffer(
+            max_size=10, max_delay=60, digest=ServiceDigest(asend_email=mailer.send)
+        ),
+        mailer=mailer,
+    )
+    messages = [incoming(payload(first)), incoming(payload(second))]
+
+    for message in messages:
+        async_to_sync(worker.process)(message)
+    assert [m.subject for m in mail.outbox] == ["Спасибо за ваш запрос!"] * 2
+
+    async_to_sync(worker.status_buffer.flush)()
+
+    assert len(mail.outbox) == 3
+    assert mail.outbox[2].subject == "Новые запросы на контакт: 2"
+    for message in messages:
+        message.ack.assert_awaited_once()
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import ContactRequest, ContactRequestBacklog
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def contact_requests(db):
+    contacts = [
+        ContactRequest.objects.create(
+            name=f"Клиент {i}", email=f"client{i}@example.com", processed=i % 3 == 0
+        )
+        for i in range(30)
+    ]
+    now = timezone.now()
+    for i, contact in enumerate(contacts):
+        contact.created_at = now - timedelta(minutes=i)
+    ContactRequest.objects.bulk_update(contacts, ["created_at"])
+    return contacts
+
+
+def unprocessed_ids(contacts):
+    return [contact.id for contact in contacts if not contact.processed]
+
+
+@pytest.mark.django_db
+class TestBacklogEndpoint:
+    def test_pages_through_unprocessed(self, api_client, contact_requests):
+        ids = []
+        response = api_client.get("/api/contacts/backlog/")
+        while True:
+            assert response.status_code == 200
+            assert "count" not in response.data
+            ids += [item["id"] for item in response.data["results"]]
+            if not response.data["next"]:
+                break
+            response = api_client.get(response.data["next"])
+        assert ids == unprocessed_ids(contact_requests)
+
+    def test_sparse_fields(self, api_client, contact_requests):
+        response = api_client.get("/api/contacts/backlog/", {"fields": "id,email"})
+        assert set(response.data["results"][0]) == {"id", "email"}
+
+    def test_reads_partial_index(self, contact_requests):
+        if connection.vendor != "sqlite":
+            pytest.skip("Query plan check is written for SQLite")
+        queryset = ContactRequest.objects.unprocessed().order_by("-created_at", "-id")[:21]
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        assert "contact_unprocessed_idx" in plan
+
+
+@pytest.mark.django_db
+class TestBacklogAdmin:
+    def test_proxy_lists_unprocessed(self, contact_requests):
+        assert list(ContactRequestBacklog.objects.values_list("id", flat=True)) == (
+            unprocessed_ids(contact_requests)
+        )
+
+    def test_changelist(self, admin_client, contact_requests):
+        response = admin_client.get("/admin/contacts/contactrequestbacklog/")
+        assert response.status_code == 200
+        assert response.context["cl"].result_count == len(unprocessed_ids(contact_requests))
+
+        response = admin_client.get("/admin/contacts/contactrequestbacklog/", {"q": "client1"})
+        assert response.status_code == 200
+        names = {contact.name for contact in response.context["cl"].result_list}
+        assert names and all(name.startswith("Клиент 1") for name in names)
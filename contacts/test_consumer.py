@@ -0,0 +1,269 @@
+import json
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.conf import settings
+
+from .consumer import POOL_PROCESS, Consumer, _inherited_connections, _init_process_worker
+from .models import ContactRequest
+from .retries import ATTEMPT_HEADER, RetryPolicy
+from .status_updates import StatusUpdateBuffer
+
+
+class FakeConnection:
+    """BlockingConnection, выполняющий thread-safe колбэки в process_data_events"""
+
+    def __init__(self, *_args, **_kwargs):
+        self.is_open = True
+        self.callbacks = []
+        self.timers = []
+        self.lock = threading.Lock()
+        self.channel_mock = MagicMock()
+
+    def channel(self):
+        return self.channel_mock
+
+    def add_callback_threadsafe(self, callback):
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def call_later(self, delay, callback):
+        self.timers.append((delay, callback))
+
+    def process_data_events(self, time_limit=0):
+        with self.lock:
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def close(self):
+        self.is_open = False
+
+
+def delivery(tag):
+    return MagicMock(delivery_tag=tag)
+
+
+def run_consumer(consumer, bodies):
+    """Запустить consumer.run(), доставив сообщения из start_consuming"""
+    connection = FakeConnection()
+
+    def start_consuming():
+        for tag, body in enumerate(bodies, start=1):
+            consumer.on_message(connection.channel_mock, delivery(tag), None, body)
+
+    connection.channel_mock.start_consuming.side_effect = start_consuming
+    with patch("contacts.consumer.pika.BlockingConnection", return_value=connection):
+        consumer.run()
+    return connection
+
+
+def failing_handler(body):
+    if json.loads(body)["fail"]:
+        raise ValueError("boom")
+
+
+@pytest.mark.django_db
+class TestConsumer:
+    def test_inline_mode_acks_and_nacks(self):
+        consumer = Consumer(failing_handler, queue_name="test_queue", prefetch=5)
+        bodies = [json.dumps({"fail": False}), json.dumps({"fail": True})]
+
+        connection = run_consumer(consumer, bodies)
+
+        channel = connection.channel_mock
+        channel.queue_declare.assert_called_once_with(queue="test_queue", durable=True)
+        channel.basic_qos.assert_called_once_with(prefetch_count=5)
+        channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        channel.basic_nack.assert_called_once_with(delivery_tag=2, requeue=False)
+        assert connection.is_open is False
+
+    def test_thread_pool_processes_concurrently_and_acks_on_connection_thread(self):
+        barrier = threading.Barrier(4, timeout=5)
+        handler_threads = set()
+
+        def handler(_body):
+            handler_threads.add(threading.current_thread().name)
+            barrier.wait()
+
+        consumer = Consumer(handler, concurrency=4)
+        assert consumer.prefetch == 4
+        connection = run_consumer(consumer, [b"{}"] * 4)
+
+        # Все 4 обработчика ждали друг друга на барьере, значит работали параллельно
+        assert len(handler_threads) == 4
+        assert threading.current_thread().name not in handler_threads
+        acked = sorted(
+            c.kwargs["delivery_tag"] for c in connection.channel_mock.basic_ack.mock_calls
+        )
+        assert acked == [1, 2, 3, 4]
+        assert consumer.in_flight == 0
+        assert consumer.executor is None
+
+    def test_thread_pool_nacks_failed_messages(self):
+        consumer = Consumer(failing_handler, concurrency=2)
+        connection = run_consumer(
+            consumer, [json.dumps({"fail": True}), json.dumps({"fail": False})]
+        )
+        connection.channel_mock.basic_nack.assert_called_once_with(delivery_tag=1, requeue=False)
+        connection.channel_mock.basic_ack.assert_called_once_with(delivery_tag=2)
+
+    def test_process_pool(self):
+        consumer = Consumer(failing_handler, concurrency=2, pool=POOL_PROCESS)
+        connection = run_consumer(
+            consumer, [json.dumps({"fail": False}), json.dumps({"fail": True})]
+        )
+        connection.channel_mock.basic_ack.assert_called_once_with(delivery_tag=1)
+        connection.channel_mock.basic_nack.assert_called_once_with(delivery_tag=2, requeue=False)
+
+    def test_process_worker_forgets_inherited_connections(self):
+        inherited = MagicMock()
+        wrapper = MagicMock(connection=inherited)
+        with patch("contacts.consumer.connections") as connections:
+            connections.all.return_value = [wrapper]
+            _init_process_worker()
+        connections.all.assert_called_once_with(initialized_only=True)
+        # Сессию родителя не закрываем: только отвязываем сокет от дочернего процесса
+        inherited.close.assert_not_called()
+        wrapper.close.assert_not_called()
+        assert wrapper.connection is None
+        assert _inherited_connections.pop() is inherited
+
+    def test_failed_message_is_rescheduled_to_delay_queue(self):
+        def flaky_handler(_body):
+            raise ConnectionError("smtp down")
+
+        policy = RetryPolicy(queue_name="test_queue", delays=[5, 60])
+        consumer = Consumer(flaky_handler, queue_name="test_queue", retry_policy=policy)
+
+        connection = run_consumer(consumer, [b"{}"])
+
+        channel = connection.channel_mock
+        channel.queue_declare.assert_any_call(
+            queue="test_queue.retry.5000",
+            durable=True,
+            arguments={
+                "x-message-ttl": 5000,
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": "test_queue",
+            },
+        )
+        published = channel.basic_publish.call_args.kwargs
+        assert published["routing_key"] == "test_queue.retry.5000"
+        assert published["properties"].headers[ATTEMPT_HEADER] == 1
+        channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        channel.basic_nack.assert_not_called()
+
+    def test_dead_lettered_message_is_marked_failed(self):
+        contact_request = ContactRequest.objects.create(name="Иван", email="ivan@example.com")
+        consumer = Consumer(
+            failing_handler,
+            queue_name="test_queue",
+            concurrency=2,
+            status_buffer=StatusUpdateBuffer(max_size=10, max_delay=1),
+            retry_policy=RetryPolicy(queue_name="test_queue", delays=[5]),
+        )
+        body = json.dumps({"fail": True, "contact_request_id": contact_request.id})
+
+        connection = run_consumer(consumer, [body])
+
+        channel = connection.channel_mock
+        assert channel.basic_publish.call_args.kwargs["routing_key"] == "test_queue.dead"
+        channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        contact_request.refresh_from_db()
+        assert contact_request.processed is True
+        assert contact_request.delivery_status == ContactRequest.DeliveryStatus.FAILED
+
+    def test_stop_before_consuming(self):
+        consumer = Consumer(failing_handler)
+        consumer.stop()
+        connection = run_consumer(consumer, [])
+        connection.channel_mock.start_consuming.assert_not_called()
+
+    def test_stop_is_thread_safe(self):
+        consumer = Consumer(failing_handler)
+        connection = FakeConnection()
+        consumer.connection = connection
+        consumer.channel = connection.channel_mock
+
+        consumer.stop()
+        connection.channel_mock.stop_consuming.assert_not_called()
+        connection.process_data_events()
+
+        assert consumer.stopping is True
+        connection.channel_mock.stop_consuming.assert_called_once()
+
+
+@pytest.mark.django_db
+class TestRunWorkerCommand:
+    @patch("contacts.management.commands.runworker.start_http_server")
+    @patch("contacts.management.commands.runworker.Consumer")
+    def test_runworker_options(self, mock_consumer, mock_start_http_server):
+        from django.core.management import call_command
+
+        from contacts.management.commands.runworker import process_delivery
+
+        mock_consumer.return_value.run.side_effect = KeyboardInterrupt
+
+        call_command(
+            "runworker",
+            "--concurrency",
+            "8",
+            "--prefetch",
+            "16",
+            "--pool",
+            "process",
+            "--status-batch-size",
+            "10",
+            "--metrics-port",
+            "9100",
+        )
+
+        args, kwargs = mock_consumer.call_args
+        assert args == (process_delivery,)
+        status_buffer = kwargs.pop("status_buffer")
+        assert status_buffer.max_size == 10
+        assert kwargs.pop("retry_policy").delays == settings.WORKER_RETRY_DELAYS
+        assert kwargs == {
+            "concurrency": 8,
+            "prefetch": 16,
+            "pool": "process",
+            "queue_depth_interval": settings.WORKER_QUEUE_DEPTH_INTERVAL,
+        }
+        mock_start_http_server.assert_called_once_with(9100)
+
+    @patch("contacts.management.commands.runworker.time.sleep")
+    @patch("contacts.management.commands.runworker.Consumer")
+    def test_runworker_reconnects_and_stops_gracefully(self, mock_consumer, mock_sleep):
+        import pika
+        from django.core.management import call_command
+
+        from contacts.management.commands import runworker
+
+        commands = []
+
+        def run():
+            if not commands:
+                commands.append(True)
+                raise pika.exceptions.AMQPConnectionError("down")
+            # Имитируем SIGTERM во время обработки
+            runworker_command.stop()
+
+        mock_consumer.return_value.run.side_effect = run
+        runworker_command = runworker.Command()
+        call_command(runworker_command)
+
+        assert mock_consumer.call_count == 2
+        mock_sleep.assert_called_once_with(5)
+        mock_consumer.return_value.stop.assert_called_once()
+
+    @patch("contacts.management.commands.runworker.send_mail")
+    def test_handle_delivery(self, mock_send_mail):
+        from contacts.management.commands.runworker import process_delivery
+
+        process_delivery(json.dumps({"contact_request_id": 1, "name": "Иван", "email": "a@b.c"}))
+        assert mock_send_mail.call_count == 2
+
+        with pytest.raises(json.JSONDecodeError):
+            process_delivery(b"not json")
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.utils import timezone
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from .dedup import (
+    CLAIMED,
+    DONE,
+    IN_PROGRESS,
+    KIND_THANK_YOU,
+    CacheDedupStore,
+    DatabaseDedupStore,
+    DedupStore,
+    NotificationInProgress,
+    adeliver_once,
+    deliver_once,
+    get_dedup_store,
+)
+from .models import NotificationMarker
+
+
+@pytest.fixture(params=["cache", "db"])
+def store(request, db):
+    if request.param == "cache":
+        return CacheDedupStore()
+    return DatabaseDedupStore()
+
+
+class TestDedupStores:
+    def test_claim_complete_release(self, store):
+        assert store.claim(1, KIND_THANK_YOU) == CLAIMED
+        assert store.claim(1, KIND_THANK_YOU) == IN_PROGRESS
+        assert store.claim(1, "service_notification") == CLAIMED
+
+        store.release(1, KIND_THANK_YOU)
+        assert store.claim(1, KIND_THANK_YOU) == CLAIMED
+
+        store.complete(1, KIND_THANK_YOU)
+        assert store.claim(1, KIND_THANK_YOU) == DONE
+
+    def test_database_store_takes_over_expired_marker(self, db):
+        store = DatabaseDedupStore()
+        assert store.claim(1, KIND_THANK_YOU) == CLAIMED
+        NotificationMarker.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        assert store.claim(1, KIND_THANK_YOU) == CLAIMED
+        marker = NotificationMarker.objects.get()
+        assert marker.state == IN_PROGRESS
+        assert marker.expires_at > timezone.now()
+
+    def test_database_store_purges_expired_markers(self, db):
+        store = DatabaseDedupStore()
+        store.complete(1, KIND_THANK_YOU)
+        store.claim(2, KIND_THANK_YOU)
+        NotificationMarker.objects.filter(contact_request_id=2).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        assert store.purge_expired() == 1
+        assert list(NotificationMarker.objects.values_list("contact_request_id", flat=True)) == [1]
+
+    def test_falls_back_to_database_when_cache_is_down(self, db):
+        primary = MagicMock()
+        primary.claim.side_effect = RedisConnectionError("redis down")
+        store = DedupStore(primary=primary)
+
+        assert store.claim(1, KIND_THANK_YOU) == CLAIMED
+        assert NotificationMarker.objects.get().state == IN_PROGRESS
+
+    def test_get_dedup_store(self, settings):
+        settings.DEDUP_BACKEND = "redis"
+        assert isinstance(get_dedup_store().primary, CacheDedupStore)
+        settings.DEDUP_BACKEND = "db"
+        assert get_dedup_store().primary is None
+
+
+class TestDeliverOnce:
+    def test_duplicate_delivery_is_skipped(self, store):
+        send = MagicMock()
+        assert deliver_once(store, 1, KIND_THANK_YOU, send) is True
+        assert deliver_once(store, 1, KIND_THANK_YOU, send) is False
+        send.assert_called_once()
+
+    def test_in_progress_elsewhere_raises_for_retry(self, store):
+        store.claim(1, KIND_THANK_YOU)
+        send = MagicMock()
+        with pytest.raises(NotificationInProgress):
+            deliver_once(store, 1, KIND_THANK_YOU, send)
+        send.assert_not_called()
+
+    def test_failed_send_releases_marker(self, store):
+        send = MagicMock(side_effect=[ConnectionError("smtp down"), None])
+        with pytest.raises(ConnectionError):
+            deliver_once(store, 1, KIND_THANK_YOU, send)
+        assert deliver_once(store, 1, KIND_THANK_YOU, send) is True
+
+    def test_message_without_id_is_not_deduplicated(self, store):
+        send = MagicMock()
+        deliver_once(store, None, KIND_THANK_YOU, send)
+        deliver_once(store, None, KIND_THANK_YOU, send)
+        assert send.call_count == 2
+
+    def test_async_variant(self, store):
+        sent = []
+
+        async def send():
+            sent.append(True)
+
+        assert async_to_sync(adeliver_once)(store, 1, KIND_THANK_YOU, send) is True
+        assert async_to_sync(adeliver_once)(store, 1, KIND_THANK_YOU, send) is False
+        assert async_to_sync(adeliver_once)(store, None, KIND_THANK_YOU, send) is True
+        assert len(sent) == 2
+
+    def test_async_failed_send_releases_marker(self, store):
+        async def send():
+            raise ConnectionError("smtp down")
+
+        with pytest.raises(ConnectionError):
+            async_to_sync(adeliver_once)(store, 1, KIND_THANK_YOU, send)
+        assert store.claim(1, KIND_THANK_YOU) == CLAIMED
+
+
+@pytest.mark.django_db
+@patch("contacts.management.commands.runworker.send_mail")
+def test_redelivered_message_does_not_resend_emails(mock_send_mail):
+    from contacts.management.commands.runworker import Command
+
+    message = {"contact_request_id": 1, "name": "Иван", "email": "ivan@example.com"}
+    Command().process_message(message)
+    Command().process_message(message)
+
+    assert mock_send_mail.call_count == 2
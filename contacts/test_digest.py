@@ -0,0 +1,143 @@
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core import mail
+from django.core.management import call_command
+
+from .dedup import CLAIMED, DONE, IN_PROGRESS, KIND_SERVICE_NOTIFICATION, DatabaseDedupStore
+from .digest import ServiceDigest
+from .models import ContactRequest
+from .status_updates import StatusUpdateBuffer
+
+
+@pytest.fixture
+def contact_requests(db):
+    return [
+        ContactRequest.objects.create(name=f"Клиент {i}", email=f"client{i}@example.com")
+        for i in range(3)
+    ]
+
+
+@pytest.mark.django_db
+class TestServiceDigest:
+    def test_sends_one_email_for_all_requests(self, contact_requests, settings):
+        ids = [contact_request.id for contact_request in contact_requests]
+
+        assert ServiceDigest().send(ids) == 3
+
+        assert len(mail.outbox) == 1
+        digest = mail.outbox[0]
+        assert digest.subject == "Новые запросы на контакт: 3"
+        assert digest.to == [settings.SERVICE_EMAIL]
+        for contact_request in contact_requests:
+            assert contact_request.name in digest.body
+            assert contact_request.email in digest.body
+
+    def test_already_digested_requests_are_skipped(self, contact_requests):
+        ids = [contact_request.id for contact_request in contact_requests]
+        ServiceDigest().send(ids[:2])
+
+        assert ServiceDigest().send(ids) == 1
+        assert ServiceDigest().send(ids) == 0
+        assert len(mail.outbox) == 2
+        assert mail.outbox[1].subject == "Новые запросы на контакт: 1"
+
+    def test_failed_send_releases_markers(self, contact_requests):
+        ids = [contact_request.id for contact_request in contact_requests]
+        digest = ServiceDigest(send_email=MagicMock(side_effect=ConnectionError("smtp down")))
+
+        with pytest.raises(ConnectionError):
+            digest.send(ids)
+
+        assert ServiceDigest().send(ids) == 3
+
+    def test_failed_send_keeps_foreign_markers(self, contact_requests):
+        ids = [contact_request.id for contact_request in contact_requests]
+        store = DatabaseDedupStore()
+        # Уведомление по первому запросу сейчас отправляет другой воркер
+        assert store.claim(ids[0], KIND_SERVICE_NOTIFICATION) == CLAIMED
+        digest = ServiceDigest(
+            send_email=MagicMock(side_effect=ConnectionError("smtp down")), dedup=store
+        )
+
+        with pytest.raises(ConnectionError):
+            digest.send(ids)
+
+        assert store.claim(ids[0], KIND_SERVICE_NOTIFICATION) == IN_PROGRESS
+        assert store.claim(ids[1], KIND_SERVICE_NOTIFICATION) == CLAIMED
+
+    def test_async_send(self, contact_requests):
+        ids = [contact_request.id for contact_request in contact_requests]
+        asend_email = AsyncMock()
+
+        assert async_to_sync(ServiceDigest(asend_email=asend_email).asend)(ids) == 3
+
+        asend_email.assert_awaited_once()
+        assert DatabaseDedupStore().claim(ids[0], KIND_SERVICE_NOTIFICATION) == DONE
+
+
+@pytest.mark.django_db
+class TestStatusBufferDigest:
+    def test_flush_sends_digest_before_marking_processed(self, contact_requests):
+        buffer = StatusUpdateBuffer(max_size=10, max_delay=60, digest=ServiceDigest())
+        for tag, contact_request in enumerate(contact_requests, start=1):
+            buffer.add(tag, contact_request.id)
+        buffer.add(4, contact_requests[0].id, ContactRequest.DeliveryStatus.FAILED)
+
+        assert buffer.flush() == [1, 2, 3, 4]
+
+        assert len(mail.outbox) == 1
+        assert ContactRequest.objects.filter(processed=True).count() == 3
+
+    def test_digest_failure_keeps_messages_unacknowledged(self, contact_requests):
+        digest = ServiceDigest(send_email=MagicMock(side_effect=ConnectionError("smtp down")))
+        buffer = StatusUpdateBuffer(max_size=10, max_delay=60, digest=digest)
+        buffer.add(1, contact_requests[0].id)
+
+        with pytest.raises(ConnectionError):
+            buffer.flush()
+
+        assert len(buffer) == 1
+        assert ContactRequest.objects.filter(processed=True).count() == 0
+
+
+@pytest.mark.django_db
+class TestRunWorkerDigestMode:
+    def test_handle_delivery_defers_service_notification(self, contact_requests):
+        from contacts.management.commands.runworker import Command
+
+        command = Command()
+        command.service_digest = True
+        contact_request = contact_requests[0]
+        body = json.dumps(
+            {
+                "contact_request_id": contact_request.id,
+                "name": contact_request.name,
+                "email": contact_request.email,
+            }
+        )
+
+        assert command.handle_delivery(body) == contact_request.id
+
+        assert [m.subject for m in mail.outbox] == ["Спасибо за ваш запрос!"]
+
+    @patch("contacts.management.commands.runworker.Consumer")
+    def test_digest_options(self, mock_consumer):
+        mock_consumer.return_value.run.side_effect = KeyboardInterrupt
+
+        call_command("runworker", "--service-digest", "--digest-size", "200")
+
+        status_buffer = mock_consumer.call_args.kwargs["status_buffer"]
+        assert isinstance(status_buffer.digest, ServiceDigest)
+        assert status_buffer.max_size == 200
+        assert mock_consumer.call_args.kwargs["prefetch"] is None
+
+    @patch("contacts.async_worker.AsyncWorker.run", new_callable=AsyncMock)
+    @patch("contacts.async_worker.AsyncWorker.__init__", return_value=None)
+    def test_digest_options_asyncio(self, mock_init, _mock_run):
+        call_command("runworker", "--engine", "asyncio", "--service-digest")
+
+        status_buffer = mock_init.call_args.kwargs["status_buffer"]
+        assert status_buffer.digest.asend_email == mock_init.call_args.kwargs["mailer"].send
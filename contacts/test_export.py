@@ -0,0 +1,158 @@
+import csv
+import gzip
+import io
+import json
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from olki_backend import export
+from products.models import Product
+
+from .models import ContactRequest
+from .views import ContactRequestViewSet
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def contact_requests(db):
+    contacts = [
+        ContactRequest.objects.create(
+            name=f"Клиент {i}", email=f"client{i}@example.com", processed=i % 2 == 0
+        )
+        for i in range(6)
+    ]
+    now = timezone.now()
+    for i, contact in enumerate(contacts):
+        contact.created_at = now - timedelta(days=i)
+    ContactRequest.objects.bulk_update(contacts, ["created_at"])
+    return contacts
+
+
+def body(response):
+    return b"".join(response.streaming_content)
+
+
+def ndjson(data):
+    return [json.loads(line) for line in data.decode().splitlines()]
+
+
+@pytest.mark.django_db
+class TestExportEndpoint:
+    def test_ndjson_by_default(self, api_client, contact_requests):
+        response = api_client.get("/api/contacts/export/")
+        assert response.status_code == 200
+        assert response.streaming
+        assert response["Content-Type"].startswith("application/x-ndjson")
+        assert 'filename="contacts.ndjson"' in response["Content-Disposition"]
+        rows = ndjson(body(response))
+        assert [row["id"] for row in rows] == sorted(c.id for c in contact_requests)
+        assert rows[0]["name"] == "Клиент 0"
+        assert list(rows[0]) == list(ContactRequestViewSet.export_fields)
+
+    def test_csv(self, api_client, contact_requests):
+        response = api_client.get("/api/contacts/export/", {"output": "csv"})
+        assert response["Content-Type"].startswith("text/csv")
+        rows = list(csv.reader(io.StringIO(body(response).decode())))
+        assert rows[0][:3] == ["id", "name", "email"]
+        assert len(rows) == len(contact_requests) + 1
+        # Даты в ISO, пустые значения - пустые строки
+        created_at = rows[0].index("created_at")
+        assert "T" in rows[1][created_at]
+        assert rows[1][rows[0].index("processed_at")] == ""
+
+    def test_filters(self, api_client, contact_requests):
+        since = (timezone.now() - timedelta(days=3, hours=1)).isoformat()
+        response = api_client.get(
+            "/api/contacts/export/", {"created_after": since, "processed": "true"}
+        )
+        rows = ndjson(body(response))
+        assert {row["id"] for row in rows} == {contact_requests[0].id, contact_requests[2].id}
+
+    @pytest.mark.filterwarnings("error::RuntimeWarning")
+    def test_date_filter(self, api_client, contact_requests):
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+        response = api_client.get("/api/contacts/export/", {"created_before": tomorrow})
+        assert len(ndjson(body(response))) == len(contact_requests)
+
+    def test_boundaries_in_current_timezone(self, settings):
+        settings.TIME_ZONE = "Europe/Moscow"
+        midnight = datetime(2025, 12, 31, 21, tzinfo=UTC)
+        assert export._parse_moment("created_after", "2026-01-01") == midnight
+        assert export._parse_moment("created_after", "2026-01-01T00:00") == midnight
+        assert export._parse_moment("created_after", "2025-12-31T23:00+02:00") == midnight
+
+    def test_invalid_params(self, api_client, contact_requests):
+        assert api_client.get("/api/contacts/export/", {"output": "xml"}).status_code == 400
+        assert api_client.get("/api/contacts/export/", {"processed": "maybe"}).status_code == 400
+        response = api_client.get("/api/contacts/export/", {"created_after": "вчера"})
+        assert response.status_code == 400
+
+    def test_gzip(self, api_client, contact_requests):
+        response = api_client.get("/api/contacts/export/", HTTP_ACCEPT_ENCODING="gzip, br")
+        assert response["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response["Vary"]
+        assert len(ndjson(gzip.decompress(body(response)))) == len(contact_requests)
+
+    def test_products(self, api_client, db):
+        Product.objects.create(name="Кабель", description="Медный", price=Decimal("10.50"))
+        response = api_client.get("/api/products/export/")
+        (row,) = ndjson(body(response))
+        assert row["name"] == "Кабель"
+        assert row["price"] == "10.50"
+        # processed у продукции нет: параметр игнорируется
+        response = api_client.get("/api/products/export/", {"processed": "true"})
+        assert len(ndjson(body(response))) == 1
+
+
+@pytest.mark.django_db
+class TestExportChunks:
+    def test_chunks_are_batched(self, contact_requests, monkeypatch):
+        monkeypatch.setattr(export, "STREAM_CHUNK_BYTES", 100)
+        chunks = list(
+            export.export_chunks(
+                ContactRequest.objects.order_by("pk"), ("id", "name"), chunk_size=2
+            )
+        )
+        assert len(chunks) > 1
+        assert len(ndjson(b"".join(chunks))) == len(contact_requests)
+
+    def test_empty(self, db):
+        assert list(export.export_chunks(ContactRequest.objects.all(), ("id",))) == []
+        csv_chunks = export.export_chunks(ContactRequest.objects.all(), ("id",), "csv")
+        assert b"".join(csv_chunks) == b"id\r\n"
+
+
+@pytest.mark.django_db
+class TestExportCommand:
+    def test_file(self, contact_requests, tmp_path):
+        path = tmp_path / "contacts.csv.gz"
+        call_command(
+            "export", "contacts", "--output-format", "csv", "--gzip", "--output", str(path)
+        )
+        rows = list(csv.reader(io.StringIO(gzip.decompress(path.read_bytes()).decode())))
+        assert len(rows) == len(contact_requests) + 1
+
+    def test_filters(self, contact_requests, tmp_path):
+        path = tmp_path / "contacts.ndjson"
+        call_command("export", "contacts", "--processed", "false", "--output", str(path))
+        rows = ndjson(path.read_bytes())
+        assert {row["id"] for row in rows} == {c.id for c in contact_requests if not c.processed}
+
+    def test_stdout(self, contact_requests, capsysbinary):
+        call_command("export", "contacts", "--chunk-size", "2")
+        assert len(ndjson(capsysbinary.readouterr().out)) == len(contact_requests)
+
+    def test_errors(self, db):
+        with pytest.raises(CommandError):
+            call_command("export", "products", "--processed", "true")
+        with pytest.raises(CommandError):
+            call_command("export", "contacts", "--created-after", "never")
@@ -0,0 +1,109 @@
+from unittest.mock import patch
+
+import pytest
+from prometheus_client import REGISTRY
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from .models import ContactRequest, OutboxMessage
+
+CONTACT = {"name": "Клиент", "email": "client@example.com", "message": "Перезвоните"}
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+def post(client, data=CONTACT, key=None):
+    headers = {} if key is None else {"HTTP_IDEMPOTENCY_KEY": key}
+    return client.post("/api/contacts/", data, format="json", **headers)
+
+
+def replays(kind):
+    return REGISTRY.get_sample_value("olki_contact_replays_total", {"kind": kind}) or 0
+
+
+@pytest.mark.django_db
+class TestIdempotencyKey:
+    def test_retry_replays_stored_response(self, api_client):
+        before = replays("idempotency_key")
+        first = post(api_client, key="order-1")
+        assert first.status_code == 201
+        assert "Idempotent-Replayed" not in first
+
+        with patch("contacts.views.enqueue_contact_request") as enqueue:
+            retry = post(api_client, key="order-1")
+        assert retry.status_code == 201
+        assert retry["Idempotent-Replayed"] == "true"
+        assert retry.json() == first.json()
+        enqueue.assert_not_called()
+        assert ContactRequest.objects.count() == 1
+        assert OutboxMessage.objects.count() == 1
+        assert replays("idempotency_key") == before + 1
+
+    def test_new_key_creates_new_request(self, api_client):
+        post(api_client, key="order-1")
+        assert post(api_client, key="order-2").status_code == 201
+        assert ContactRequest.objects.count() == 2
+
+    def test_key_reused_with_other_body(self, api_client):
+        post(api_client, key="order-1")
+        response = post(api_client, {**CONTACT, "message": "Другое"}, key="order-1")
+        assert response.status_code == 422
+        assert ContactRequest.objects.count() == 1
+
+    def test_retry_while_in_progress(self, api_client):
+        retries = []
+
+        def create(_request):
+            retries.append(post(APIClient(), key="order-1"))
+            return Response({}, status=201)
+
+        with patch("contacts.views.ContactRequestViewSet._create", side_effect=create):
+            assert post(api_client, key="order-1").status_code == 201
+        assert retries[0].status_code == 409
+        assert retries[0].json()["detail"].startswith("The same request")
+
+    def test_validation_error_releases_key(self, api_client):
+        assert post(api_client, {**CONTACT, "email": "bad"}, key="order-1").status_code == 400
+        assert post(api_client, key="order-1").status_code == 201
+        assert ContactRequest.objects.count() == 1
+
+    def test_invalid_key(self, api_client):
+        response = post(api_client, key="x" * 256)
+        assert response.status_code == 400
+        assert "Idempotency-Key" in response.json()
+
+
+@pytest.mark.django_db
+class TestDuplicateSubmissions:
+    def test_identical_submission_collapses(self, api_client):
+        before = replays("duplicate")
+        first = post(api_client)
+        retry = post(api_client, {**CONTACT, "email": " Client@Example.com ", "name": "Кто-то"})
+        assert retry["Idempotent-Replayed"] == "true"
+        assert retry.json()["data"]["id"] == first.json()["data"]["id"]
+        assert ContactRequest.objects.count() == 1
+        assert replays("duplicate") == before + 1
+
+    def test_other_message_is_not_a_duplicate(self, api_client):
+        post(api_client)
+        post(api_client, {**CONTACT, "message": "Еще вопрос"})
+        assert ContactRequest.objects.count() == 2
+
+    def test_window_disabled(self, api_client, settings):
+        settings.CONTACT_DUPLICATE_WINDOW = 0
+        post(api_client)
+        post(api_client)
+        assert ContactRequest.objects.count() == 2
+
+    def test_cache_failure_processes_request(self, api_client):
+        before = REGISTRY.get_sample_value("olki_contact_idempotency_errors_total") or 0
+        with patch("contacts.idempotency.cache") as cache:
+            cache.get.side_effect = RedisConnectionError("down")
+            assert post(api_client, key="order-1").status_code == 201
+            assert post(api_client, key="order-1").status_code == 201
+        assert ContactRequest.objects.count() == 2
+        assert REGISTRY.get_sample_value("olki_contact_idempotency_errors_total") == before + 2
@@ -0,0 +1,124 @@
+import smtplib
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from django.core import mail
+from django.core.mail import EmailMessage, send_mail
+
+from . import metrics
+from .mailer import MailConnectionPool, MailerError, get_mail_pool
+
+
+class FakeSMTPBackend:
+    """Почтовый backend с поведением SMTP: open() возвращает True для нового соединения"""
+
+    def __init__(self):
+        self.connection = None
+        self.opened = 0
+        self.sent = []
+        self.errors = []
+
+    def open(self):
+        if self.connection:
+            return False
+        self.connection = MagicMock()
+        self.connection.noop.return_value = (250, b"OK")
+        self.opened += 1
+        return True
+
+    def close(self):
+        self.connection = None
+
+    def send_messages(self, email_messages):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.extend(email_messages)
+        return len(email_messages)
+
+
+@pytest.fixture
+def backend():
+    return FakeSMTPBackend()
+
+
+@pytest.fixture
+def pool(backend):
+    return MailConnectionPool(
+        size=1, health_check_interval=30, acquire_timeout=0.01, connection_factory=lambda: backend
+    )
+
+
+def message(to="ivan@example.com"):
+    return EmailMessage("Тема", "Текст", "noreply@olki-paint.com", [to])
+
+
+class TestMailConnectionPool:
+    def test_connection_reused_between_sends(self, pool, backend):
+        reuses_before = metrics.SMTP_CONNECTION_REUSES._value.get()
+
+        assert pool.send_messages([message()]) == 1
+        assert pool.send_messages([message(), message()]) == 2
+
+        assert backend.opened == 1
+        assert len(backend.sent) == 3
+        assert metrics.SMTP_CONNECTION_REUSES._value.get() == reuses_before + 1
+
+    def test_reconnects_when_server_drops_session(self, pool, backend):
+        pool.send_messages([message()])
+        backend.errors.append(smtplib.SMTPServerDisconnected("Connection unexpectedly closed"))
+
+        assert pool.send_messages([message()]) == 1
+
+        assert backend.opened == 2
+        assert len(backend.sent) == 2
+
+    def test_health_check_replaces_dead_idle_connection(self, pool, backend):
+        pool.send_messages([message()])
+        backend.connection.noop.return_value = (421, b"Service not available")
+        pool._pool.queue[0].last_used = time.monotonic() - 60
+
+        pool.send_messages([message()])
+
+        assert backend.opened == 2
+
+    def test_health_check_skipped_for_recently_used_connection(self, pool, backend):
+        pool.send_messages([message()])
+        smtp = backend.connection
+        pool.send_messages([message()])
+        smtp.noop.assert_not_called()
+
+    def test_raises_after_second_disconnect(self, pool, backend):
+        backend.errors.extend([ConnectionResetError(), smtplib.SMTPServerDisconnected()])
+        with pytest.raises(smtplib.SMTPServerDisconnected):
+            pool.send_messages([message()])
+
+    def test_other_errors_are_not_retried(self, pool, backend):
+        backend.errors.append(smtplib.SMTPRecipientsRefused({}))
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            pool.send_messages([message()])
+        assert backend.opened == 1
+
+    def test_empty_batch(self, pool, backend):
+        assert pool.send_messages([]) == 0
+        assert backend.opened == 0
+
+    def test_acquire_timeout(self, pool):
+        with pool.acquire(), pytest.raises(MailerError), pool.acquire():
+            pass
+
+    def test_close(self, pool, backend):
+        pool.send_messages([message()])
+        pool.close()
+        assert backend.connection is None
+
+    def test_send_mail_through_process_pool(self):
+        send_mail(
+            "Тема",
+            "Текст",
+            "noreply@olki-paint.com",
+            ["ivan@example.com"],
+            connection=get_mail_pool(),
+        )
+        assert len(mail.outbox) == 1
+        assert mail.outbox[0].to == ["ivan@example.com"]
@@ -0,0 +1,113 @@
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+from django.conf import settings
+from django.core.management import CommandError, call_command
+
+from . import metrics
+from .models import ContactRequest, OutboxMessage
+from .outbox import drain, enqueue, enqueue_contact_request, relay_batch
+from .publisher import PublisherError
+
+
+@pytest.fixture
+def publisher():
+    return MagicMock()
+
+
+@pytest.fixture
+def outbox_messages(db):
+    return [enqueue({"contact_request_id": i}) for i in range(5)]
+
+
+@pytest.mark.django_db
+class TestOutbox:
+    def test_enqueue_contact_request(self):
+        contact = ContactRequest.objects.create(name="Иван", email="ivan@example.com")
+        message = enqueue_contact_request(contact)
+        assert message.queue == settings.RABBITMQ_QUEUE_NAME
+        assert message.payload == {
+            "contact_request_id": contact.id,
+            "name": "Иван",
+            "email": "ivan@example.com",
+            "phone": "",
+            "message": "",
+            "created_at": contact.created_at.isoformat(),
+        }
+
+    def test_relay_batch_publishes_and_deletes(self, publisher, outbox_messages):
+        relayed_before = metrics.OUTBOX_RELAYED._value.get()
+
+        assert relay_batch(publisher, batch_size=3) == 3
+
+        publisher.publish_batch.assert_called_once_with(
+            [(settings.RABBITMQ_QUEUE_NAME, {"contact_request_id": i}) for i in range(3)]
+        )
+        assert list(OutboxMessage.objects.values_list("id", flat=True)) == [
+            m.id for m in outbox_messages[3:]
+        ]
+        assert metrics.OUTBOX_RELAYED._value.get() == relayed_before + 3
+
+    def test_relay_batch_empty_outbox(self, publisher):
+        assert relay_batch(publisher) == 0
+        publisher.publish_batch.assert_not_called()
+
+    def test_relay_batch_keeps_messages_on_failure(self, publisher, outbox_messages):
+        publisher.publish_batch.side_effect = PublisherError("broker down")
+
+        with pytest.raises(PublisherError):
+            relay_batch(publisher, batch_size=2)
+
+        assert OutboxMessage.objects.count() == 5
+        failed = OutboxMessage.objects.filter(attempts=1)
+        assert failed.count() == 2
+        assert failed.first().last_error == "broker down"
+
+    def test_drain_publishes_everything(self, publisher, outbox_messages):
+        relayed, elapsed = drain(publisher, batch_size=2)
+        assert relayed == 5
+        assert elapsed >= 0
+        assert publisher.publish_batch.call_count == 3
+        assert OutboxMessage.objects.count() == 0
+        assert metrics.OUTBOX_PENDING._value.get() == 0
+
+
+@pytest.mark.django_db
+class TestRunRelayCommand:
+    @patch("contacts.management.commands.runrelay.get_publisher")
+    def test_runrelay_once(self, mock_get_publisher, outbox_messages):
+        call_command("runrelay", "--once", "--batch-size", "2")
+
+        assert mock_get_publisher.return_value.publish_batch.call_count == 3
+        assert OutboxMessage.objects.count() == 0
+        mock_get_publisher.return_value.close.assert_called_once()
+
+    @patch("contacts.management.commands.runrelay.time.sleep")
+    @patch("contacts.management.commands.runrelay.get_publisher")
+    def test_runrelay_retries_when_broker_down(
+        self, mock_get_publisher, mock_sleep, outbox_messages
+    ):
+        publisher = mock_get_publisher.return_value
+        publisher.publish_batch.side_effect = [PublisherError("down"), None]
+        # Вторая пауза - уже после успешной отправки, на ней останавливаем relay
+        mock_sleep.side_effect = [None, KeyboardInterrupt]
+
+        call_command("runrelay", "--batch-size", "10")
+
+        assert mock_sleep.call_args_list[0] == call(settings.OUTBOX_RELAY_RETRY_DELAY)
+        assert OutboxMessage.objects.count() == 0
+
+    @patch("contacts.management.commands.runrelay.time.sleep")
+    @patch("contacts.management.commands.runrelay.get_publisher")
+    def test_runrelay_once_fails_when_broker_down(
+        self, mock_get_publisher, mock_sleep, outbox_messages
+    ):
+        publisher = mock_get_publisher.return_value
+        publisher.publish_batch.side_effect = PublisherError("down")
+
+        with pytest.raises(CommandError, match="down"):
+            call_command("runrelay", "--once", "--batch-size", "10")
+
+        mock_sleep.assert_not_called()
+        publisher.close.assert_called_once()
+        assert OutboxMessage.objects.count() == len(outbox_messages)
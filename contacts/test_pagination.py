@@ -0,0 +1,121 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from olki_backend.pagination import KeysetPagination
+from products.models import Product
+
+from .models import ContactRequest
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def contact_requests(db):
+    contacts = [
+        ContactRequest.objects.create(name=f"Клиент {i}", email=f"client{i}@example.com")
+        for i in range(45)
+    ]
+    # Часть запросов с одинаковым created_at: порядок внутри них держит id
+    now = timezone.now()
+    for i, contact in enumerate(contacts):
+        contact.created_at = now - timedelta(minutes=i // 3)
+    ContactRequest.objects.bulk_update(contacts, ["created_at"])
+    return list(ContactRequest.objects.all())
+
+
+def walk(api_client, url, params=None):
+    pages = []
+    response = api_client.get(url, params)
+    while True:
+        assert response.status_code == 200
+        pages.append(response.data)
+        if not response.data["next"]:
+            return pages
+        response = api_client.get(response.data["next"])
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    def test_page_number_is_default(self, api_client, contact_requests):
+        response = api_client.get("/api/contacts/")
+        assert response.data["count"] == 45
+        assert len(response.data["results"]) == 20
+
+    def test_walks_all_rows_in_order(self, api_client, contact_requests):
+        pages = walk(api_client, "/api/contacts/", {"cursor": ""})
+
+        assert [len(page["results"]) for page in pages] == [20, 20, 5]
+        assert "count" not in pages[0]
+        assert pages[0]["previous"] is None
+        assert [row["id"] for page in pages for row in page["results"]] == [
+            contact.id for contact in contact_requests
+        ]
+
+    def test_previous_link(self, api_client, contact_requests):
+        pages = walk(api_client, "/api/contacts/", {"cursor": ""})
+
+        previous = api_client.get(pages[2]["previous"]).data
+        assert previous["results"] == pages[1]["results"]
+        first = api_client.get(previous["previous"]).data
+        assert first["results"] == pages[0]["results"]
+        assert first["previous"] is None
+
+    def test_deep_page_has_no_count_or_offset(self, api_client, contact_requests):
+        second = api_client.get("/api/contacts/", {"cursor": ""}).data["next"]
+
+        with CaptureQueriesContext(connection) as queries:
+            api_client.get(second)
+
+        sql = [query["sql"] for query in queries if "contacts_contactrequest" in query["sql"]]
+        assert len(sql) == 1
+        assert "COUNT" not in sql[0].upper()
+        assert "OFFSET" not in sql[0].upper()
+
+    def test_empty_page_links_back_to_start(self, api_client, contact_requests):
+        cursor = KeysetPagination.encode_cursor(contact_requests[-1].created_at, 0)
+        response = api_client.get("/api/contacts/", {"cursor": cursor})
+        assert response.data["results"] == []
+        assert response.data["next"] is None
+        assert response.data["previous"].endswith("cursor=")
+
+    @pytest.mark.parametrize("cursor", ["garbage", "eHx5fHo=", "bnwyMDIwLTAxLTAxfHg="])
+    def test_invalid_cursor(self, api_client, db, cursor):
+        assert api_client.get("/api/contacts/", {"cursor": cursor}).status_code == 404
+
+    def test_products(self, api_client, db):
+        for i in range(25):
+            Product.objects.create(name=f"Product {i}", description="Desc", price=100)
+
+        pages = walk(api_client, "/api/products/", {"cursor": ""})
+
+        assert [len(page["results"]) for page in pages] == [20, 5]
+        assert [row["id"] for page in pages for row in page["results"]] == list(
+            Product.objects.values_list("id", flat=True)
+        )
+
+    def test_search_pages_by_number(self, api_client, db):
+        for i in range(25):
+            Product.objects.create(name=f"Краска {i}", description="Desc", price=100)
+        Product.objects.create(name="Эмаль", description="Desc", price=100)
+
+        response = api_client.get("/api/products/", {"search": "краска", "cursor": ""})
+        assert response.status_code == 400
+        assert "cursor" in response.data
+
+        ids, url, params = [], "/api/products/", {"search": "краска"}
+        while url:
+            data = api_client.get(url, params).data
+            ids += [row["id"] for row in data["results"]]
+            url, params = data["next"], None
+        assert sorted(ids) == sorted(
+            Product.objects.filter(name__startswith="Краска").values_list("id", flat=True)
+        )
+        assert len(ids) == len(set(ids)) == 25
@@ -0,0 +1,179 @@
+import gzip
+import io
+import json
+from datetime import UTC, date, datetime, timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import ContactRequest
+from .partitions import (
+    TABLE,
+    UNPARTITIONED_TABLE,
+    add_months,
+    archivable_months,
+    create_partition_sql,
+    has_unpartitioned_table,
+    hot_since,
+    month_bounds,
+    partition_name,
+)
+from .status_updates import amark_processed, mark_processed
+
+
+def contact_at(created_at, processed=True, name="Клиент"):
+    contact = ContactRequest.objects.create(
+        name=name, email="client@example.com", processed=processed
+    )
+    ContactRequest.objects.filter(pk=contact.pk).update(created_at=created_at)
+    return contact
+
+
+def months_ago(count):
+    start, _end = month_bounds(add_months(date.today(), -count))
+    return start + timedelta(days=3)
+
+
+class TestMonths:
+    def test_add_months(self):
+        assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+        assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+        assert add_months(date(2026, 3, 1), -14) == date(2025, 1, 1)
+
+    def test_bounds_and_names(self):
+        assert month_bounds(date(2026, 12, 1)) == (
+            datetime(2026, 12, 1, tzinfo=UTC),
+            datetime(2027, 1, 1, tzinfo=UTC),
+        )
+        assert partition_name(date(2026, 2, 1)) == "contacts_contactrequest_p2026_02"
+
+    def test_hot_since(self, settings):
+        settings.CONTACT_HOT_MONTHS = 2
+        now = datetime(2026, 1, 15, tzinfo=UTC)
+        assert hot_since(now) == datetime(2025, 12, 1, tzinfo=UTC)
+
+    def test_create_partition_moves_default_rows(self):
+        create, move, attach = create_partition_sql(date(2026, 10, 1))
+        assert create.startswith("CREATE TABLE contacts_contactrequest_p2026_10 (LIKE")
+        assert "DELETE FROM contacts_contactrequest_default" in move
+        assert attach.endswith("FOR VALUES FROM ('2026-10-01') TO ('2026-11-01')")
+
+
+@pytest.mark.django_db
+class TestHotStatusUpdates:
+    def test_hot_rows_updated_in_one_query(self):
+        contacts = [contact_at(timezone.now(), processed=False) for _ in range(3)]
+        with CaptureQueriesContext(connection) as queries:
+            assert mark_processed([contact.pk for contact in contacts]) == 3
+        assert len(queries) == 1
+        assert "created_at" in queries[0]["sql"]
+
+    def test_old_rows_fall_back(self):
+        hot = contact_at(timezone.now(), processed=False)
+        old = contact_at(months_ago(6), processed=False)
+        with CaptureQueriesContext(connection) as queries:
+            assert mark_processed([hot.pk, old.pk, hot.pk]) == 2
+        assert len(queries) == 2
+        assert not ContactRequest.objects.unprocessed().exists()
+
+    def test_async_fallback(self):
+        hot = contact_at(timezone.now(), processed=False)
+        old = contact_at(months_ago(6), processed=False)
+        assert async_to_sync(amark_processed)([hot.pk, old.pk]) == 2
+        assert not ContactRequest.objects.unprocessed().exists()
+        assert async_to_sync(amark_processed)([]) == 0
+
+
+@pytest.fixture
+def history(db):
+    return {
+        "old": [contact_at(months_ago(14), name=f"Старый {i}") for i in range(3)],
+        "pending": contact_at(months_ago(13), processed=False),
+        "recent": contact_at(months_ago(1)),
+    }
+
+
+@pytest.mark.django_db
+class TestArchive:
+    def test_archivable_months(self, history):
+        months = archivable_months(12)
+        assert months == [
+            add_months(date.today().replace(day=1), -14),
+            add_months(date.today().replace(day=1), -13),
+        ]
+
+    def test_archives_processed_months_to_files(self, history, tmp_path):
+        out, err = io.StringIO(), io.StringIO()
+        call_command("archive_contacts", "--directory", str(tmp_path), stdout=out, stderr=err)
+
+        assert "Archived 1 months" in out.getvalue()
+        assert "has unprocessed requests" in err.getvalue()
+        (path,) = tmp_path.glob("*.ndjson.gz")
+        assert (
+            path.name == f"{partition_name(add_months(date.today().replace(day=1), -14))}.ndjson.gz"
+        )
+        rows = [json.loads(line) for line in gzip.decompress(path.read_bytes()).splitlines()]
+        assert [row["id"] for row in rows] == [contact.pk for contact in history["old"]]
+        assert rows[0]["name"] == "Старый 0"
+        assert not ContactRequest.objects.filter(pk__in=[c.pk for c in history["old"]]).exists()
+        assert ContactRequest.objects.count() == 2
+
+    def test_dry_run(self, history, tmp_path):
+        out = io.StringIO()
+        call_command("archive_contacts", "--dry-run", "--directory", str(tmp_path), stdout=out)
+        assert "Would archive" in out.getvalue()
+        assert not list(tmp_path.iterdir())
+        assert ContactRequest.objects.count() == 5
+
+    def test_errors(self, db, settings):
+        settings.CONTACT_HOT_MONTHS = 2
+        with pytest.raises(CommandError, match="CONTACT_HOT_MONTHS"):
+            call_command("archive_contacts", "--older-than", "1")
+        with pytest.raises(CommandError, match="cold table"):
+            call_command("archive_contacts", "--to", "table")
+
+    def test_manage_partitions_without_postgres(self, db):
+        out = io.StringIO()
+        call_command("manage_partitions", stdout=out)
+        assert "not partitioned" in out.getvalue()
+
+    def test_backfill_without_postgres(self, db):
+        out = io.StringIO()
+        call_command("backfill_partitions", stdout=out)
+        assert "nothing to do" in out.getvalue()
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="partitions need PostgreSQL")
+@pytest.mark.django_db
+class TestBackfillOnPostgres:
+    def test_moves_rows_in_batches(self):
+        contacts = [contact_at(months_ago(i)) for i in range(5)]
+        # Как после миграции 0007 на непустой таблице: строки лежат в прежней таблице
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {UNPARTITIONED_TABLE} (LIKE {TABLE})")
+            cursor.execute(f"ALTER TABLE {UNPARTITIONED_TABLE} ADD PRIMARY KEY (id)")
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {TABLE} RETURNING *) "
+                f"INSERT INTO {UNPARTITIONED_TABLE} SELECT * FROM moved"
+            )
+        assert not ContactRequest.objects.exists()
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                "backfill_partitions",
+                "--batch-size",
+                "2",
+                stdout=io.StringIO(),
+                stderr=io.StringIO(),
+            )
+
+        moves = [query for query in queries if query["sql"].startswith("WITH moved")]
+        assert len(moves) == 4
+        assert sorted(ContactRequest.objects.values_list("id", flat=True)) == sorted(
+            contact.id for contact in contacts
+        )
+        assert not has_unpartitioned_table()
@@ -0,0 +1,123 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.core.management import call_command
+
+from .retries import ATTEMPT_HEADER, ERROR_HEADER, RetryPolicy, contact_request_id_from
+
+
+@pytest.fixture
+def policy():
+    return RetryPolicy(queue_name="notifications", delays=[1, 30, 0.5])
+
+
+class TestRetryPolicy:
+    def test_queues(self, policy):
+        queues = dict(policy.queues())
+        assert list(queues) == [
+            "notifications.retry.1000",
+            "notifications.retry.30000",
+            "notifications.retry.500",
+            "notifications.dead",
+        ]
+        assert queues["notifications.retry.30000"] == {
+            "x-message-ttl": 30000,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": "notifications",
+        }
+        assert queues["notifications.dead"] is None
+
+    def test_route_walks_backoff_tiers_then_dead_letters(self, policy):
+        headers = None
+        routes = []
+        for _ in range(4):
+            queue, headers, dead = policy.route(headers, ConnectionError("smtp down"))
+            routes.append((queue, headers[ATTEMPT_HEADER], dead))
+
+        assert routes == [
+            ("notifications.retry.1000", 1, False),
+            ("notifications.retry.30000", 2, False),
+            ("notifications.retry.500", 3, False),
+            ("notifications.dead", 4, True),
+        ]
+        assert headers[ERROR_HEADER] == "ConnectionError('smtp down')"
+
+    def test_route_keeps_other_headers_and_does_not_mutate_them(self, policy):
+        original = {"trace-id": "abc"}
+        _queue, headers, _dead = policy.route(original, ConnectionError())
+        assert headers["trace-id"] == "abc"
+        assert original == {"trace-id": "abc"}
+
+    def test_malformed_message_is_dead_lettered_immediately(self, policy):
+        queue, headers, dead = policy.route({}, json.JSONDecodeError("bad", "doc", 0))
+        assert (queue, headers[ATTEMPT_HEADER], dead) == ("notifications.dead", 1, True)
+
+    def test_without_delays_failures_go_straight_to_dead_letters(self):
+        queue, _headers, dead = RetryPolicy(queue_name="q", delays=[]).route({}, OSError())
+        assert (queue, dead) == ("q.dead", True)
+
+    def test_default_settings(self, settings):
+        settings.WORKER_RETRY_DELAYS = [10, 60]
+        policy = RetryPolicy()
+        assert policy.queue_name == settings.RABBITMQ_QUEUE_NAME
+        assert policy.delays == [10, 60]
+        assert policy.dead_letter_queue == f"{settings.RABBITMQ_QUEUE_NAME}.dead"
+
+    def test_contact_request_id_from(self):
+        assert contact_request_id_from(b'{"contact_request_id": 7}') == 7
+        assert contact_request_id_from(b"not json") is None
+        assert contact_request_id_from(b"[]") is None
+
+
+def dead_letter(tag, body, headers):
+    return (
+        MagicMock(delivery_tag=tag),
+        MagicMock(headers=headers, content_type="application/json"),
+        body,
+    )
+
+
+@patch("contacts.management.commands.deadletters.pika.BlockingConnection")
+class TestDeadLettersCommand:
+    def setup_channel(self, mock_connection, messages):
+        channel = mock_connection.return_value.channel.return_value
+        channel.queue_declare.return_value.method.message_count = len(messages)
+        channel.basic_get.side_effect = [*messages, (None, None, None)]
+        return channel
+
+    def test_inspect_leaves_messages_in_queue(self, mock_connection, capsys):
+        channel = self.setup_channel(
+            mock_connection,
+            [dead_letter(1, b'{"contact_request_id": 1}', {ATTEMPT_HEADER: 5, ERROR_HEADER: "E"})],
+        )
+
+        call_command("deadletters")
+
+        output = capsys.readouterr().out
+        assert "1 messages in email_notifications.dead" in output
+        assert 'attempts=5 error=E body={"contact_request_id": 1}' in output
+        channel.basic_ack.assert_not_called()
+        channel.basic_publish.assert_not_called()
+        mock_connection.return_value.close.assert_called_once()
+
+    def test_replay_moves_messages_with_fresh_retry_budget(self, mock_connection, capsys):
+        channel = self.setup_channel(
+            mock_connection,
+            [
+                dead_letter(1, b"{}", {ATTEMPT_HEADER: 5, ERROR_HEADER: "E", "trace-id": "a"}),
+                dead_letter(2, b"{}", None),
+                dead_letter(3, b"{}", None),
+            ],
+        )
+
+        call_command("deadletters", "--replay", "--limit", "2")
+
+        channel.confirm_delivery.assert_called_once()
+        assert channel.basic_publish.call_count == 2
+        published = channel.basic_publish.call_args_list[0].kwargs
+        assert published["routing_key"] == "email_notifications"
+        assert published["properties"].headers == {"trace-id": "a"}
+        acked = [c.kwargs["delivery_tag"] for c in channel.basic_ack.call_args_list]
+        assert acked == [1, 2]
+        assert "Replayed 2 messages" in capsys.readouterr().out
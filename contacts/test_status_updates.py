@@ -0,0 +1,121 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+
+from .consumer import Consumer
+from .models import ContactRequest
+from .status_updates import StatusUpdateBuffer, mark_processed
+from .test_consumer import run_consumer
+
+
+@pytest.fixture
+def contacts(db):
+    return [
+        ContactRequest.objects.create(name=f"User {i}", email=f"user{i}@example.com")
+        for i in range(4)
+    ]
+
+
+def contact_id_handler(body):
+    return json.loads(body)["contact_request_id"]
+
+
+@pytest.mark.django_db
+class TestStatusUpdates:
+    def test_mark_processed_single_update(self, contacts):
+        ids = [c.id for c in contacts[:3]]
+        with CaptureQueriesContext(connection) as queries:
+            assert mark_processed(ids) == 3
+        assert len(queries) == 1
+        assert queries[0]["sql"].startswith("UPDATE")
+
+        processed = ContactRequest.objects.filter(processed=True)
+        assert sorted(processed.values_list("id", flat=True)) == sorted(ids)
+        assert all(c.processed_at is not None for c in processed)
+        assert {c.delivery_status for c in processed} == {ContactRequest.DeliveryStatus.SENT}
+
+    def test_mark_processed_empty(self):
+        assert mark_processed([]) == 0
+
+    def test_buffer_groups_by_status(self, contacts):
+        buffer = StatusUpdateBuffer(max_size=10, max_delay=1)
+        buffer.add(1, contacts[0].id)
+        buffer.add(2, contacts[1].id, ContactRequest.DeliveryStatus.FAILED)
+        buffer.add(3, None)
+
+        with CaptureQueriesContext(connection) as queries:
+            assert buffer.flush() == [1, 2, 3]
+
+        assert len(queries) == 2
+        assert len(buffer) == 0
+        contacts[1].refresh_from_db()
+        assert contacts[1].delivery_status == ContactRequest.DeliveryStatus.FAILED
+
+    def test_buffer_keeps_pending_on_error(self, contacts):
+        buffer = StatusUpdateBuffer(max_size=10, max_delay=1)
+        buffer.add(1, contacts[0].id)
+        with (
+            patch("contacts.status_updates.mark_processed", side_effect=DatabaseError),
+            pytest.raises(DatabaseError),
+        ):
+            buffer.flush()
+        assert len(buffer) == 1
+
+
+@pytest.mark.django_db
+class TestBufferedConsumer:
+    def test_acks_after_single_bulk_update(self, contacts):
+        buffer = StatusUpdateBuffer(max_size=10, max_delay=1)
+        consumer = Consumer(contact_id_handler, status_buffer=buffer)
+        assert consumer.prefetch == 10
+        bodies = [json.dumps({"contact_request_id": c.id}) for c in contacts]
+
+        with CaptureQueriesContext(connection) as queries:
+            connection_mock = run_consumer(consumer, bodies)
+
+        # Все 4 статуса записаны одним UPDATE при остановке
+        assert [q["sql"].split()[0] for q in queries] == ["UPDATE"]
+        acked = [
+            c.kwargs["delivery_tag"] for c in connection_mock.channel_mock.basic_ack.mock_calls
+        ]
+        assert acked == [1, 2, 3, 4]
+        assert ContactRequest.objects.filter(processed=True).count() == 4
+        assert connection_mock.timers[0][0] == 1
+
+    def test_flushes_when_batch_is_full(self, contacts):
+        buffer = StatusUpdateBuffer(max_size=2, max_delay=1)
+        consumer = Consumer(contact_id_handler, status_buffer=buffer, prefetch=10)
+        bodies = [json.dumps({"contact_request_id": c.id}) for c in contacts[:3]]
+
+        with CaptureQueriesContext(connection) as queries:
+            run_consumer(consumer, bodies)
+
+        # Пачка из 2 по заполнению и остаток из 1 при остановке
+        assert len(queries) == 2
+
+    def test_timer_flushes_and_reschedules(self, contacts):
+        buffer = StatusUpdateBuffer(max_size=10, max_delay=0.5)
+        consumer = Consumer(contact_id_handler, status_buffer=buffer)
+        connection_mock = run_consumer(consumer, [])
+        connection_mock.is_open = True
+        consumer.channel = connection_mock.channel_mock
+        buffer.add(7, contacts[0].id)
+
+        delay, timer = connection_mock.timers[0]
+        timer()
+
+        connection_mock.channel_mock.basic_ack.assert_called_once_with(delivery_tag=7)
+        assert len(connection_mock.timers) == 2
+
+    def test_flush_error_keeps_messages_unacked(self, contacts):
+        buffer = StatusUpdateBuffer(max_size=1, max_delay=1)
+        consumer = Consumer(contact_id_handler, status_buffer=buffer)
+        with patch("contacts.status_updates.mark_processed", side_effect=DatabaseError):
+            connection_mock = run_consumer(
+                consumer, [json.dumps({"contact_request_id": contacts[0].id})]
+            )
+        connection_mock.channel_mock.basic_ack.assert_not_called()
+        assert len(buffer) == 1
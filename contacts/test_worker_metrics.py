@@ -0,0 +1,151 @@
+import asyncio
+import json
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pika
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from . import metrics
+from .admission import queue_depth_key
+from .consumer import Consumer
+from .retries import RetryPolicy
+from .status_updates import StatusUpdateBuffer
+from .test_consumer import FakeConnection, failing_handler, run_consumer
+
+
+def sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+def stage_count(stage):
+    return sample("olki_worker_stage_seconds_count", {"stage": stage})
+
+
+@pytest.mark.django_db
+class TestConsumerMetrics:
+    def test_counts_consumed_acked_and_nacked(self):
+        before = [
+            sample("olki_worker_messages_consumed_total"),
+            sample("olki_worker_messages_acked_total"),
+            sample("olki_worker_messages_nacked_total"),
+        ]
+        consumer = Consumer(failing_handler, queue_name="test_queue")
+
+        run_consumer(consumer, [json.dumps({"fail": False}), json.dumps({"fail": True})])
+
+        after = [
+            sample("olki_worker_messages_consumed_total"),
+            sample("olki_worker_messages_acked_total"),
+            sample("olki_worker_messages_nacked_total"),
+        ]
+        assert [a - b for a, b in zip(after, before, strict=True)] == [2, 1, 1]
+
+    def test_samples_queue_depth_with_passive_declare(self):
+        consumer = Consumer(
+            failing_handler,
+            queue_name="test_queue",
+            retry_policy=RetryPolicy(queue_name="test_queue", delays=[5]),
+            queue_depth_interval=15,
+        )
+
+        connection = run_consumer(consumer, [])
+
+        # Первое измерение сразу после подписки, дальше по таймеру
+        delay, callback = connection.timers[0]
+        assert delay == 0
+        connection.is_open = True
+        connection.channel_mock.queue_declare.return_value.method.message_count = 7
+        callback()
+
+        connection.channel_mock.queue_declare.assert_any_call(
+            queue="test_queue.retry.5000", passive=True
+        )
+        for queue in ("test_queue", "test_queue.retry.5000", "test_queue.dead"):
+            assert sample("olki_worker_queue_depth", {"queue": queue}) == 7
+        assert cache.get(queue_depth_key("test_queue")) == 7
+        assert connection.timers[-1] == (15, callback)
+
+    def test_queue_depth_sampling_survives_missing_queue(self):
+        consumer = Consumer(failing_handler, queue_name="missing_queue")
+        consumer.connection = FakeConnection()
+        consumer.connection.channel_mock.queue_declare.side_effect = (
+            pika.exceptions.ChannelClosedByBroker(404, "NOT_FOUND")
+        )
+
+        consumer.sample_queue_depth()
+
+        assert consumer.stats_channel is None
+
+
+@pytest.mark.django_db
+class TestStageMetrics:
+    @patch("contacts.management.commands.runworker.send_mail")
+    def test_handle_delivery_records_stages_and_lag(self, _mock_send_mail):
+        from contacts.management.commands.runworker import Command
+
+        stages = ["decode", "thank_you", "service_notification"]
+        before = [stage_count(stage) for stage in stages]
+        lag_before = sample("olki_worker_end_to_end_lag_seconds_count")
+        body = json.dumps(
+            {
+                "contact_request_id": 1,
+                "name": "Иван",
+                "email": "ivan@example.com",
+                "created_at": (timezone.now() - timedelta(seconds=3)).isoformat(),
+            }
+        )
+
+        Command().handle_delivery(body)
+
+        assert [stage_count(stage) - b for stage, b in zip(stages, before, strict=True)] == [1] * 3
+        assert sample("olki_worker_end_to_end_lag_seconds_count") == lag_before + 1
+        assert sample("olki_worker_end_to_end_lag_seconds_bucket", {"le": "2.5"}) < sample(
+            "olki_worker_end_to_end_lag_seconds_bucket", {"le": "5.0"}
+        )
+
+    def test_status_flush_records_db_stage(self):
+        before = stage_count("status_update")
+        buffer = StatusUpdateBuffer(max_size=10, max_delay=1)
+        buffer.add(1, 1)
+        buffer.flush()
+        assert stage_count("status_update") == before + 1
+
+
+def test_metrics_server_collects_child_processes_in_multiprocess_mode(tmp_path, monkeypatch):
+    with patch("contacts.metrics._start_http_server") as mock_start:
+        metrics.start_http_server(9100)
+        assert mock_start.call_args.kwargs["registry"] is REGISTRY
+
+        monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+        metrics.start_http_server(9100)
+        assert mock_start.call_args.kwargs["registry"] is not REGISTRY
+
+
+def test_async_worker_samples_queue_depth():
+    from .async_worker import AsyncWorker
+
+    worker = AsyncWorker(
+        retry_policy=RetryPolicy(queue_name="email_notifications", delays=[5]),
+        dedup=MagicMock(),
+        queue_depth_interval=15,
+    )
+    connection = MagicMock()
+    channel = AsyncMock()
+    connection.channel = AsyncMock(return_value=channel)
+    channel.declare_queue.return_value.declaration_result.message_count = 3
+
+    async def sample_once():
+        with (
+            patch("contacts.async_worker.asyncio.sleep", side_effect=asyncio.CancelledError),
+            pytest.raises(asyncio.CancelledError),
+        ):
+            await worker.sample_queue_depth_periodically(connection)
+
+    asyncio.run(sample_once())
+
+    assert channel.declare_queue.await_count == 3
+    assert sample("olki_worker_queue_depth", {"queue": "email_notifications.dead"}) == 3
@@ -1,10 +1,11 @@
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 import pytest
+from django.conf import settings
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from .models import ContactRequest
+from .models import ContactRequest, OutboxMessage
 
 
 @pytest.fixture
@@ -70,37 +71,46 @@ class TestContactRequestAPI:
         assert response.data["name"] == contact_request.name
         assert response.data["email"] == contact_request.email
 
-    @patch("contacts.views.pika.BlockingConnection")
-    def test_create_contact_request_sends_to_rabbitmq(
+    @patch("contacts.publisher.pika.BlockingConnection")
+    def test_create_contact_request_writes_outbox_event(
         self, mock_connection, api_client, contact_data
     ):
-        mock_channel = MagicMock()
-        mock_conn = MagicMock()
-        mock_conn.channel.return_value = mock_channel
-        mock_connection.return_value = mock_conn
-
         response = api_client.post("/api/contacts/", contact_data, format="json")
 
         assert response.status_code == status.HTTP_201_CREATED
         assert "message" in response.data
         assert ContactRequest.objects.count() == 1
 
-        # Проверяем, что сообщение было отправлено в RabbitMQ
-        mock_channel.queue_declare.assert_called_once()
-        mock_channel.basic_publish.assert_called_once()
-        mock_conn.close.assert_called_once()
+        # Событие записано в outbox, а POST не обращается к RabbitMQ
+        outbox_message = OutboxMessage.objects.get()
+        assert outbox_message.queue == settings.RABBITMQ_QUEUE_NAME
+        assert outbox_message.payload["contact_request_id"] == response.data["data"]["id"]
+        mock_connection.assert_not_called()
 
-    @patch("contacts.views.pika.BlockingConnection")
-    def test_create_contact_request_handles_rabbitmq_error(
+    @patch("contacts.publisher.pika.BlockingConnection")
+    def test_create_contact_request_when_rabbitmq_down(
         self, mock_connection, api_client, contact_data
     ):
         mock_connection.side_effect = Exception("Connection error")
 
         response = api_client.post("/api/contacts/", contact_data, format="json")
 
-        # Запрос все равно должен быть создан, даже если RabbitMQ недоступен
+        # Запрос создается, событие дождется relay в outbox
         assert response.status_code == status.HTTP_201_CREATED
         assert ContactRequest.objects.count() == 1
+        assert OutboxMessage.objects.count() == 1
+
+    @patch("contacts.views.enqueue_contact_request")
+    def test_create_contact_request_rolls_back_without_outbox_event(
+        self, mock_enqueue, api_client, contact_data
+    ):
+        mock_enqueue.side_effect = RuntimeError("outbox unavailable")
+        client = APIClient(raise_request_exception=False)
+
+        response = client.post("/api/contacts/", contact_data, format="json")
+
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        assert ContactRequest.objects.count() == 0
 
     def test_create_contact_request_minimal_data(self, api_client):
         minimal_data = {
@@ -1,32 +1,67 @@
-import json
-
-import pika
-from django.conf import settings
+from django.db import transaction
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from olki_backend.export import (
+    FILTER_CREATED_AFTER,
+    FILTER_CREATED_BEFORE,
+    FILTER_PROCESSED,
+    ExportMixin,
+)
+from olki_backend.fieldsets import SparseFieldsetMixin
+from olki_backend.pagination import KeysetPagination
+
+from .idempotency import Submission
 from .models import ContactRequest
+from .outbox import enqueue_contact_request
 from .serializers import ContactRequestSerializer
 
 
-class ContactRequestViewSet(viewsets.ModelViewSet):
+class ContactRequestViewSet(ExportMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet для работы с запросами на контакт"""
 
     queryset = ContactRequest.objects.all()
     serializer_class = ContactRequestSerializer
+    export_name = "contacts"
+    export_fields = (
+        "id",
+        "name",
+        "email",
+        "phone",
+        "message",
+        "created_at",
+        "processed",
+        "processed_at",
+        "delivery_status",
+    )
+    export_filters = (FILTER_CREATED_AFTER, FILTER_CREATED_BEFORE, FILTER_PROCESSED)
 
     def create(self, request, *args, **kwargs):
-        """Создать запрос на контакт и отправить событие в RabbitMQ"""
+        """Создать запрос на контакт; повтор того же запроса отдает сохраненный ответ"""
+        submission = Submission.from_request(request, self.get_serializer_class()().fields)
+        if submission is None:
+            return self._create(request)
+        replay = submission.claim()
+        if replay is not None:
+            return replay
+        try:
+            response = self._create(request)
+        except Exception:
+            submission.release()
+            raise
+        submission.complete(response)
+        return response
+
+    def _create(self, request):
+        """Создать запрос на контакт и записать событие для воркера в outbox"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        contact_request = serializer.save()
 
-        # Отправляем событие в RabbitMQ для обработки воркером
-        try:
-            self._send_to_rabbitmq(contact_request)
-        except Exception as e:
-            # Логируем ошибку, но не прерываем создание запроса
-            print(f"Error sending to RabbitMQ: {e}")
+        # Запрос и событие сохраняются атомарно; в RabbitMQ событие отправит runrelay
+        with transaction.atomic():
+            contact_request = serializer.save()
+            enqueue_contact_request(contact_request)
 
         # Возвращаем успешный ответ сразу
         headers = self.get_success_headers(serializer.data)
@@ -39,26 +74,13 @@ class ContactRequestViewSet(viewsets.ModelViewSet):
             headers=headers,
         )
 
-    def _send_to_rabbitmq(self, contact_request):
-        """Отправить событие в RabbitMQ"""
-        connection = pika.BlockingConnection(pika.URLParameters(settings.RABBITMQ_URL))
-        channel = connection.channel()
-        channel.queue_declare(queue=settings.RABBITMQ_QUEUE_NAME, durable=True)
-
-        message = {
-            "contact_request_id": contact_request.id,
-            "name": contact_request.name,
-            "email": contact_request.email,
-            "phone": contact_request.phone,
-            "message": contact_request.message,
-        }
+    @action(detail=False, methods=["get"], pagination_class=KeysetPagination)
+    def backlog(self, request):
+        """Необработанные запросы от новых к старым (частичный индекс contact_unprocessed_idx)
 
-        channel.basic_publish(
-            exchange="",
-            routing_key=settings.RABBITMQ_QUEUE_NAME,
-            body=json.dumps(message),
-            properties=pika.BasicProperties(
-                delivery_mode=2,  # make message persistent
-            ),
-        )
-        connection.close()
+        Всегда keyset-пагинация: без COUNT(*) и OFFSET страница стоит одинаково
+        при любом размере очереди.
+        """
+        page = self.paginate_queryset(self.filter_queryset(ContactRequest.objects.unprocessed()))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
@@ -9,3 +9,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "olki_backend.settings")
 
 application = get_asgi_application()
+
+# Индекс автодополнения строится до первого запроса (и до fork при --preload)
+from products.suggest import warm_suggest_index  # noqa: E402
+
+warm_suggest_index()
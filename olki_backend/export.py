@@ -0,0 +1,156 @@
+"""
+Потоковая выгрузка таблиц в NDJSON и CSV.
+
+Строки читаются ``values_list(...).iterator(chunk_size=...)`` (на PostgreSQL -
+серверным курсором), кодируются по одной и отдаются кусками примерно по
+``STREAM_CHUNK_BYTES``, при необходимости сжатыми gzip на лету. В памяти
+одновременно находится не больше одной пачки строк, поэтому потребление
+памяти не зависит от размера таблицы.
+"""
+
+import csv
+import zlib
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+FORMATS = {
+    FORMAT_NDJSON: "application/x-ndjson; charset=utf-8",
+    FORMAT_CSV: "text/csv; charset=utf-8",
+}
+
+CHUNK_SIZE = 2000
+STREAM_CHUNK_BYTES = 64 * 1024
+
+FILTER_CREATED_AFTER = "created_after"
+FILTER_CREATED_BEFORE = "created_before"
+FILTER_PROCESSED = "processed"
+
+
+class _Echo:
+    """Файлоподобный объект для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def iter_ndjson(rows, fields):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row, strict=True))) + "\n"
+
+
+def iter_csv(rows, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def export_chunks(queryset, fields, output=FORMAT_NDJSON, chunk_size=CHUNK_SIZE):
+    """Куски байтов выгрузки ``fields`` из ``queryset``"""
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    lines = iter_csv(rows, fields) if output == FORMAT_CSV else iter_ndjson(rows, fields)
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= STREAM_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzip_chunks(chunks):
+    """Сжать поток кусков в формат gzip"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _parse_moment(name, value):
+    """Момент времени с часовым поясом; дата без времени - полночь текущего пояса"""
+    moment = parse_datetime(value)
+    if moment is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f"{name}: expected an ISO date or datetime, got {value!r}")
+        moment = datetime.combine(date, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _parse_bool(name, value):
+    normalized = value.strip().lower()
+    if normalized in ("1", "true", "yes"):
+        return True
+    if normalized in ("0", "false", "no"):
+        return False
+    raise ValueError(f"{name}: expected true or false, got {value!r}")
+
+
+def filter_export(queryset, created_after=None, created_before=None, processed=None):
+    """Отфильтровать выгрузку по дате создания и признаку обработки (строки из запроса)"""
+    if created_after:
+        queryset = queryset.filter(created_at__gte=_parse_moment("created_after", created_after))
+    if created_before:
+        queryset = queryset.filter(created_at__lt=_parse_moment("created_before", created_before))
+    if processed:
+        queryset = queryset.filter(processed=_parse_bool("processed", processed))
+    return queryset
+
+
+class ExportMixin:
+    """Действие ``export``: потоковая выгрузка ``export_fields`` в NDJSON или CSV"""
+
+    export_fields = ()
+    export_filters = (FILTER_CREATED_AFTER, FILTER_CREATED_BEFORE)
+    export_name = "export"
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Выгрузить все записи: ``?output=ndjson|csv``, фильтры ``export_filters``"""
+        params = request.query_params
+        output = params.get("output", FORMAT_NDJSON)
+        if output not in FORMATS:
+            raise ValidationError({"output": [f"Expected one of: {', '.join(FORMATS)}"]})
+        try:
+            queryset = filter_export(
+                self.queryset.model.objects.order_by("pk"),
+                **{name: params.get(name) for name in self.export_filters},
+            )
+        except ValueError as e:
+            raise ValidationError({"filters": [str(e)]}) from e
+
+        chunks = export_chunks(queryset, self.export_fields, output)
+        gzipped = "gzip" in request.headers.get("Accept-Encoding", "")
+        response = StreamingHttpResponse(
+            gzip_chunks(chunks) if gzipped else chunks, content_type=FORMATS[output]
+        )
+        response["Content-Disposition"] = f'attachment; filename="{self.export_name}.{output}"'
+        patch_vary_headers(response, ["Accept-Encoding"])
+        if gzipped:
+            response["Content-Encoding"] = "gzip"
+        return response
@@ -0,0 +1,94 @@
+"""
+Разреженные наборы полей (sparse fieldsets) для ViewSet.
+
+``?fields=id,name,price`` оставляет в ответе только перечисленные поля,
+``?omit=description`` убирает перечисленные. Набор полей сужает и SQL: queryset
+загружает через ``.only()`` лишь колонки, нужные оставшимся полям, поэтому
+большие текстовые колонки для карточек не читаются вовсе.
+
+Колонки обычного поля берутся из его ``source``; для вычисляемых полей
+(``SerializerMethodField`` и т.п.) сериализатор перечисляет их в
+``Meta.field_columns``. Класс сериализатора для каждого набора полей строится
+один раз и кэшируется.
+"""
+
+import functools
+
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+
+
+@functools.lru_cache(maxsize=256)
+def sparse_serializer_class(serializer_class, fields):
+    """Подкласс ``serializer_class`` только с полями ``fields`` (кортеж в порядке Meta)"""
+    removed = {name: None for name in serializer_class._declared_fields if name not in fields}
+    meta = type("Meta", (serializer_class.Meta,), {"fields": list(fields)})
+    return type(serializer_class.__name__, (serializer_class,), {"Meta": meta, **removed})
+
+
+def _param_list(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class SparseFieldsetMixin:
+    """Поддержка ``?fields=`` и ``?omit=`` в выдаче ViewSet"""
+
+    def requested_fields(self):
+        """Кортеж полей для ответа или ``None``, если набор не сужается"""
+        if not hasattr(self, "_requested_fields"):
+            self._requested_fields = self._parse_fields()
+        return self._requested_fields
+
+    def _parse_fields(self):
+        request = self.request
+        if request is None or request.method not in ("GET", "HEAD"):
+            return None
+        params = request.query_params
+        if FIELDS_PARAM not in params and OMIT_PARAM not in params:
+            return None
+
+        available = list(super().get_serializer_class().Meta.fields)
+        requested = _param_list(params.get(FIELDS_PARAM, "")) or available
+        omitted = _param_list(params.get(OMIT_PARAM, ""))
+        unknown = [name for name in (*requested, *omitted) if name not in available]
+        if unknown:
+            raise ValidationError({FIELDS_PARAM: [f"Unknown fields: {', '.join(unknown)}"]})
+        fields = tuple(name for name in available if name in requested and name not in omitted)
+        return None if len(fields) == len(available) else fields
+
+    def get_serializer_class(self):
+        serializer_class = super().get_serializer_class()
+        fields = self.requested_fields()
+        if fields is None:
+            return serializer_class
+        return sparse_serializer_class(serializer_class, fields)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.requested_fields()
+        columns = self.columns_for(fields) if fields is not None else None
+        if columns is None:
+            return queryset
+        # Поля сортировки нужны keyset-пагинации для курсора
+        ordering = [name.lstrip("-") for name in queryset.model._meta.ordering]
+        return queryset.only(*columns, *ordering)
+
+    def columns_for(self, fields):
+        """Колонки модели, которые читают поля ``fields``, или ``None``, если они неизвестны"""
+        serializer_class = super().get_serializer_class()
+        field_columns = getattr(serializer_class.Meta, "field_columns", {})
+        declared = serializer_class._declared_fields
+        columns = {"pk"}
+        for name in fields:
+            if name in field_columns:
+                columns.update(field_columns[name])
+            elif name not in declared:
+                columns.add(name)
+            elif declared[name].source not in (None, "*"):
+                columns.add(declared[name].source.split(".")[0])
+            else:
+                # Вычисляемое поле без Meta.field_columns: загружаем все колонки
+                return None
+        return sorted(columns)
@@ -0,0 +1,65 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contacts.views import ContactRequestViewSet
+from olki_backend.export import CHUNK_SIZE, FORMATS, export_chunks, filter_export, gzip_chunks
+from products.views import ProductViewSet
+
+# Те же поля и фильтры, что у эндпоинтов /api/<name>/export/
+VIEWSETS = {"contacts": ContactRequestViewSet, "products": ProductViewSet}
+
+
+class Command(BaseCommand):
+    help = "Stream contact requests or products to NDJSON or CSV with constant memory use"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(VIEWSETS), help="What to export")
+        parser.add_argument(
+            "--output-format", choices=sorted(FORMATS), default="ndjson", help="Row format"
+        )
+        parser.add_argument("--output", default="-", help="File to write, '-' for stdout")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip")
+        parser.add_argument("--created-after", help="ISO date or datetime, inclusive")
+        parser.add_argument("--created-before", help="ISO date or datetime, exclusive")
+        parser.add_argument("--processed", help="true or false (contacts only)")
+        parser.add_argument(
+            "--chunk-size", type=int, default=CHUNK_SIZE, help="Rows fetched per round trip"
+        )
+
+    def handle(self, *_args, **options):
+        viewset = VIEWSETS[options["name"]]
+        filters = {
+            name: options[name]
+            for name in ("created_after", "created_before", "processed")
+            if options[name]
+        }
+        unsupported = set(filters) - set(viewset.export_filters)
+        if unsupported:
+            raise CommandError(f"Unsupported filters for {options['name']}: {sorted(unsupported)}")
+        try:
+            queryset = filter_export(viewset.queryset.model.objects.order_by("pk"), **filters)
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        chunks = export_chunks(
+            queryset, viewset.export_fields, options["output_format"], options["chunk_size"]
+        )
+        if options["gzip"]:
+            chunks = gzip_chunks(chunks)
+
+        written = 0
+        if options["output"] == "-":
+            stream = sys.stdout.buffer
+            for chunk in chunks:
+                stream.write(chunk)
+                written += len(chunk)
+            stream.flush()
+        else:
+            with open(options["output"], "wb") as stream:
+                for chunk in chunks:
+                    stream.write(chunk)
+                    written += len(chunk)
+
+        # Итог в stderr, чтобы не смешивать его с выгрузкой в stdout
+        self.stderr.write(self.style.SUCCESS(f"Exported {options['name']}: {written} bytes"))
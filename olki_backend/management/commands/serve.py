@@ -0,0 +1,204 @@
+import gc
+import os
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+from prometheus_client import multiprocess
+
+from contacts.publisher import reset_publisher
+
+INTERFACE_WSGI = "wsgi"
+INTERFACE_ASGI = "asgi"
+
+ASGI_WORKER_CLASS = "uvicorn_worker.UvicornWorker"
+
+# Файл heartbeat воркеров gunicorn: в контейнере /tmp бывает на диске, /dev/shm - в памяти
+WORKER_TMP_DIR = "/dev/shm"
+
+
+def cpu_count():
+    """CPU, доступные процессу (учитывает cpuset контейнера)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_concurrency(interface, cpus):
+    """``(процессов, потоков)`` по числу CPU
+
+    WSGI: классические ``2 * CPU + 1`` процесса по два потока, чтобы процесс не
+    простаивал, пока поток ждет БД или Redis. ASGI: по event loop на CPU.
+    """
+    if interface == INTERFACE_ASGI:
+        return cpus, 1
+    return 2 * cpus + 1, 2
+
+
+def load_application(interface, preload):
+    """Импортировать приложение и URLconf; при preload подготовить процесс к fork"""
+    application = import_module(f"olki_backend.{interface}").application
+    # URLconf импортируется при первом resolve/reverse: делаем это до fork, а не в каждом воркере
+    reverse("contact-list")
+    if preload:
+        # Соединения, открытые при импорте и прогреве индексов, не должны достаться
+        # нескольким процессам сразу
+        connections.close_all()
+        for cache in caches.all(initialized_only=True):
+            cache.close()
+        reset_publisher()
+        # Объекты мастера уходят в постоянное поколение: сборщик мусора в воркерах не
+        # трогает их заголовки, и страницы памяти остаются общими (copy-on-write)
+        gc.freeze()
+    return application
+
+
+def reset_multiprocess_dir():
+    """Удалить файлы метрик прошлых запусков и предыдущих команд (migrate и т.п.)
+
+    Свои файлы мастер уже создал при импорте метрик, их оставляем.
+    """
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        return
+    own_suffix = f"_{os.getpid()}.db"
+    for path in Path(directory).glob("*.db"):
+        if not path.name.endswith(own_suffix):
+            path.unlink(missing_ok=True)
+
+
+def child_exit(_server, worker):
+    """Убрать файлы метрик завершившегося воркера (режим multiprocess prometheus_client)"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def run_server(interface, options):
+    """Запустить мастер gunicorn с настройками ``options``"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError as e:
+        raise CommandError("serve requires gunicorn: pip install -e .") from e
+
+    preload = options["preload_app"]
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_application(interface, preload)
+
+    Application().run()
+
+
+class Command(BaseCommand):
+    help = "Run the production application server (gunicorn prefork, WSGI or ASGI)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interface",
+            choices=[INTERFACE_WSGI, INTERFACE_ASGI],
+            default=settings.SERVE_INTERFACE,
+            help="olki_backend/wsgi.py with sync/gthread workers or olki_backend/asgi.py "
+            "with uvicorn workers",
+        )
+        parser.add_argument("--bind", default=settings.SERVE_BIND, help="host:port or unix:path")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.SERVE_WORKERS,
+            help="Worker processes, 0 to derive from the CPU count",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=settings.SERVE_THREADS,
+            help="Threads per WSGI worker, 0 to derive from the CPU count",
+        )
+        parser.add_argument(
+            "--max-requests",
+            type=int,
+            default=settings.SERVE_MAX_REQUESTS,
+            help="Restart a worker after this many requests, 0 to disable",
+        )
+        parser.add_argument(
+            "--max-requests-jitter",
+            type=int,
+            default=settings.SERVE_MAX_REQUESTS_JITTER,
+            help="Random extra requests so workers do not restart at once",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=settings.SERVE_TIMEOUT,
+            help="Seconds before a silent worker is killed and restarted",
+        )
+        parser.add_argument(
+            "--graceful-timeout",
+            type=int,
+            default=settings.SERVE_GRACEFUL_TIMEOUT,
+            help="Seconds workers get to finish requests on reload or shutdown",
+        )
+        parser.add_argument(
+            "--keep-alive",
+            type=int,
+            default=settings.SERVE_KEEPALIVE,
+            help="Seconds to hold idle keep-alive connections",
+        )
+        parser.add_argument("--pid", default=None, help="Write the master PID to this file")
+        parser.add_argument(
+            "--no-preload",
+            action="store_true",
+            help="Import the application in every worker instead of once in the master",
+        )
+
+    def handle(self, *_args, **options):
+        interface = options["interface"]
+        default_workers, default_threads = default_concurrency(interface, cpu_count())
+        workers = options["workers"] or default_workers
+        threads = 1 if interface == INTERFACE_ASGI else options["threads"] or default_threads
+        if workers < 1 or threads < 1:
+            raise CommandError("--workers and --threads must be positive")
+
+        if interface == INTERFACE_ASGI:
+            try:
+                import_module(ASGI_WORKER_CLASS.rsplit(".", 1)[0])
+            except ImportError as e:
+                raise CommandError(
+                    "The ASGI interface requires uvicorn workers: pip install -e '.[asgi]'"
+                ) from e
+            worker_class = ASGI_WORKER_CLASS
+        else:
+            worker_class = "gthread" if threads > 1 else "sync"
+
+        server_options = {
+            "bind": [options["bind"]],
+            "workers": workers,
+            "threads": threads,
+            "worker_class": worker_class,
+            "preload_app": not options["no_preload"],
+            "max_requests": options["max_requests"],
+            "max_requests_jitter": options["max_requests_jitter"],
+            "timeout": options["timeout"],
+            "graceful_timeout": options["graceful_timeout"],
+            "keepalive": options["keep_alive"],
+            "pidfile": options["pid"],
+            "proc_name": "olki_backend",
+            "child_exit": child_exit,
+        }
+        if os.path.isdir(WORKER_TMP_DIR):
+            server_options["worker_tmp_dir"] = WORKER_TMP_DIR
+
+        reset_multiprocess_dir()
+        self.stderr.write(
+            f"Serving {interface.upper()} on {options['bind']}: {workers} workers x {threads} "
+            f"threads ({worker_class}), max {options['max_requests']} requests per worker"
+        )
+        run_server(interface, server_options)
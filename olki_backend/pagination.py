@@ -0,0 +1,127 @@
+"""
+Пагинация API: номер страницы по умолчанию и keyset (курсор) по запросу.
+
+``PageNumberPagination`` на каждой странице считает ``COUNT(*)`` и пропускает
+``OFFSET`` строк, поэтому глубокие страницы растущих таблиц становятся все
+дороже. Клиент, передавший параметр ``cursor`` (для первой страницы - пустой),
+получает keyset-пагинацию по ``(created_at, id)``: страница читается условием
+от последней строки предыдущей по составному индексу, без счетчика и смещения,
+и страница N стоит столько же, сколько первая.
+
+Выдача со своим порядком (``?search=`` сортирует по рангу) курсором не
+листается: такой запрос получает 400, его страницы - по номеру.
+"""
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Курсор по ``(created_at, id)`` в порядке убывания"""
+
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+    ordered_queryset_message = (
+        "Cursor pagination is not available for ranked results, use page numbers."
+    )
+
+    @staticmethod
+    def encode_cursor(created_at, pk, reverse=False):
+        raw = f"{'p' if reverse else 'n'}|{created_at.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, encoded):
+        """``(created_at, id, reverse)`` или ``None`` для первой страницы"""
+        if not encoded:
+            return None
+        try:
+            direction, created_at, pk = (
+                base64.urlsafe_b64decode(encoded.encode()).decode().split("|")
+            )
+            if direction not in ("n", "p"):
+                raise ValueError(direction)
+            return datetime.fromisoformat(created_at), int(pk), direction == "p"
+        except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+            raise NotFound(self.invalid_cursor_message) from e
+
+    def paginate_queryset(self, queryset, request, view=None):  # noqa: ARG002
+        self.request = request
+        if queryset.query.order_by:
+            # Курсор задает свой порядок (created_at, id): порядок выдачи (ранг поиска)
+            # потерялся бы, и строки дублировались бы или пропадали между страницами
+            raise ValidationError({self.cursor_query_param: [self.ordered_queryset_message]})
+        cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        reverse = cursor is not None and cursor[2]
+
+        if cursor is not None:
+            created_at, pk, _ = cursor
+            # created_at <= X задает границу диапазона индекса, id - только для равных
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=pk))
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=pk))
+                )
+        ordering = ("created_at", "id") if reverse else ("-created_at", "-id")
+        rows = list(queryset.order_by(*ordering)[: self.page_size + 1])
+
+        has_more = len(rows) > self.page_size
+        page = rows[: self.page_size]
+        if reverse:
+            page.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = cursor is not None, has_more
+        self.page = page
+        return page
+
+    def _link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(row.created_at, row.pk, reverse)
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Пустая страница после последней строки: назад - к началу
+            return replace_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param, ""
+            )
+        return self._link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data}
+        )
+
+
+class PageOrKeysetPagination(BasePagination):
+    """Номер страницы по умолчанию; keyset, если в запросе есть ``cursor``"""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.paginator = KeysetPagination()
+        else:
+            self.paginator = PageNumberPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
@@ -1,6 +1,21 @@
+import io
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
 import pytest
+from django.core.management import CommandError, call_command
 from django.test import Client
 
+from olki_backend.management.commands.serve import (
+    INTERFACE_ASGI,
+    INTERFACE_WSGI,
+    child_exit,
+    default_concurrency,
+    load_application,
+    reset_multiprocess_dir,
+)
+
 
 @pytest.fixture
 def client():
@@ -16,3 +31,78 @@ class TestMetrics:
             "django_http_requests_total" in response.content.decode()
             or "prometheus" in response.content.decode().lower()
         )
+
+
+class TestServe:
+    @pytest.fixture
+    def run_server(self):
+        with patch("olki_backend.management.commands.serve.run_server") as run_server:
+            yield run_server
+
+    def test_concurrency_from_cpu_count(self):
+        assert default_concurrency(INTERFACE_WSGI, 4) == (9, 2)
+        assert default_concurrency(INTERFACE_ASGI, 4) == (4, 1)
+
+    def test_wsgi_defaults(self, run_server, settings):
+        settings.SERVE_WORKERS = 0
+        settings.SERVE_THREADS = 0
+        with patch("olki_backend.management.commands.serve.cpu_count", return_value=2):
+            call_command("serve", stderr=io.StringIO())
+        interface, options = run_server.call_args.args
+        assert interface == INTERFACE_WSGI
+        assert options["workers"] == 5
+        assert options["threads"] == 2
+        assert options["worker_class"] == "gthread"
+        assert options["preload_app"] is True
+        assert options["max_requests"] == settings.SERVE_MAX_REQUESTS
+        assert options["bind"] == [settings.SERVE_BIND]
+
+    def test_explicit_options(self, run_server):
+        call_command(
+            "serve",
+            "--workers=3",
+            "--threads=1",
+            "--no-preload",
+            "--bind=unix:/tmp/olki.sock",
+            stderr=io.StringIO(),
+        )
+        _interface, options = run_server.call_args.args
+        assert (options["workers"], options["threads"]) == (3, 1)
+        assert options["worker_class"] == "sync"
+        assert options["preload_app"] is False
+        assert options["bind"] == ["unix:/tmp/olki.sock"]
+
+    def test_invalid_workers(self, run_server):
+        with pytest.raises(CommandError, match="positive"):
+            call_command("serve", "--workers=-1", stderr=io.StringIO())
+        run_server.assert_not_called()
+
+    @pytest.mark.django_db
+    def test_preload_closes_connections(self):
+        from olki_backend import wsgi
+
+        serve = "olki_backend.management.commands.serve"
+        with patch(f"{serve}.connections") as connections, patch(f"{serve}.gc") as gc:
+            application = load_application(INTERFACE_WSGI, preload=True)
+        assert application is wsgi.application
+        connections.close_all.assert_called_once_with()
+        gc.freeze.assert_called_once_with()
+
+        with patch(f"{serve}.connections") as connections:
+            load_application(INTERFACE_WSGI, preload=False)
+        connections.close_all.assert_not_called()
+
+    def test_child_exit_marks_worker_dead(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+        with patch("olki_backend.management.commands.serve.multiprocess") as multiprocess:
+            child_exit(None, SimpleNamespace(pid=42))
+        multiprocess.mark_process_dead.assert_called_once_with(42)
+
+    def test_multiprocess_dir_reset_keeps_own_files(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+        own = tmp_path / f"counter_{os.getpid()}.db"
+        stale = [tmp_path / "counter_1.db", tmp_path / f"gauge_all_{os.getpid()}1.db"]
+        for path in [own, *stale]:
+            path.write_bytes(b"")
+        reset_multiprocess_dir()
+        assert list(tmp_path.iterdir()) == [own]
@@ -0,0 +1,122 @@
+"""
+Кэш сериализованных ответов каталога продукции.
+
+Ответы ``list``, ``featured`` и ``retrieve`` хранятся в кэше Django (Redis)
+вместе с версией данных, на которой они построены. Версия каталога и версия
+каждого продукта лежат в отдельных ключах и меняются сигналами
+``post_save``/``post_delete`` модели ``Product``: список и избранное зависят от
+версии каталога, карточка продукта - только от версии этого продукта. Версии -
+счетчики (INCR), а после вытеснения ключа начинаются заново с ``time_ns()``. Чтение
+из кэша - один ``get_many`` (MGET) за версией и ответом сразу; ответ
+с устаревшей версией считается промахом, поэтому удалять ключи не нужно.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from . import metrics
+from .rendering import RENDERER_VERSION
+
+CATALOG_VERSION_KEY = "products:version:catalog"
+
+
+def product_version_key(pk):
+    return f"products:version:{pk}"
+
+
+def request_fingerprint(request, *parts):
+    """Хэш схемы, хоста (ссылки на изображения абсолютные), параметров запроса и ``parts``
+
+    Версия рендерера описаний тоже входит в хэш: после ее смены кэшированные ответы
+    и ETag со старым HTML перестают совпадать.
+    """
+    params = sorted(
+        (key, value) for key, values in request.query_params.lists() for value in values
+    )
+    return hashlib.md5(
+        repr((RENDERER_VERSION, request.scheme, request.get_host(), params, *parts)).encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+
+
+def response_key(request, action, pk=None):
+    """Ключ ответа: действие, продукт и отпечаток запроса"""
+    digest = request_fingerprint(request)
+    return f"products:response:{action}:{pk or ''}:{digest}"
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def _bump(key):
+    # INCR атомарен, поэтому процесс по новому значению видит, были ли чужие изменения
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _new_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def catalog_version():
+    """Текущая версия каталога; если ключа нет, создается новая"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate(pk=None):
+    """Сделать устаревшими список, избранное и (если задан) ответ по продукту
+
+    Возвращает новую версию каталога.
+    """
+    if pk is not None:
+        _bump(product_version_key(pk))
+    return _bump(CATALOG_VERSION_KEY)
+
+
+def invalidate_many(pks):
+    """``invalidate()`` для множества продуктов сразу (массовые операции без сигналов)
+
+    Ключи версий продуктов удаляются одним DEL: ответ, сохраненный со старой
+    версией, после этого не совпадет с новой. Возвращает новую версию каталога.
+    """
+    cache.delete_many([product_version_key(pk) for pk in pks])
+    return _bump(CATALOG_VERSION_KEY)
+
+
+def cached_response(request, action, build, pk=None):
+    """Вернуть ответ из кэша или построить его ``build()`` и сохранить"""
+    if not settings.PRODUCT_CACHE_ENABLED:
+        return build()
+
+    version_key = CATALOG_VERSION_KEY if pk is None else product_version_key(pk)
+    key = response_key(request, action, pk)
+    found = cache.get_many([version_key, key])
+    version = found.get(version_key)
+    entry = found.get(key)
+
+    if version is not None and entry is not None and entry[0] == version:
+        metrics.PRODUCT_CACHE_HITS.labels(action=action).inc()
+        return Response(entry[1])
+
+    metrics.PRODUCT_CACHE_MISSES.labels(action=action).inc()
+    if version is None:
+        # Ключ версии вытеснен или еще не создан: новая версия не совпадет ни с одним ответом
+        version = _new_version()
+        if not cache.add(version_key, version, timeout=None):
+            version = cache.get(version_key)
+
+    response = build()
+    if response.status_code == 200 and version is not None:
+        # Если данные изменятся во время build(), ответ сохранится со старой версией
+        # и не будет выдан
+        cache.set(key, (version, response.data), timeout=settings.PRODUCT_CACHE_TIMEOUT)
+    return response
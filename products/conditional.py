@@ -0,0 +1,64 @@
+"""
+Условные GET-запросы (ETag / Last-Modified / 304) для каталога продукции.
+
+Валидаторы считаются без сериализации: для списка и избранного - одним
+агрегатом ``MAX(updated_at)`` и ``COUNT(*)`` по отфильтрованному queryset, для
+карточки - по ``updated_at`` продукта. В ETag входят также действие, схема,
+хост (ссылки на изображения абсолютные) и параметры запроса. Удаление не
+меняет ``MAX(updated_at)``, поэтому время последнего удаления хранится в кэше
+и тоже учитывается в ``Last-Modified``.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .cache import request_fingerprint
+
+LAST_DELETED_KEY = "products:last_deleted"
+
+
+def record_deletion():
+    cache.set(LAST_DELETED_KEY, int(time.time()), timeout=None)
+
+
+def _etag(request, *parts):
+    return quote_etag(request_fingerprint(request, *parts))
+
+
+def catalog_validators(request, action, queryset):
+    """ETag и Last-Modified (unix time) списка продуктов"""
+    state = queryset.order_by().aggregate(last_updated=Max("updated_at"), count=Count("pk"))
+    last_updated = state["last_updated"]
+    last_modified = max(
+        int(last_updated.timestamp()) if last_updated else 0, cache.get(LAST_DELETED_KEY, 0)
+    )
+    etag = _etag(request, action, last_updated and last_updated.isoformat(), state["count"])
+    return etag, last_modified or None
+
+
+def product_validators(request, queryset, pk):
+    """ETag и Last-Modified карточки продукта или (None, None), если продукта нет"""
+    last_updated = queryset.filter(pk=pk).values_list("updated_at", flat=True).first()
+    if last_updated is None:
+        return None, None
+    return _etag(request, "retrieve", pk, last_updated.isoformat()), int(last_updated.timestamp())
+
+
+def conditional_response(request, etag, last_modified, build):
+    """Ответить 304 по If-None-Match/If-Modified-Since или построить ответ ``build()``"""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build()
+
+    if 200 <= response.status_code < 300 or response.status_code == 304:
+        if etag:
+            response.headers.setdefault("ETag", etag)
+        if last_modified:
+            response.headers.setdefault("Last-Modified", http_date(last_modified))
+        # Кэши не должны отдавать каталог без проверки: повторная проверка стоит 304
+        patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,145 @@
+"""
+Уменьшенные копии изображений продукции (thumbnail, card, full) в WebP и JPEG.
+
+При загрузке нового изображения в outbox записывается задача для очереди
+``IMAGE_QUEUE_NAME``; ее обрабатывает ``runimageworker`` вне потока запроса.
+Копии сохраняются рядом с оригиналом под детерминированными именами, а их
+размеры - в ``Product.image_variants`` вместе с именем исходного файла и
+версией набора вариантов. Поэтому обработка идемпотентна: повторная задача
+для того же файла ничего не делает, а копии, построенные по старому
+изображению, сериализатор не отдает.
+"""
+
+import io
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import invalidate
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Увеличить, если поменялся набор вариантов или параметры кодирования
+VARIANTS_VERSION = 1
+
+# Вариант -> максимальная сторона в пикселях (меньшие изображения не увеличиваются)
+VARIANTS = {"thumbnail": 160, "card": 480, "full": 1280}
+
+FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 6},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+
+def variant_name(source_name, variant, extension):
+    stem, _ext = posixpath.splitext(source_name)
+    return f"{stem}_{variant}.{extension}"
+
+
+def variants_current(product):
+    """Построены ли копии для текущего изображения текущим набором вариантов"""
+    variants = product.image_variants or {}
+    return (
+        bool(product.image)
+        and variants.get("source") == product.image.name
+        and variants.get("version") == VARIANTS_VERSION
+    )
+
+
+def image_variants_payload(product, force=False):
+    return {"product_id": product.pk, "image": product.image.name, "force": force}
+
+
+def enqueue_image_variants(product, force=False):
+    """Записать в outbox задачу построить копии изображения продукта"""
+    from contacts.outbox import enqueue
+
+    return enqueue(image_variants_payload(product, force), queue_name=settings.IMAGE_QUEUE_NAME)
+
+
+def enqueue_many_image_variants(products, force=False):
+    """Записать задачи для пачки продуктов одним INSERT в outbox"""
+    from contacts.outbox import enqueue_many
+
+    return enqueue_many(
+        [image_variants_payload(product, force) for product in products],
+        queue_name=settings.IMAGE_QUEUE_NAME,
+    )
+
+
+def _render(image, size, options):
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+    if options["format"] == "JPEG" and variant.mode != "RGB":
+        # В JPEG нет прозрачности: подкладываем белый фон
+        background = Image.new("RGB", variant.size, "white")
+        alpha = variant.convert("RGBA")
+        background.paste(alpha, mask=alpha.getchannel("A"))
+        variant = background
+    buffer = io.BytesIO()
+    variant.save(buffer, **options)
+    return variant.size, buffer.getvalue()
+
+
+def build_variants(storage, source_name):
+    """Сохранить копии файла ``source_name`` и вернуть их описание"""
+    with storage.open(source_name, "rb") as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+
+    variants = {}
+    for variant, size in VARIANTS.items():
+        files = {}
+        for extension, options in FORMATS.items():
+            (width, height), content = _render(image, size, options)
+            name = variant_name(source_name, variant, extension)
+            # Имя детерминировано: старая копия заменяется, а не получает суффикс
+            if storage.exists(name):
+                storage.delete(name)
+            files[extension] = storage.save(name, ContentFile(content))
+        variants[variant] = {"width": width, "height": height, **files}
+    return {"source": source_name, "version": VARIANTS_VERSION, "variants": variants}
+
+
+def generate_image_variants(product_id, force=False):
+    """Построить копии изображения продукта; вернуть True, если они построены"""
+    product = Product.objects.filter(pk=product_id).only("id", "image", "image_variants").first()
+    if product is None or not product.image:
+        return False
+    if variants_current(product) and not force:
+        return False
+
+    source_name = product.image.name
+    image_variants = build_variants(product.image.storage, source_name)
+    # Если пока строились копии загрузили другое изображение, результат не записываем
+    updated = Product.objects.filter(pk=product_id, image=source_name).update(
+        image_variants=image_variants, updated_at=timezone.now()
+    )
+    if updated:
+        # update() не шлет сигналов: сбрасываем кэш ответов сами, updated_at меняет ETag
+        invalidate(product_id)
+    return bool(updated)
+
+
+def srcset(product, request=None):
+    """``(variants, srcset)`` для сериализатора или ``(None, None)``, если копий нет"""
+    if not variants_current(product):
+        return None, None
+    storage = product.image.storage
+    variants = {}
+    sources = {extension: [] for extension in FORMATS}
+    for variant, description in product.image_variants["variants"].items():
+        urls = {}
+        for extension in FORMATS:
+            url = storage.url(description[extension])
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[extension] = url
+            sources[extension].append(f"{url} {description['width']}w")
+        variants[variant] = {"width": description["width"], "height": description["height"], **urls}
+    return variants, {extension: ", ".join(urls) for extension, urls in sources.items()}
@@ -0,0 +1,239 @@
+"""
+Массовый импорт каталога продукции из CSV или NDJSON.
+
+Строки читаются потоково и обрабатываются пачками: пачка проверяется
+``ProductImportSerializer``, изображения из каталога ``images_dir`` загружаются
+в хранилище параллельно, а продукты записываются одним
+``INSERT ... ON CONFLICT (sku) DO UPDATE`` на пачку. Ключ - артикул ``sku``.
+
+``bulk_create`` не вызывает ``Product.save()`` и сигналы, поэтому импорт сам
+делает то, что они делают для одного продукта: рендерит HTML описаний, ставит
+в outbox задачи на копии новых изображений и в конце один раз сбрасывает кэш
+ответов каталога (по версии каталога индексы автодополнения в процессах
+перестроятся сами). ``search_vector`` и FTS-таблицу SQLite обновляют триггеры
+БД, ``updated_at`` заполняет ``bulk_create``.
+"""
+
+import csv
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from django.core.files import File
+from django.db import transaction
+from rest_framework import serializers
+
+from .cache import invalidate_many
+from .images import enqueue_many_image_variants
+from .models import Product
+
+# Колонки, которые перезаписывает импорт у существующего продукта (image - только
+# если в строке указан файл)
+UPDATE_FIELDS = [
+    "name",
+    "description",
+    "description_html",
+    "description_html_version",
+    "price",
+    "updated_at",
+]
+
+# Символов хэша содержимого в имени загруженного изображения
+CONTENT_HASH_LENGTH = 16
+
+# Сколько ошибок строк хранить для отчета; остальные только считаются
+MAX_REPORTED_ERRORS = 100
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    """Проверка строки импорта; ``image`` - имя файла в каталоге изображений"""
+
+    image = serializers.CharField(required=False, allow_blank=True)
+
+    class Meta:
+        model = Product
+        fields = ["sku", "name", "description", "price", "image"]
+        # Уникальность sku не проверяем: существующий артикул обновляется
+        extra_kwargs = {
+            "sku": {"required": True, "allow_null": False, "allow_blank": False, "validators": []}
+        }
+
+    def validate_image(self, value):
+        images_dir = self.context.get("images_dir")
+        if not value or images_dir is None:
+            return ""
+        path = (images_dir / value).resolve()
+        if not path.is_relative_to(images_dir.resolve()) or not path.is_file():
+            raise serializers.ValidationError(f"File {value!r} not found in the images directory")
+        return value
+
+
+class ImportResult:
+    """Итог импорта"""
+
+    def __init__(self):
+        self.imported = 0
+        self.images = 0
+        self.invalid = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        rows = self.imported + self.invalid
+        return rows / self.seconds if self.seconds else float(rows)
+
+    def add_error(self, number, errors):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((number, errors))
+
+
+def read_csv(stream):
+    """Пары ``(номер строки, dict)`` из CSV с заголовком"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_ndjson(stream):
+    """Пары ``(номер строки, объект)`` из NDJSON; нечитаемая строка отдается как есть"""
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError:
+            yield number, line
+
+
+def _store_image(images_dir, filename):
+    """Загрузить файл в хранилище; вернуть ``(имя в хранилище, загружен ли сейчас)``
+
+    Имя содержит хэш содержимого: тот же файл при повторном импорте получает то же
+    имя и не загружается второй раз, а измененный файл с прежним именем загружается.
+    """
+    field = Product._meta.get_field("image")
+    path = images_dir / filename
+    with path.open("rb") as source:
+        digest = hashlib.file_digest(source, "sha256").hexdigest()[:CONTENT_HASH_LENGTH]
+        name = field.generate_filename(None, f"{path.stem}_{digest}{path.suffix}")
+        if field.storage.exists(name):
+            return name, False
+        source.seek(0)
+        return field.storage.save(name, File(source, name=path.name)), True
+
+
+def _validate(batch, images_dir, result):
+    valid = {}
+    for number, data in batch:
+        if not isinstance(data, dict):
+            result.add_error(number, {"non_field_errors": ["Expected an object"]})
+            continue
+        serializer = ProductImportSerializer(data=data, context={"images_dir": images_dir})
+        if not serializer.is_valid():
+            result.add_error(number, serializer.errors)
+            continue
+        # Повтор артикула в пачке: побеждает последняя строка (ON CONFLICT не
+        # обновляет одну запись дважды за запрос)
+        valid[serializer.validated_data["sku"]] = serializer.validated_data
+    return valid
+
+
+def _attach_images(valid, images_dir, pool, force):
+    """Загрузить файлы изображений пачки
+
+    Возвращает ``{sku: имя в хранилище}`` для продуктов, которым нужно привязать
+    изображение, и список файлов, загруженных этим вызовом.
+    """
+    files = {sku: data.pop("image") for sku, data in valid.items() if data.get("image")}
+    if not files:
+        return {}, []
+    stored = list(pool.map(partial(_store_image, images_dir), files.values()))
+    images = {sku: name for sku, (name, _saved) in zip(files, stored, strict=True)}
+    saved = [name for name, was_saved in stored if was_saved]
+    if not force:
+        # Тот же файл уже привязан к продукту: изображение и копии не меняются
+        current = dict(Product.objects.filter(sku__in=images).values_list("sku", "image"))
+        images = {sku: name for sku, name in images.items() if current.get(sku) != name}
+    return images, saved
+
+
+def _delete_files(names):
+    storage = Product._meta.get_field("image").storage
+    for name in names:
+        storage.delete(name)
+
+
+def _import_batch(batch, images_dir, pool, force_images, result):
+    valid = _validate(batch, images_dir, result)
+    images, saved = _attach_images(valid, images_dir, pool, force_images)
+
+    plain, with_image = [], []
+    for sku, data in valid.items():
+        data.pop("image", None)
+        product = Product(**data)
+        product.render_description()
+        if sku in images:
+            product.image = images[sku]
+            with_image.append(product)
+        else:
+            plain.append(product)
+
+    try:
+        with transaction.atomic():
+            for products, update_fields in (
+                (plain, UPDATE_FIELDS),
+                (with_image, [*UPDATE_FIELDS, "image"]),
+            ):
+                if products:
+                    Product.objects.bulk_create(
+                        products,
+                        update_conflicts=True,
+                        unique_fields=["sku"],
+                        update_fields=update_fields,
+                    )
+            if with_image:
+                enqueue_many_image_variants(with_image, force_images)
+    except BaseException:
+        # Пачка не записана: загруженные для нее файлы ни на что не ссылаются
+        _delete_files(saved)
+        raise
+
+    result.imported += len(valid)
+    result.images += len(images)
+    return [product.pk for product in (*plain, *with_image)]
+
+
+def import_products(
+    rows, images_dir=None, batch_size=500, image_workers=4, force_images=False, progress=None
+):
+    """Импортировать пары ``(номер строки, данные)``; вернуть ``ImportResult``
+
+    ``progress(result)`` вызывается после каждой пачки.
+    """
+    images_dir = Path(images_dir) if images_dir is not None else None
+    result = ImportResult()
+    started = time.monotonic()
+    pks = set()
+    with ThreadPoolExecutor(max_workers=image_workers, thread_name_prefix="import") as pool:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                pks.update(_import_batch(batch, images_dir, pool, force_images, result))
+                batch = []
+                result.seconds = time.monotonic() - started
+                if progress is not None:
+                    progress(result)
+        if batch:
+            pks.update(_import_batch(batch, images_dir, pool, force_images, result))
+
+    if pks:
+        invalidate_many(pks)
+    result.seconds = time.monotonic() - started
+    return result
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from products.images import enqueue_many_image_variants, variants_current
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Queue resized image variants for products whose variants are missing or outdated"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Rebuild variants even if they are current"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Products read and queued per transaction"
+        )
+
+    def handle(self, *_args, **options):
+        force = options["force"]
+        products = (
+            Product.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .only("id", "image", "image_variants")
+            .order_by("id")
+        )
+
+        queued = 0
+        batch = []
+        for product in products.iterator(chunk_size=options["batch_size"]):
+            if force or not variants_current(product):
+                batch.append(product)
+            if len(batch) == options["batch_size"]:
+                queued += self.enqueue(batch, force)
+                batch = []
+        queued += self.enqueue(batch, force)
+
+        self.stdout.write(self.style.SUCCESS(f"Queued image variants for {queued} products"))
+
+    def enqueue(self, products, force):
+        # Задачи публикует runrelay, обрабатывает runimageworker
+        if products:
+            enqueue_many_image_variants(products, force=force)
+        return len(products)
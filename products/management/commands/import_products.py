@@ -0,0 +1,89 @@
+import contextlib
+import gzip
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importing import import_products, read_csv, read_ndjson
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+# Сколько ошибок строк печатать
+SHOWN_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = "Upsert products by SKU from a CSV or NDJSON file in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or NDJSON file (.gz allowed), '-' for stdin")
+        parser.add_argument(
+            "--input-format", choices=sorted(READERS), help="Row format (default: by extension)"
+        )
+        parser.add_argument("--images-dir", help="Directory with image files named in 'image'")
+        parser.add_argument(
+            "--force-images",
+            action="store_true",
+            help="Attach images and rebuild their variants even if the product already has the file",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Rows validated and upserted per query"
+        )
+        parser.add_argument(
+            "--image-workers", type=int, default=4, help="Threads uploading images in parallel"
+        )
+
+    def handle(self, *_args, **options):
+        path = options["path"]
+        input_format = options["input_format"] or self.guess_format(path)
+        images_dir = options["images_dir"]
+        if images_dir is not None and not Path(images_dir).is_dir():
+            raise CommandError(f"Images directory {images_dir!r} does not exist")
+
+        with self.open(path) as stream:
+            result = import_products(
+                READERS[input_format](stream),
+                images_dir=images_dir,
+                batch_size=options["batch_size"],
+                image_workers=options["image_workers"],
+                force_images=options["force_images"],
+                progress=self.progress if options["verbosity"] > 1 else None,
+            )
+
+        for number, errors in result.errors[:SHOWN_ERRORS]:
+            self.stderr.write(f"Line {number}: {errors}")
+        if result.invalid > SHOWN_ERRORS:
+            self.stderr.write(f"... and {result.invalid - SHOWN_ERRORS} more invalid rows")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.imported} products ({result.images} images), "
+                f"skipped {result.invalid} invalid rows in {result.seconds:.1f}s "
+                f"({result.rows_per_second:.0f} rows/s)"
+            )
+        )
+
+    def progress(self, result):
+        self.stdout.write(
+            f"{result.imported} imported, {result.invalid} invalid "
+            f"({result.rows_per_second:.0f} rows/s)"
+        )
+
+    def guess_format(self, path):
+        suffixes = Path(path).suffixes
+        if suffixes and suffixes[-1] == ".gz":
+            suffixes = suffixes[:-1]
+        if suffixes and suffixes[-1].lstrip(".") in READERS:
+            return suffixes[-1].lstrip(".")
+        raise CommandError("Cannot guess the row format, pass --input-format")
+
+    def open(self, path):
+        if path == "-":
+            return contextlib.nullcontext(sys.stdin)
+        try:
+            if path.endswith(".gz"):
+                return gzip.open(path, "rt", encoding="utf-8", newline="")
+            return open(path, encoding="utf-8", newline="")
+        except OSError as e:
+            raise CommandError(str(e)) from e
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.rendering import RENDERER_VERSION
+
+RENDERED_FIELDS = ["description_html", "description_html_version"]
+
+
+class Command(BaseCommand):
+    help = "Render Markdown product descriptions to HTML for rows rendered by an older renderer"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Re-render every product, not only stale ones"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Products updated per query"
+        )
+
+    def handle(self, *_args, **options):
+        batch_size = options["batch_size"]
+        queryset = Product.objects.only("id", "description").order_by("id")
+        if not options["all"]:
+            queryset = queryset.exclude(description_html_version=RENDERER_VERSION)
+
+        # bulk_update не трогает updated_at и не шлет сигналы: ETag и кэш ответов
+        # сменятся вместе с RENDERER_VERSION
+        rendered = 0
+        batch = []
+        for product in queryset.iterator(chunk_size=batch_size):
+            product.render_description()
+            batch.append(product)
+            if len(batch) == batch_size:
+                Product.objects.bulk_update(batch, RENDERED_FIELDS)
+                rendered += len(batch)
+                batch = []
+        if batch:
+            Product.objects.bulk_update(batch, RENDERED_FIELDS)
+            rendered += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rendered {rendered} descriptions (renderer v{RENDERER_VERSION})")
+        )
@@ -0,0 +1,103 @@
+import json
+import signal
+import threading
+import time
+
+import pika
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+from contacts.consumer import POOL_CHOICES, POOL_PROCESS, Consumer
+from contacts.metrics import start_http_server
+from contacts.retries import RetryPolicy
+from products.images import generate_image_variants
+
+
+def process_image_delivery(body):
+    """Построить копии изображения по сообщению из очереди (в потоке или процессе пула)"""
+    message = json.loads(body)
+    product_id = message.get("product_id")
+    if product_id is None:
+        raise ValueError(f"Message without product_id: {message}")
+    try:
+        return generate_image_variants(product_id, force=message.get("force", False))
+    except UnidentifiedImageError as e:
+        # Файл не изображение: повторять бессмысленно, сообщение уйдет в dead-letter очередь
+        raise ValueError(str(e)) from e
+
+
+class Command(BaseCommand):
+    help = "Run RabbitMQ consumer that builds resized product image variants"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.IMAGE_WORKER_CONCURRENCY,
+            help="Number of images processed in parallel",
+        )
+        parser.add_argument(
+            "--pool",
+            choices=POOL_CHOICES,
+            default=POOL_PROCESS,
+            help="Run Pillow in a prefork process pool (default) or a thread pool",
+        )
+        parser.add_argument(
+            "--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port"
+        )
+        parser.add_argument(
+            "--queue-depth-interval",
+            type=float,
+            default=settings.WORKER_QUEUE_DEPTH_INTERVAL,
+            help="Seconds between queue depth samples (0 disables sampling)",
+        )
+
+    def handle(self, *_args, **options):
+        self.stdout.write(self.style.SUCCESS("Starting image worker..."))
+        if options["metrics_port"]:
+            start_http_server(options["metrics_port"])
+
+        self.consumer = None
+        self.stopping = False
+        previous_handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                previous_handlers[signum] = signal.signal(signum, self.stop)
+
+        try:
+            self.consume(options)
+        finally:
+            for signum, previous in previous_handlers.items():
+                signal.signal(signum, previous)
+
+        self.stdout.write(self.style.SUCCESS("Stopping image worker..."))
+
+    def consume(self, options):
+        """Обрабатывать сообщения, переподключаясь при обрыве соединения"""
+        queue_name = settings.IMAGE_QUEUE_NAME
+        while not self.stopping:
+            self.consumer = Consumer(
+                process_image_delivery,
+                queue_name=queue_name,
+                concurrency=options["concurrency"],
+                pool=options["pool"],
+                retry_policy=RetryPolicy(queue_name=queue_name),
+                queue_depth_interval=options["queue_depth_interval"],
+            )
+            try:
+                self.consumer.run()
+            except pika.exceptions.AMQPConnectionError:
+                if self.stopping:
+                    break
+                self.stdout.write(
+                    self.style.WARNING("RabbitMQ connection failed. Retrying in 5 seconds...")
+                )
+                time.sleep(5)
+            except KeyboardInterrupt:
+                break
+
+    def stop(self, *_args):
+        self.stopping = True
+        if self.consumer is not None:
+            self.consumer.stop()
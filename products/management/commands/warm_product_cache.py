@@ -0,0 +1,77 @@
+import math
+
+from django.conf import settings
+from django.core.exceptions import DisallowedHost
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from products.models import Product
+from products.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    help = "Fill the product response cache: list pages, featured products and product details"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--host",
+            required=True,
+            help="Public host the API is served on (image URLs in cached responses include it)",
+        )
+        parser.add_argument("--secure", action="store_true", help="Warm responses for https")
+        parser.add_argument(
+            "--pages", type=int, default=None, help="Number of list pages to warm (default: all)"
+        )
+        parser.add_argument(
+            "--skip-details", action="store_true", help="Do not warm product detail responses"
+        )
+
+    def handle(self, *_args, **options):
+        factory = RequestFactory(HTTP_HOST=options["host"])
+        secure = options["secure"]
+        try:
+            # Та же проверка ALLOWED_HOSTS, что у настоящего запроса
+            factory.get("/").get_host()
+        except DisallowedHost as e:
+            raise CommandError(f"{options['host']} is not in ALLOWED_HOSTS") from e
+        self.failed = []
+
+        pages = math.ceil(Product.objects.count() / settings.REST_FRAMEWORK["PAGE_SIZE"]) or 1
+        if options["pages"] is not None:
+            pages = min(pages, options["pages"])
+
+        list_view = ProductViewSet.as_view({"get": "list"})
+        for page in range(1, pages + 1):
+            # Первая страница запрашивается и без параметра, и с page=1
+            params = {"page": page} if page > 1 else {}
+            self.warm(list_view, factory.get("/api/products/", params, secure=secure))
+        self.warm(list_view, factory.get("/api/products/", {"page": 1}, secure=secure))
+
+        featured_view = ProductViewSet.as_view({"get": "featured"})
+        self.warm(featured_view, factory.get("/api/products/featured/", secure=secure))
+
+        details = 0
+        if not options["skip_details"]:
+            detail_view = ProductViewSet.as_view({"get": "retrieve"})
+            for pk in Product.objects.values_list("pk", flat=True).iterator():
+                request = factory.get(f"/api/products/{pk}/", secure=secure)
+                details += self.warm(detail_view, request, pk=str(pk))
+
+        if self.failed:
+            # Кэшируются только успешные ответы: эти страницы остались холодными
+            raise CommandError(
+                f"{len(self.failed)} responses were not cached: " + ", ".join(self.failed[:10])
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Warmed {pages} list pages, featured products and {details} product details"
+            )
+        )
+
+    def warm(self, view, request, **kwargs):
+        """Вызвать view; вернуть True для ответа 200 и запомнить остальные"""
+        response = view(request, **kwargs)
+        if response.status_code == 200:
+            return True
+        self.failed.append(f"{request.get_full_path()} ({response.status_code})")
+        return False
@@ -0,0 +1,13 @@
+from prometheus_client import Counter
+
+# Кэш ответов каталога
+PRODUCT_CACHE_HITS = Counter(
+    "olki_product_cache_hits_total",
+    "Number of product API responses served from the cache",
+    ["action"],
+)
+PRODUCT_CACHE_MISSES = Counter(
+    "olki_product_cache_misses_total",
+    "Number of product API responses built because the cache had no current entry",
+    ["action"],
+)
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:27
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Только для PostgreSQL: на SQLite поиск идет через FTS5 (products/search.py)
+CREATE_SEARCH_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION products_product_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER products_product_search_vector
+    BEFORE INSERT OR UPDATE ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector()
+    """,
+    "UPDATE products_product SET name = name",
+    "CREATE INDEX products_product_search_gin ON products_product USING gin (search_vector)",
+    "CREATE INDEX products_product_name_trgm ON products_product USING gin (name gin_trgm_ops)",
+]
+
+DROP_SEARCH_SQL = [
+    "DROP INDEX IF EXISTS products_product_name_trgm",
+    "DROP INDEX IF EXISTS products_product_search_gin",
+    "DROP TRIGGER IF EXISTS products_product_search_vector ON products_product",
+    "DROP FUNCTION IF EXISTS products_product_search_vector()",
+]
+
+
+def run_on_postgres(statements):
+    def run(_apps, schema_editor):
+        if schema_editor.connection.vendor == "postgresql":
+            for statement in statements:
+                schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0002_product_updated_at_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_on_postgres(CREATE_SEARCH_SQL), run_on_postgres(DROP_SEARCH_SQL)),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0003_product_search"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="product",
+            options={
+                "ordering": ["-created_at", "-id"],
+                "verbose_name": "Продукция",
+                "verbose_name_plural": "Продукция",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["-created_at", "-id"], name="product_created_at_id_idx"),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0004_created_at_id_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="description_html",
+            field=models.TextField(blank=True, editable=False, verbose_name="Описание (HTML)"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="description_html_version",
+            field=models.PositiveSmallIntegerField(
+                default=0, editable=False, verbose_name="Версия рендерера описания"
+            ),
+        ),
+    ]
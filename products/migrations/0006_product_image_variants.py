@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0005_product_description_html"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="image_variants",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="Копии изображения"
+            ),
+        ),
+    ]
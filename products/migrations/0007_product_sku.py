@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0006_product_image_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="sku",
+            field=models.CharField(
+                blank=True, max_length=64, null=True, unique=True, verbose_name="Артикул"
+            ),
+        ),
+    ]
@@ -1,25 +1,64 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
+from .rendering import RENDERER_VERSION, render_description
+
 
 class Product(models.Model):
     """Модель продукции (краски)"""
 
+    # Артикул поставщика: естественный ключ для импорта каталога (import_products)
+    sku = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, verbose_name="Артикул"
+    )
     name = models.CharField(max_length=200, verbose_name="Название")
     description = models.TextField(verbose_name="Описание (Markdown)")
+    description_html = models.TextField(blank=True, editable=False, verbose_name="Описание (HTML)")
+    description_html_version = models.PositiveSmallIntegerField(
+        default=0, editable=False, verbose_name="Версия рендерера описания"
+    )
     price = models.DecimalField(
         max_digits=10, decimal_places=2, validators=[MinValueValidator(0)], verbose_name="Стоимость"
     )
     image = models.ImageField(
         upload_to="products/", verbose_name="Изображение", null=True, blank=True
     )
+    # Уменьшенные копии image, их строит runimageworker (см. products/images.py)
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Копии изображения"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
-    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Дата обновления")
+
+    # Заполняется триггером PostgreSQL, индексы создает миграция 0003 (см. products/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = "Продукция"
         verbose_name_plural = "Продукция"
-        ordering = ["-created_at"]
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            # Порядок списка и keyset-пагинация (olki_backend/pagination.py)
+            models.Index(fields=["-created_at", "-id"], name="product_created_at_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
+
+    def render_description(self):
+        self.description_html = render_description(self.description)
+        self.description_html_version = RENDERER_VERSION
+
+    def save(self, *args, **kwargs):
+        """Сохранить продукт, перерисовав HTML описания, если описание сохраняется"""
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "description" in update_fields:
+            self.render_description()
+            if update_fields is not None:
+                kwargs["update_fields"] = {
+                    *update_fields,
+                    "description_html",
+                    "description_html_version",
+                }
+        super().save(*args, **kwargs)
@@ -0,0 +1,64 @@
+"""
+Рендеринг Markdown-описаний продукции в HTML.
+
+HTML строится один раз при сохранении продукта и хранится в
+``Product.description_html`` вместе с версией рендерера. После изменения
+настроек рендеринга достаточно увеличить ``RENDERER_VERSION``: устаревшие
+описания перерисуются при первой выдаче или командой
+``render_descriptions``.
+
+Очистка встроена в сам Markdown: сырой HTML из описания экранируется как
+текст, а ссылки и изображения со схемами вне ``ALLOWED_URL_SCHEMES``
+(``javascript:``, ``data:`` и т.п.) теряют адрес. Схема проверяется так, как ее
+увидит браузер: после декодирования HTML-сущностей и без управляющих символов.
+"""
+
+import html
+import re
+from urllib.parse import urlsplit
+
+import markdown
+from markdown.extensions import Extension
+from markdown.treeprocessors import Treeprocessor
+
+# 2: схема ссылки проверяется после декодирования сущностей (&#106;avascript:)
+RENDERER_VERSION = 2
+
+EXTENSIONS = ["tables", "fenced_code", "sane_lists"]
+
+ALLOWED_URL_SCHEMES = {"", "http", "https", "mailto"}
+URL_ATTRIBUTES = ("href", "src")
+
+# Управляющие символы C0 и пробел: браузеры убирают их из адреса перед разбором схемы
+IGNORED_URL_CHARACTERS = re.compile(r"[\x00-\x20\x7f]+")
+
+
+def url_scheme(url):
+    """Схема адреса из атрибута так, как ее поймет браузер"""
+    # Markdown оставляет сущности в адресе как есть, браузер их декодирует
+    return urlsplit(IGNORED_URL_CHARACTERS.sub("", html.unescape(url))).scheme.lower()
+
+
+class UnsafeUrlCleaner(Treeprocessor):
+    def run(self, root):
+        for element in root.iter():
+            for attribute in URL_ATTRIBUTES:
+                url = element.get(attribute)
+                if url is None:
+                    continue
+                if url_scheme(url) not in ALLOWED_URL_SCHEMES:
+                    del element.attrib[attribute]
+
+
+class SafeMarkdownExtension(Extension):
+    """Экранировать сырой HTML и убирать небезопасные ссылки"""
+
+    def extendMarkdown(self, md):  # noqa: N802
+        md.preprocessors.deregister("html_block")
+        md.inlinePatterns.deregister("html")
+        md.treeprocessors.register(UnsafeUrlCleaner(md), "unsafe_url_cleaner", 0)
+
+
+def render_description(text):
+    """HTML для Markdown-текста описания"""
+    return markdown.markdown(text, extensions=[*EXTENSIONS, SafeMarkdownExtension()])
@@ -0,0 +1,102 @@
+"""
+Полнотекстовый поиск по каталогу продукции.
+
+На PostgreSQL колонка ``search_vector`` (название с весом A и описание с весом B,
+в конфигурациях russian и english) поддерживается триггером и индексирована
+GIN, а опечатки в названии ловит ``pg_trgm`` (оператор ``%>`` по GIN-индексу
+на ``name``). Результаты ранжируются по ``ts_rank`` и сходству триграмм.
+
+На SQLite (тесты и локальная разработка) тот же поиск идет через FTS5-таблицу
+``products_product_fts`` с ранжированием ``bm25``. Ее триггеры ставятся
+после каждой миграции: SQLite пересоздает таблицу при изменении колонок,
+и триггеры при этом теряются.
+"""
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, When
+
+SEARCH_CONFIGS = ("russian", "english")
+
+FTS_TABLE = "products_product_fts"
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='products_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def install_sqlite_fts(using="default", **_kwargs):
+    """Создать FTS5-индекс и его триггеры на SQLite (обработчик post_migrate)"""
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for statement in SQLITE_FTS_SQL:
+            cursor.execute(statement)
+
+
+def search_products(queryset, query):
+    """Отфильтровать и отранжировать ``queryset`` по поисковой строке"""
+    if not query.split():
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return _postgres_search(queryset, query)
+    if vendor == "sqlite":
+        return _sqlite_search(queryset, query)
+    return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+
+
+def _postgres_search(queryset, query):
+    ts_query = SearchQuery(query, config=SEARCH_CONFIGS[0], search_type="websearch")
+    for config in SEARCH_CONFIGS[1:]:
+        ts_query |= SearchQuery(query, config=config, search_type="websearch")
+    return (
+        queryset.annotate(
+            rank=SearchRank(F("search_vector"), ts_query),
+            similarity=TrigramWordSimilarity(query, "name"),
+        )
+        .filter(Q(search_vector=ts_query) | Q(name__trigram_word_similar=query))
+        .order_by("-rank", "-similarity", "-created_at", "-id")
+    )
+
+
+def _fts5_query(query):
+    # Каждое слово - отдельная фраза с префиксным поиском; кавычки экранируются
+    return " ".join('"{}"*'.format(token.replace('"', '""')) for token in query.split())
+
+
+def _sqlite_search(queryset, query):
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0)",
+            [_fts5_query(query)],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return queryset.none()
+    rank = Case(
+        *(When(pk=pk, then=position) for position, pk in enumerate(ids)),
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(rank)
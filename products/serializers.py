@@ -1,26 +1,42 @@
 from rest_framework import serializers
 
+from .images import srcset
 from .models import Product
+from .rendering import RENDERER_VERSION
 
 
 class ProductSerializer(serializers.ModelSerializer):
     """Сериализатор для продукции"""
 
     image_url = serializers.SerializerMethodField()
+    description_html = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
             "id",
+            "sku",
             "name",
             "description",
+            "description_html",
             "price",
             "image",
             "image_url",
+            "image_variants",
+            "image_srcset",
             "created_at",
             "updated_at",
         ]
         read_only_fields = ["created_at", "updated_at"]
+        # Колонки, которые читают вычисляемые поля (для ?fields= и ?omit=)
+        field_columns = {
+            "description_html": ["description", "description_html", "description_html_version"],
+            "image_url": ["image"],
+            "image_variants": ["image", "image_variants"],
+            "image_srcset": ["image", "image_variants"],
+        }
 
     def get_image_url(self, obj):
         if obj.image:
@@ -29,3 +45,28 @@ class ProductSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.image.url)
             return obj.image.url
         return None
+
+    def _image_sources(self, obj):
+        # image_variants и image_srcset читают один результат srcset: сериализатор
+        # списка один на все объекты, поэтому кэш привязан к текущему объекту
+        cached = getattr(self, "_image_sources_cache", None)
+        if cached is None or cached[0] is not obj:
+            cached = (obj, srcset(obj, self.context.get("request")))
+            self._image_sources_cache = cached
+        return cached[1]
+
+    def get_image_variants(self, obj):
+        return self._image_sources(obj)[0]
+
+    def get_image_srcset(self, obj):
+        return self._image_sources(obj)[1]
+
+    def get_description_html(self, obj):
+        if obj.description_html_version != RENDERER_VERSION:
+            # Рендерер обновился: перерисовать один раз и сохранить без сигналов и updated_at
+            obj.render_description()
+            Product.objects.filter(pk=obj.pk).update(
+                description_html=obj.description_html,
+                description_html_version=obj.description_html_version,
+            )
+        return obj.description_html
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate
+from .conditional import record_deletion
+from .images import enqueue_image_variants, variants_current
+from .models import Product
+from .suggest import get_suggest_index
+
+
+def _catalog_changed(pk, name, deleted=False):
+    """Сбросить кэш ответов каталога и обновить индекс автодополнения после COMMIT
+
+    До COMMIT параллельный GET прочитал бы старую строку и сохранил ее в кэше под
+    новой версией каталога (и с новым ETag).
+    """
+    version = invalidate(pk)
+    get_suggest_index().apply(pk, name, version)
+    if deleted:
+        record_deletion()
+
+
+@receiver(post_save, sender=Product)
+def product_saved(instance, **_kwargs):
+    """Сбросить кэш и обновить индекс после COMMIT, поставить в очередь копии нового
+    изображения (задача пишется в outbox в той же транзакции)"""
+    transaction.on_commit(lambda pk=instance.pk, name=instance.name: _catalog_changed(pk, name))
+    if instance.image and not variants_current(instance):
+        enqueue_image_variants(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(instance, **_kwargs):
+    """То же при удалении; удаление не меняет MAX(updated_at), поэтому его время
+    запоминается для Last-Modified"""
+    transaction.on_commit(lambda pk=instance.pk: _catalog_changed(pk, None, deleted=True))
@@ -0,0 +1,191 @@
+"""
+Индекс автодополнения по названиям продукции в памяти процесса.
+
+Индекс строится одним запросом ``id, name`` при первом обращении (или заранее,
+при загрузке WSGI/ASGI-приложения) и дальше отвечает без обращений к БД:
+префиксы ищутся бинарным поиском по отсортированному словарю слов из названий,
+а слово запроса без совпадений (опечатка) заменяется похожими словами
+по общим триграммам.
+
+Согласованность между процессами держится на версии каталога из
+``products/cache.py``: сигналы ``Product`` обновляют индекс своего процесса
+инкрементально, и если новая версия ровно на единицу больше версии индекса,
+чужих изменений не было и индекс остается актуальным. Остальные процессы
+сверяют версию не чаще раза в ``SUGGEST_VERSION_CHECK_INTERVAL`` секунд
+и при расхождении перестраивают индекс.
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .cache import catalog_version
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"\w+")
+
+# Сходство триграмм (мера Жаккара), начиная с которого название считается похожим
+MIN_SIMILARITY = 0.3
+
+
+def normalize(text):
+    return text.casefold().replace("ё", "е")
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+    """Префиксный и триграммный индекс слов из названий продукции"""
+
+    def __init__(self, check_interval=None):
+        self.check_interval = (
+            settings.SUGGEST_VERSION_CHECK_INTERVAL if check_interval is None else check_interval
+        )
+        self.lock = threading.Lock()
+        self.version = None
+        self.checked_at = None
+        self._clear()
+
+    def _clear(self):
+        self.names = {}
+        self.products_by_word = defaultdict(set)
+        self.vocabulary = []
+        self.word_trigrams = defaultdict(set)
+
+    def build(self, products, version):
+        """Заполнить индекс парами ``(id, name)``"""
+        with self.lock:
+            self._clear()
+            for pk, name in products:
+                self._add(pk, name)
+            self.vocabulary.sort()
+            self.version = version
+            self.checked_at = time.monotonic()
+
+    def rebuild(self):
+        from .models import Product
+
+        version = catalog_version()
+        self.build(Product.objects.values_list("id", "name").iterator(), version)
+        logger.info("Suggest index built: %d products", len(self.names))
+
+    def _add(self, pk, name, keep_sorted=False):
+        self.names[pk] = name
+        for word in set(WORD_RE.findall(normalize(name))):
+            if word not in self.products_by_word:
+                if keep_sorted:
+                    bisect.insort(self.vocabulary, word)
+                else:
+                    self.vocabulary.append(word)
+                for trigram in trigrams(word):
+                    self.word_trigrams[trigram].add(word)
+            self.products_by_word[word].add(pk)
+
+    def _remove(self, pk):
+        name = self.names.pop(pk, None)
+        if name is None:
+            return
+        for word in set(WORD_RE.findall(normalize(name))):
+            products = self.products_by_word[word]
+            products.discard(pk)
+            if products:
+                continue
+            del self.products_by_word[word]
+            del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+            for trigram in trigrams(word):
+                self.word_trigrams[trigram].discard(word)
+
+    def apply(self, pk, name, version):
+        """Учесть изменение продукта (``name=None`` - удаление) с новой версией каталога
+
+        Вызывается после COMMIT (``products.signals``): откаченное изменение не должно
+        попасть в индекс с версией, которую процесс считает текущей.
+        """
+        with self.lock:
+            if self.version is None:
+                return
+            self._remove(pk)
+            if name is not None:
+                self._add(pk, name, keep_sorted=True)
+            # Иначе между версиями были изменения других процессов: нужна перестройка
+            self.version = version if version == self.version + 1 else None
+
+    def ensure_current(self):
+        """Перестроить индекс, если он не построен или устарел относительно версии каталога"""
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < self.check_interval:
+            return
+        version = catalog_version()
+        if self.version is not None and version == self.version:
+            self.checked_at = now
+            return
+        self.rebuild()
+
+    def _prefix_words(self, token):
+        position = bisect.bisect_left(self.vocabulary, token)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(token):
+            yield self.vocabulary[position]
+            position += 1
+
+    def _similar_words(self, token):
+        token_trigrams = trigrams(token)
+        shared = Counter()
+        for trigram in token_trigrams:
+            shared.update(self.word_trigrams.get(trigram, ()))
+        for word, count in shared.items():
+            if count / (len(token_trigrams) + len(trigrams(word)) - count) >= MIN_SIMILARITY:
+                yield word
+
+    def _products(self, words):
+        return set().union(*(self.products_by_word[word] for word in words))
+
+    def suggest(self, query, limit=10):
+        """До ``limit`` пар ``(id, name)`` для строки ``query``"""
+        normalized = normalize(query).strip()
+        tokens = WORD_RE.findall(normalized)
+        if not tokens:
+            return []
+
+        with self.lock:
+            # Каждое слово запроса - префикс слова из названия, а если таких нет
+            # (вероятно, опечатка) - похожее на него по триграммам слово
+            found = None
+            for token in tokens:
+                ids = self._products(self._prefix_words(token))
+                if not ids:
+                    ids = self._products(self._similar_words(token))
+                found = ids if found is None else found & ids
+            ranked = sorted(
+                found,
+                key=lambda pk: (
+                    not normalize(self.names[pk]).startswith(normalized),
+                    len(self.names[pk]),
+                    self.names[pk],
+                ),
+            )
+            return [(pk, self.names[pk]) for pk in ranked[:limit]]
+
+
+_index = SuggestIndex()
+
+
+def get_suggest_index():
+    return _index
+
+
+def warm_suggest_index():
+    """Построить индекс при старте приложения; без БД он построится при первом запросе"""
+    try:
+        _index.rebuild()
+    except DatabaseError:
+        logger.warning("Suggest index not built at startup: database unavailable")
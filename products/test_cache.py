@@ -0,0 +1,181 @@
+import io
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.http import Http404
+from rest_framework.test import APIClient
+
+from . import metrics
+from .cache import CATALOG_VERSION_KEY
+from .models import Product
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def products(db):
+    return [
+        Product.objects.create(name=f"Product {i}", description="Desc", price=100 * i)
+        for i in range(3)
+    ]
+
+
+def hits(action):
+    return metrics.PRODUCT_CACHE_HITS.labels(action=action)._value.get()
+
+
+def misses(action):
+    return metrics.PRODUCT_CACHE_MISSES.labels(action=action)._value.get()
+
+
+@pytest.mark.django_db
+class TestProductResponseCache:
+    def test_list_served_from_cache(self, api_client, products):
+        hits_before, misses_before = hits("list"), misses("list")
+
+        first = api_client.get("/api/products/")
+        with patch("products.views.ProductViewSet.get_serializer") as get_serializer:
+            second = api_client.get("/api/products/")
+            get_serializer.assert_not_called()
+
+        assert second.data == first.data
+        assert hits("list") == hits_before + 1
+        assert misses("list") == misses_before + 1
+
+    def test_query_params_and_host_are_part_of_key(self, api_client, products):
+        api_client.get("/api/products/")
+        misses_before = misses("list")
+
+        api_client.get("/api/products/", {"search": "Product 1"})
+        api_client.get("/api/products/", HTTP_HOST="example.com")
+
+        assert misses("list") == misses_before + 2
+
+    def test_save_invalidates_list_and_featured(
+        self, api_client, products, django_capture_on_commit_callbacks
+    ):
+        api_client.get("/api/products/")
+        api_client.get("/api/products/featured/")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Product.objects.create(name="Новая краска", description="Desc", price=500)
+
+        assert api_client.get("/api/products/").data["count"] == 4
+        assert api_client.get("/api/products/featured/").data[0]["name"] == "Новая краска"
+
+    def test_update_invalidates_only_that_product(
+        self, api_client, products, django_capture_on_commit_callbacks
+    ):
+        first, second = products[0], products[1]
+        api_client.get(f"/api/products/{first.id}/")
+        api_client.get(f"/api/products/{second.id}/")
+        hits_before = hits("retrieve")
+
+        first.name = "Переименован"
+        with django_capture_on_commit_callbacks(execute=True):
+            first.save()
+
+        assert api_client.get(f"/api/products/{first.id}/").data["name"] == "Переименован"
+        api_client.get(f"/api/products/{second.id}/")
+        assert hits("retrieve") == hits_before + 1
+
+    def test_delete_invalidates_product(
+        self, api_client, products, django_capture_on_commit_callbacks
+    ):
+        product = products[0]
+        api_client.get(f"/api/products/{product.id}/")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.delete(f"/api/products/{product.id}/")
+
+        assert api_client.get(f"/api/products/{product.id}/").status_code == 404
+
+    def test_invalidated_only_after_commit(
+        self, api_client, products, django_capture_on_commit_callbacks
+    ):
+        product = products[0]
+        api_client.get(f"/api/products/{product.id}/")
+        version = cache.get(CATALOG_VERSION_KEY)
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            product.name = "Переименован"
+            product.save()
+            # До COMMIT версия прежняя: параллельный GET не сохранит старую строку под новой
+            assert cache.get(CATALOG_VERSION_KEY) == version
+        assert len(callbacks) == 1
+
+        with pytest.raises(RuntimeError), transaction.atomic():
+            product.save()
+            raise RuntimeError("rollback")
+        assert cache.get(CATALOG_VERSION_KEY) == version
+
+    def test_evicted_version_is_a_miss(self, api_client, products):
+        api_client.get("/api/products/")
+        cache.delete(CATALOG_VERSION_KEY)
+        misses_before = misses("list")
+
+        api_client.get("/api/products/")
+
+        assert misses("list") == misses_before + 1
+
+    def test_errors_are_not_cached(self, api_client, db):
+        api_client.get("/api/products/999/")
+        Product.objects.create(id=999, name="Product", description="Desc", price=100)
+        assert api_client.get("/api/products/999/").status_code == 200
+
+    def test_disabled(self, api_client, products, settings):
+        settings.PRODUCT_CACHE_ENABLED = False
+        hits_before, misses_before = hits("list"), misses("list")
+
+        api_client.get("/api/products/")
+        api_client.get("/api/products/")
+
+        assert (hits("list"), misses("list")) == (hits_before, misses_before)
+
+
+@pytest.mark.django_db
+class TestWarmProductCacheCommand:
+    def test_warms_pages_featured_and_details(self, api_client, products):
+        call_command("warm_product_cache", "--host", "testserver")
+        hits_before = hits("list"), hits("featured"), hits("retrieve")
+
+        api_client.get("/api/products/")
+        api_client.get("/api/products/", {"page": 1})
+        api_client.get("/api/products/featured/")
+        for product in products:
+            api_client.get(f"/api/products/{product.id}/")
+
+        assert (hits("list"), hits("featured"), hits("retrieve")) == (
+            hits_before[0] + 2,
+            hits_before[1] + 1,
+            hits_before[2] + 3,
+        )
+
+    def test_skip_details(self, products):
+        call_command(
+            "warm_product_cache", "--host", "localhost:8000", "--skip-details", "--pages", "1"
+        )
+        misses_before = misses("retrieve")
+        APIClient().get(f"/api/products/{products[0].id}/", HTTP_HOST="localhost:8000")
+        assert misses("retrieve") == misses_before + 1
+
+    def test_host_must_be_allowed(self, products, settings):
+        settings.ALLOWED_HOSTS = ["olki.example.com"]
+        with pytest.raises(CommandError, match="ALLOWED_HOSTS"):
+            call_command("warm_product_cache", "--host", "localhost:8000")
+        call_command("warm_product_cache", "--host", "olki.example.com", stdout=io.StringIO())
+
+    def test_failed_responses(self, products):
+        with (
+            patch("products.views.ProductViewSet.featured_response", side_effect=Http404),
+            pytest.raises(
+                CommandError, match=r"1 responses were not cached: /api/products/featured/ \(404\)"
+            ),
+        ):
+            call_command("warm_product_cache", "--host", "testserver")
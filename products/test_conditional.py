@@ -0,0 +1,94 @@
+from unittest.mock import patch
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from .models import Product
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def products(db):
+    return [
+        Product.objects.create(name=f"Product {i}", description="Desc", price=100 * i)
+        for i in range(3)
+    ]
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    @pytest.mark.parametrize("url", ["/api/products/", "/api/products/featured/"])
+    def test_not_modified_without_serializing(self, api_client, products, url):
+        first = api_client.get(url)
+        assert first["ETag"].startswith('"')
+        assert first["Last-Modified"]
+        assert "no-cache" in first["Cache-Control"]
+
+        with (
+            patch("products.views.ProductViewSet.get_serializer") as get_serializer,
+            CaptureQueriesContext(connection) as queries,
+        ):
+            response = api_client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response["ETag"] == first["ETag"]
+        assert len(queries) == 1
+        get_serializer.assert_not_called()
+
+    def test_detail_not_modified(self, api_client, products):
+        url = f"/api/products/{products[0].id}/"
+        first = api_client.get(url)
+
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code == 304
+        assert api_client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code == 304
+
+    def test_etag_changes_with_data_and_params(self, api_client, products):
+        etag = api_client.get("/api/products/")["ETag"]
+
+        assert api_client.get("/api/products/", {"search": "1"})["ETag"] != etag
+        assert api_client.get("/api/products/", HTTP_HOST="example.com")["ETag"] != etag
+        assert api_client.get("/api/products/featured/")["ETag"] != etag
+
+        products[0].name = "Переименован"
+        products[0].save()
+        response = api_client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+    def test_delete_changes_validators(
+        self, api_client, products, django_capture_on_commit_callbacks
+    ):
+        first = api_client.get("/api/products/")
+        with django_capture_on_commit_callbacks(execute=True):
+            products[0].delete()
+
+        assert api_client.get("/api/products/", HTTP_IF_NONE_MATCH=first["ETag"]).status_code == 200
+        with (
+            patch("products.conditional.time.time", return_value=2_000_000_000),
+            django_capture_on_commit_callbacks(execute=True),
+        ):
+            products[1].delete()
+        response = api_client.get("/api/products/", HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        assert response.status_code == 200
+        assert response["Last-Modified"] == http_date(2_000_000_000)
+
+    def test_missing_product_has_no_validators(self, api_client, db):
+        response = api_client.get("/api/products/999/", HTTP_IF_NONE_MATCH="*")
+        assert response.status_code == 404
+        assert not response.has_header("ETag")
+
+    def test_empty_catalog(self, api_client, db):
+        response = api_client.get("/api/products/")
+        assert response.status_code == 200
+        assert not response.has_header("Last-Modified")
+        assert (
+            api_client.get("/api/products/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 304
+        )
@@ -0,0 +1,101 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from contacts.models import ContactRequest
+from olki_backend.fieldsets import sparse_serializer_class
+
+from .models import Product
+from .serializers import ProductSerializer
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def products(db):
+    return [
+        Product.objects.create(name=f"Краска {i}", description="# Длинное описание", price=100)
+        for i in range(3)
+    ]
+
+
+def product_queries(queries):
+    return [q["sql"] for q in queries if 'FROM "products_product"' in q["sql"]]
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+    def test_fields_trim_output_and_sql(self, api_client, products):
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get("/api/products/", {"fields": "id,name,price,image_url"})
+
+        assert response.status_code == 200
+        assert set(response.data["results"][0]) == {"id", "name", "price", "image_url"}
+        select = [sql for sql in product_queries(queries) if "LIMIT" in sql]
+        assert len(select) == 1
+        assert '"description"' not in select[0]
+        assert '"image"' in select[0]
+
+    def test_omit(self, api_client, products):
+        response = api_client.get(
+            f"/api/products/{products[0].id}/", {"omit": "description,description_html"}
+        )
+        assert "description" not in response.data
+        assert "description_html" not in response.data
+        assert response.data["name"] == "Краска 0"
+
+    def test_computed_fields_load_their_columns(
+        self, api_client, products, django_assert_num_queries
+    ):
+        api_client.get("/api/products/featured/")
+        with django_assert_num_queries(2):
+            # Агрегат для ETag и сама выборка: ленивых догрузок колонок нет
+            response = api_client.get(
+                "/api/products/featured/", {"fields": "id,description_html,image_srcset"}
+            )
+        assert response.data[0]["description_html"] == "<h1>Длинное описание</h1>"
+
+    def test_unknown_field(self, api_client, products):
+        response = api_client.get("/api/products/", {"fields": "id,secret"})
+        assert response.status_code == 400
+        assert "secret" in str(response.data)
+
+    def test_all_fields_use_base_serializer(self, api_client, products):
+        response = api_client.get("/api/products/", {"omit": ""})
+        assert set(response.data["results"][0]) == set(ProductSerializer.Meta.fields)
+
+    def test_writes_ignore_fieldsets(self, api_client, products):
+        response = api_client.patch(
+            f"/api/products/{products[0].id}/?fields=id", {"price": "200.00"}, format="json"
+        )
+        assert response.data["price"] == "200.00"
+        assert "name" in response.data
+
+    def test_serializer_classes_are_cached(self):
+        first = sparse_serializer_class(ProductSerializer, ("id", "name"))
+        assert sparse_serializer_class(ProductSerializer, ("id", "name")) is first
+        assert list(first().fields) == ["id", "name"]
+
+    def test_keyset_pagination_with_fields(self, api_client, products, django_assert_num_queries):
+        # Агрегат для ETag и страница; created_at для курсора не догружается
+        with django_assert_num_queries(2):
+            response = api_client.get("/api/products/", {"fields": "name", "cursor": ""})
+        assert [row["name"] for row in response.data["results"]] == [
+            "Краска 2",
+            "Краска 1",
+            "Краска 0",
+        ]
+
+    def test_contact_requests(self, api_client, db):
+        ContactRequest.objects.create(name="Иван", email="ivan@example.com", message="Текст" * 100)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get("/api/contacts/", {"fields": "id,name,email"})
+
+        assert set(response.data["results"][0]) == {"id", "name", "email"}
+        select = [q["sql"] for q in queries if "LIMIT" in q["sql"]]
+        assert '"message"' not in select[0]
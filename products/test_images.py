@@ -0,0 +1,218 @@
+import io
+import json
+from unittest.mock import patch
+
+import pika
+import pytest
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from PIL import Image
+from rest_framework.test import APIClient
+
+from contacts.models import OutboxMessage
+
+from .images import VARIANTS_VERSION, generate_image_variants, srcset
+from .management.commands import runimageworker
+from .management.commands.runimageworker import process_image_delivery
+from .models import Product
+from .serializers import ProductSerializer
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+def image_file(name="photo.png", size=(2000, 1000), mode="RGB"):
+    buffer = io.BytesIO()
+    Image.new(mode, size, "red").save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+def image_jobs():
+    return OutboxMessage.objects.filter(queue=settings.IMAGE_QUEUE_NAME)
+
+
+@pytest.fixture
+def product(db):
+    return Product.objects.create(name="Краска", description="Desc", price=100, image=image_file())
+
+
+@pytest.mark.django_db
+class TestImageVariants:
+    def test_upload_queues_job(self, product):
+        assert [job.payload for job in image_jobs()] == [
+            {"product_id": product.id, "image": product.image.name, "force": False}
+        ]
+
+    def test_generates_variants(self, product):
+        assert generate_image_variants(product.id) is True
+
+        product.refresh_from_db()
+        variants = product.image_variants
+        assert variants["source"] == product.image.name
+        assert variants["version"] == VARIANTS_VERSION
+        sizes = {name: (v["width"], v["height"]) for name, v in variants["variants"].items()}
+        assert sizes == {"thumbnail": (160, 80), "card": (480, 240), "full": (1280, 640)}
+        with default_storage.open(variants["variants"]["card"]["webp"]) as f:
+            assert Image.open(f).format == "WEBP"
+        with default_storage.open(variants["variants"]["card"]["jpeg"]) as f:
+            assert Image.open(f).size == (480, 240)
+
+    def test_small_and_transparent_images(self, db):
+        product = Product.objects.create(
+            name="Краска",
+            description="Desc",
+            price=100,
+            image=image_file(size=(100, 50), mode="RGBA"),
+        )
+        generate_image_variants(product.id)
+        product.refresh_from_db()
+        assert product.image_variants["variants"]["full"]["width"] == 100
+
+    def test_idempotent(self, product):
+        generate_image_variants(product.id)
+        product.refresh_from_db()
+        names = product.image_variants["variants"]["thumbnail"]
+
+        assert generate_image_variants(product.id) is False
+        assert generate_image_variants(product.id, force=True) is True
+        product.refresh_from_db()
+        assert product.image_variants["variants"]["thumbnail"] == names
+
+    def test_saving_current_product_does_not_queue(self, product):
+        generate_image_variants(product.id)
+        product.refresh_from_db()
+        OutboxMessage.objects.all().delete()
+
+        product.price = 200
+        product.save()
+
+        assert not image_jobs().exists()
+
+    def test_replaced_image_is_not_overwritten(self, product):
+        def replace_image(*args):
+            Product.objects.filter(pk=product.pk).update(image="products/other.png")
+            return real_build(*args)
+
+        from products import images
+
+        real_build = images.build_variants
+        with patch("products.images.build_variants", side_effect=replace_image):
+            assert generate_image_variants(product.id) is False
+        product.refresh_from_db()
+        assert product.image_variants == {}
+
+    def test_missing_product_or_image(self, db):
+        assert generate_image_variants(999) is False
+        product = Product.objects.create(name="Краска", description="Desc", price=100)
+        assert generate_image_variants(product.id) is False
+
+    def test_serializer_srcset(self, product):
+        client = APIClient()
+        url = f"/api/products/{product.id}/"
+        assert client.get(url).data["image_srcset"] is None
+
+        generate_image_variants(product.id)
+        data = client.get(url).data
+
+        assert data["image_variants"]["thumbnail"]["width"] == 160
+        assert data["image_variants"]["card"]["webp"].startswith("http://testserver/media/")
+        webp = data["image_srcset"]["webp"].split(", ")
+        assert [entry.rsplit(" ", 1)[1] for entry in webp] == ["160w", "480w", "1280w"]
+        assert data["image_srcset"]["jpeg"].count(".jpeg") == 3
+
+    def test_serializer_builds_srcset_once_per_product(self, product):
+        other = Product.objects.create(
+            name="Второй", description="Desc", price=100, image=image_file()
+        )
+        with patch("products.serializers.srcset", wraps=srcset) as build:
+            data = ProductSerializer([product, other], many=True).data
+        assert [call.args[0] for call in build.call_args_list] == [product, other]
+        assert data[0]["image_variants"] is None
+
+
+@pytest.mark.django_db
+class TestImageWorker:
+    def test_process_image_delivery(self, product):
+        body = json.dumps({"product_id": product.id})
+        assert process_image_delivery(body) is True
+        assert process_image_delivery(body) is False
+
+    @pytest.mark.parametrize("body", [b"not json", b'{"image": "x.png"}'])
+    def test_invalid_message(self, body):
+        with pytest.raises(ValueError):
+            process_image_delivery(body)
+
+    def test_broken_image_is_not_retryable(self, db):
+        product = Product.objects.create(
+            name="Краска",
+            description="Desc",
+            price=100,
+            image=SimpleUploadedFile("broken.jpg", b"\x00\x01", content_type="image/jpeg"),
+        )
+        with pytest.raises(ValueError):
+            process_image_delivery(json.dumps({"product_id": product.id}))
+
+    @patch("products.management.commands.runimageworker.time.sleep")
+    @patch("products.management.commands.runimageworker.start_http_server")
+    @patch("products.management.commands.runimageworker.Consumer")
+    def test_runimageworker(self, mock_consumer, mock_start_http_server, mock_sleep):
+        command = runimageworker.Command()
+        runs = []
+
+        def run():
+            runs.append(True)
+            if len(runs) == 1:
+                raise pika.exceptions.AMQPConnectionError("down")
+            command.stop()
+
+        mock_consumer.return_value.run.side_effect = run
+        call_command(command, "--concurrency", "4", "--metrics-port", "9102")
+
+        args, kwargs = mock_consumer.call_args
+        assert args == (process_image_delivery,)
+        assert kwargs.pop("retry_policy").queue_name == settings.IMAGE_QUEUE_NAME
+        assert kwargs == {
+            "queue_name": settings.IMAGE_QUEUE_NAME,
+            "concurrency": 4,
+            "pool": "process",
+            "queue_depth_interval": settings.WORKER_QUEUE_DEPTH_INTERVAL,
+        }
+        assert mock_consumer.call_count == 2
+        mock_sleep.assert_called_once_with(5)
+        mock_start_http_server.assert_called_once_with(9102)
+
+
+@pytest.mark.django_db
+class TestGenerateImageVariantsCommand:
+    def test_queues_missing_variants(self, product):
+        done = Product.objects.create(
+            name="Готово", description="Desc", price=100, image=image_file("done.png")
+        )
+        Product.objects.create(name="Без фото", description="Desc", price=100)
+        generate_image_variants(done.id)
+        OutboxMessage.objects.all().delete()
+
+        call_command("generate_image_variants", "--batch-size", "1")
+        assert [job.payload["product_id"] for job in image_jobs()] == [product.id]
+
+        OutboxMessage.objects.all().delete()
+        call_command("generate_image_variants", "--force")
+        assert sorted(job.payload["product_id"] for job in image_jobs()) == [product.id, done.id]
+        assert all(job.payload["force"] for job in image_jobs())
+
+    def test_one_insert_per_batch(self, product, django_assert_num_queries):
+        for i in range(2):
+            Product.objects.create(
+                name=f"Фото {i}", description="Desc", price=100, image=image_file()
+            )
+        OutboxMessage.objects.all().delete()
+
+        # Выборка продуктов и по INSERT в outbox на пачку (пачки 2 и 1)
+        with django_assert_num_queries(3):
+            call_command("generate_image_variants", "--batch-size", "2")
+        assert len(image_jobs()) == 3
@@ -0,0 +1,237 @@
+import csv
+import gzip
+import io
+import json
+import re
+from decimal import Decimal
+
+import pytest
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from contacts.models import OutboxMessage
+
+from .importing import import_products, read_csv, read_ndjson
+from .models import Product
+from .rendering import RENDERER_VERSION
+from .search import search_products
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path / "media"
+    return settings.MEDIA_ROOT
+
+
+@pytest.fixture
+def images_dir(tmp_path):
+    directory = tmp_path / "images"
+    directory.mkdir()
+    for name in ("blue.png", "red.png"):
+        Image.new("RGB", (20, 20), name.split(".")[0]).save(directory / name)
+    return directory
+
+
+def rows(*items):
+    return list(enumerate(items, start=1))
+
+
+def row(sku, name="Краска", price="100.00", **extra):
+    return {"sku": sku, "name": name, "description": f"**{name}**", "price": price, **extra}
+
+
+def write_csv(path, items):
+    with path.open("w", newline="", encoding="utf-8") as stream:
+        writer = csv.DictWriter(stream, ["sku", "name", "description", "price", "image"])
+        writer.writeheader()
+        writer.writerows(items)
+    return path
+
+
+@pytest.mark.django_db
+class TestImportProducts:
+    def test_creates_and_updates_by_sku(self):
+        existing = Product.objects.create(sku="A-1", name="Старое", description="x", price=1)
+        result = import_products(rows(row("A-1", "Эмаль"), row("B-2", "Грунт")), batch_size=1)
+
+        assert (result.imported, result.invalid) == (2, 0)
+        assert Product.objects.count() == 2
+        existing.refresh_from_db()
+        assert existing.name == "Эмаль"
+        assert existing.price == Decimal("100.00")
+        assert existing.updated_at > existing.created_at
+        # bulk_create не вызывает save(): HTML описания рендерит импорт
+        assert existing.description_html == "<p><strong>Эмаль</strong></p>"
+        assert existing.description_html_version == RENDERER_VERSION
+
+    def test_one_upsert_per_batch(self):
+        items = rows(*(row(f"SKU-{i}", f"Краска {i}") for i in range(50)))
+        with CaptureQueriesContext(connection) as queries:
+            import_products(items, batch_size=25)
+        inserts = [q for q in queries.captured_queries if q["sql"].startswith("INSERT")]
+        assert len(inserts) == 2
+        assert Product.objects.count() == 50
+
+    def test_invalid_rows_are_reported(self):
+        result = import_products(
+            rows(row("A-1"), row("", "Без артикула"), row("C-3", price="-1"), "not json")
+        )
+        assert (result.imported, result.invalid) == (1, 3)
+        assert [number for number, _errors in result.errors] == [2, 3, 4]
+        assert "sku" in result.errors[0][1]
+        assert "price" in result.errors[1][1]
+
+    def test_duplicate_sku_in_batch_last_wins(self):
+        result = import_products(rows(row("A-1", "Первая"), row("A-1", "Вторая")))
+        assert result.imported == 1
+        assert Product.objects.get(sku="A-1").name == "Вторая"
+
+    def test_search_index_follows(self):
+        import_products(rows(row("A-1", "Акриловая эмаль")))
+        assert list(
+            search_products(Product.objects.all(), "эмаль").values_list("sku", flat=True)
+        ) == ["A-1"]
+
+    def test_invalidates_catalog_once(self):
+        client = APIClient()
+        Product.objects.create(sku="A-1", name="Старое", description="x", price=1)
+        pk = Product.objects.get().pk
+        assert client.get(f"/api/products/{pk}/").data["name"] == "Старое"
+        assert client.get("/api/products/").data["count"] == 1
+
+        import_products(rows(row("A-1", "Новое"), row("B-2")))
+
+        assert client.get(f"/api/products/{pk}/").data["name"] == "Новое"
+        assert client.get("/api/products/").data["count"] == 2
+
+    def test_attaches_images(self, images_dir, media_root):
+        Product.objects.create(sku="B-2", name="Без изображения", description="x", price=1)
+        result = import_products(
+            rows(row("A-1", image="red.png"), row("B-2"), row("C-3", image="blue.png")),
+            images_dir=images_dir,
+            image_workers=2,
+        )
+        assert result.images == 2
+        products = {product.sku: product for product in Product.objects.all()}
+        red = products["A-1"].image.name
+        assert re.fullmatch(r"products/red_[0-9a-f]{16}\.png", red)
+        assert products["C-3"].image.storage.exists(products["C-3"].image.name)
+        assert not products["B-2"].image
+        jobs = OutboxMessage.objects.filter(queue=settings.IMAGE_QUEUE_NAME)
+        assert sorted(job.payload["product_id"] for job in jobs) == sorted(
+            [products["A-1"].pk, products["C-3"].pk]
+        )
+
+        # Повторный импорт не загружает тот же файл и не стирает изображение
+        result = import_products(
+            rows(row("A-1", image="red.png"), row("C-3")), images_dir=images_dir
+        )
+        assert result.images == 0
+        assert Product.objects.get(sku="A-1").image.name == red
+        assert Product.objects.get(sku="C-3").image.name == products["C-3"].image.name
+
+        result = import_products(
+            rows(row("A-1", image="red.png")), images_dir=images_dir, force_images=True
+        )
+        assert result.images == 1
+        assert Product.objects.get(sku="A-1").image.name == red
+        assert jobs.all().count() == 3
+        assert jobs.order_by("-id").first().payload["force"] is True
+        assert len(list((media_root / "products").iterdir())) == 2
+
+    def test_changed_file_is_uploaded(self, images_dir):
+        import_products(rows(row("A-1", image="red.png")), images_dir=images_dir)
+        name = Product.objects.get().image.name
+        Image.new("RGB", (20, 20), "green").save(images_dir / "red.png")
+
+        result = import_products(rows(row("A-1", image="red.png")), images_dir=images_dir)
+        assert result.images == 1
+        changed = Product.objects.get().image.name
+        assert changed != name
+        assert changed.startswith("products/red_")
+
+    def test_failed_batch_deletes_uploaded_files(self, images_dir, media_root, monkeypatch):
+        def fail(*_args, **_kwargs):
+            raise DatabaseError("disk full")
+
+        monkeypatch.setattr("products.importing.enqueue_many_image_variants", fail)
+        with pytest.raises(DatabaseError):
+            import_products(rows(row("A-1", image="red.png")), images_dir=images_dir)
+
+        assert not Product.objects.exists()
+        assert list((media_root / "products").iterdir()) == []
+
+    def test_missing_image_is_invalid(self, images_dir):
+        result = import_products(
+            rows(row("A-1", image="missing.png"), row("B-2", image="../images/red.png")),
+            images_dir=images_dir,
+        )
+        assert result.invalid == 1
+        assert "image" in result.errors[0][1]
+
+    def test_image_column_ignored_without_directory(self):
+        result = import_products(rows(row("A-1", image="products/red.png")))
+        assert result.imported == 1
+        assert not Product.objects.get().image
+
+
+class TestReaders:
+    def test_csv(self):
+        stream = io.StringIO("sku,name\nA-1,Эмаль\n\nB-2,Грунт\n")
+        assert [(number, data["sku"]) for number, data in read_csv(stream)] == [
+            (2, "A-1"),
+            (4, "B-2"),
+        ]
+
+    def test_ndjson(self):
+        stream = io.StringIO('{"sku": "A-1"}\n\n{broken\n')
+        assert list(read_ndjson(stream)) == [(1, {"sku": "A-1"}), (3, "{broken")]
+
+
+@pytest.mark.django_db
+class TestImportCommand:
+    def test_csv_file(self, tmp_path, images_dir):
+        path = write_csv(
+            tmp_path / "catalog.csv", [row("A-1", image="red.png"), row("B-2", price="bad")]
+        )
+        out, err = io.StringIO(), io.StringIO()
+        call_command(
+            "import_products", str(path), "--images-dir", str(images_dir), stdout=out, stderr=err
+        )
+        assert "Imported 1 products (1 images), skipped 1 invalid rows" in out.getvalue()
+        assert "rows/s" in out.getvalue()
+        assert "Line 3" in err.getvalue()
+
+    def test_gzip_ndjson_with_progress(self, tmp_path):
+        path = tmp_path / "catalog.ndjson.gz"
+        with gzip.open(path, "wt", encoding="utf-8") as stream:
+            for i in range(5):
+                stream.write(json.dumps(row(f"SKU-{i}")) + "\n")
+        out = io.StringIO()
+        call_command("import_products", str(path), "--batch-size", "2", "-v", "2", stdout=out)
+        assert out.getvalue().count("imported,") == 2
+        assert Product.objects.count() == 5
+
+    def test_many_errors_are_truncated(self, tmp_path):
+        path = tmp_path / "catalog.ndjson"
+        path.write_text("[]\n" * 25)
+        err = io.StringIO()
+        call_command("import_products", str(path), stdout=io.StringIO(), stderr=err)
+        assert "... and 5 more invalid rows" in err.getvalue()
+
+    def test_stdin(self, monkeypatch):
+        monkeypatch.setattr("sys.stdin", io.StringIO(json.dumps(row("A-1")) + "\n"))
+        call_command("import_products", "-", "--input-format", "ndjson", stdout=io.StringIO())
+        assert Product.objects.filter(sku="A-1").exists()
+
+    def test_errors(self, tmp_path):
+        with pytest.raises(CommandError, match="guess"):
+            call_command("import_products", str(tmp_path / "catalog.xlsx"))
+        with pytest.raises(CommandError):
+            call_command("import_products", str(tmp_path / "missing.csv"))
+        with pytest.raises(CommandError, match="Images directory"):
+            call_command("import_products", "x.csv", "--images-dir", str(tmp_path / "nope"))
@@ -0,0 +1,112 @@
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from .models import Product
+from .rendering import RENDERER_VERSION, render_description
+
+
+class TestRenderDescription:
+    def test_markdown(self):
+        html = render_description(
+            "# Краска\n\n**Белая**, для стен\n\n| a | b |\n|---|---|\n| 1 | 2 |"
+        )
+        assert "<h1>Краска</h1>" in html
+        assert "<strong>Белая</strong>" in html
+        assert "<table>" in html
+
+    def test_raw_html_is_escaped(self):
+        html = render_description('<script>alert(1)</script>\n\n<div onclick="x">Текст</div>')
+        assert "<script>" not in html
+        assert "<div" not in html
+        assert "&lt;script&gt;" in html
+
+    @pytest.mark.parametrize(
+        "url",
+        [
+            "javascript:alert(1)",
+            "JaVaScRiPt:alert(1)",
+            "java\tscript:x",
+            "data:text/html,x",
+            "&#106;avascript:alert(1)",
+            "&#x6A;avascript:alert(1)",
+            "&#100;ata:text/html,x",
+            "javascript&colon;alert(1)",
+            "java&#9;script:alert(1)",
+            "\x01javascript:alert(1)",
+            "java\x00script:alert(1)",
+        ],
+    )
+    def test_unsafe_urls_are_dropped(self, url):
+        html = render_description(f"[ссылка]({url}) ![картинка]({url})")
+        assert "<a>ссылка</a>" in html
+        assert "href" not in html
+        assert "src" not in html
+
+    @pytest.mark.parametrize(
+        "url", ["https://olki.ru", "/catalog", "mailto:info@olki.ru", "/search?q=a&amp;b=1"]
+    )
+    def test_safe_urls_are_kept(self, url):
+        assert f'href="{url}"' in render_description(f"[ссылка]({url})")
+
+
+@pytest.mark.django_db
+class TestDescriptionHtml:
+    def test_rendered_on_save(self):
+        product = Product.objects.create(name="Краска", description="**Белая**", price=100)
+        product.refresh_from_db()
+        assert product.description_html == "<p><strong>Белая</strong></p>"
+        assert product.description_html_version == RENDERER_VERSION
+
+    def test_update_fields(self):
+        product = Product.objects.create(name="Краска", description="Старое", price=100)
+
+        product.description = "Новое"
+        product.save(update_fields=["description"])
+        product.refresh_from_db()
+        assert product.description_html == "<p>Новое</p>"
+
+        with patch("products.models.render_description") as render:
+            product.price = 200
+            product.save(update_fields=["price"])
+        render.assert_not_called()
+
+    def test_serializer_exposes_html(self):
+        Product.objects.create(name="Краска", description="*Матовая*", price=100)
+        response = APIClient().get("/api/products/")
+        assert response.data["results"][0]["description_html"] == "<p><em>Матовая</em></p>"
+
+    def test_stale_version_rerendered_lazily(self):
+        product = Product.objects.create(name="Краска", description="*Матовая*", price=100)
+        Product.objects.filter(pk=product.pk).update(
+            description_html="old", description_html_version=0
+        )
+
+        response = APIClient().get(f"/api/products/{product.pk}/")
+
+        assert response.data["description_html"] == "<p><em>Матовая</em></p>"
+        product.refresh_from_db()
+        assert product.description_html_version == RENDERER_VERSION
+
+    def test_render_descriptions_command(self):
+        products = [
+            Product.objects.create(name=f"Краска {i}", description=f"**{i}**", price=100)
+            for i in range(5)
+        ]
+        Product.objects.filter(pk__in=[p.pk for p in products[:3]]).update(
+            description_html="", description_html_version=0
+        )
+
+        with patch("products.models.render_description", wraps=render_description) as render:
+            call_command("render_descriptions", "--batch-size", "2")
+        assert render.call_count == 3
+        assert not Product.objects.exclude(description_html_version=RENDERER_VERSION).exists()
+        assert (
+            Product.objects.get(pk=products[0].pk).description_html == "<p><strong>0</strong></p>"
+        )
+
+        with patch("products.models.render_description", wraps=render_description) as render:
+            call_command("render_descriptions", "--all")
+        assert render.call_count == 5
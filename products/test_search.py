@@ -0,0 +1,89 @@
+import pytest
+from django.db import connection
+from django.db.backends.postgresql.base import DatabaseWrapper
+from rest_framework.test import APIClient
+
+from .models import Product
+from .search import _fts5_query, _postgres_search, install_sqlite_fts, search_products
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def products(db):
+    return {
+        "white": Product.objects.create(
+            name="Белая краска", description="Для **стен** и потолков", price=100
+        ),
+        "enamel": Product.objects.create(
+            name="Эмаль для пола", description="Белая глянцевая эмаль", price=200
+        ),
+        "blue": Product.objects.create(name="Синяя краска", description="Facade paint", price=300),
+    }
+
+
+def names(queryset):
+    return [product.name for product in queryset]
+
+
+@pytest.mark.django_db
+class TestSqliteSearch:
+    def test_searches_name_and_description(self, products):
+        assert names(search_products(Product.objects.all(), "белая")) == [
+            "Белая краска",
+            "Эмаль для пола",
+        ]
+
+    def test_name_ranks_above_description(self, products):
+        assert names(search_products(Product.objects.all(), "эмаль"))[0] == "Эмаль для пола"
+
+    def test_prefix_and_case(self, products):
+        assert names(search_products(Product.objects.all(), "FAC")) == ["Синяя краска"]
+        assert set(names(search_products(Product.objects.all(), "КРАСК"))) == {
+            "Белая краска",
+            "Синяя краска",
+        }
+
+    def test_all_words_required(self, products):
+        assert names(search_products(Product.objects.all(), "белая краска")) == ["Белая краска"]
+
+    def test_index_follows_updates_and_deletes(self, products):
+        products["blue"].name = "Зеленая краска"
+        products["blue"].save()
+        products["white"].delete()
+
+        assert names(search_products(Product.objects.all(), "краска")) == ["Зеленая краска"]
+        assert names(search_products(Product.objects.all(), "синяя")) == []
+
+    def test_blank_query_keeps_queryset(self, products):
+        assert search_products(Product.objects.all(), "  ").count() == 3
+
+    def test_fts_syntax_is_escaped(self, products):
+        assert names(search_products(Product.objects.all(), 'краска" OR *')) == []
+        assert _fts5_query('a "b') == '"a"* """b"*'
+
+    def test_install_is_idempotent(self, products):
+        install_sqlite_fts(using=connection.alias)
+        assert search_products(Product.objects.all(), "синяя").count() == 1
+
+    def test_api_search(self, api_client, products):
+        response = api_client.get("/api/products/", {"search": "стен"})
+        assert [p["name"] for p in response.data["results"]] == ["Белая краска"]
+
+
+class TestPostgresSearch:
+    def test_query_uses_indexed_operators(self):
+        pg = DatabaseWrapper({**connection.settings_dict, "NAME": "olki"}, "pg")
+        sql, params = (
+            _postgres_search(Product.objects.all(), "белая краска")
+            .query.get_compiler(connection=pg)
+            .as_sql()
+        )
+
+        assert '"products_product"."search_vector" @@' in sql
+        assert '"products_product"."name" %%> %s' in sql
+        assert "websearch_to_tsquery" in sql
+        assert {"russian", "english"} <= set(params)
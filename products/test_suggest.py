@@ -0,0 +1,181 @@
+from unittest.mock import patch
+
+import pytest
+from django.db import DatabaseError, transaction
+from rest_framework.test import APIClient
+
+from .cache import invalidate
+from .models import Product
+from .suggest import SuggestIndex, get_suggest_index, warm_suggest_index
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    # Индекс процесса общий для всех тестов, а кэш с версией каталога очищается
+    index = get_suggest_index()
+    index.version = None
+    yield index
+    index.version = None
+
+
+@pytest.fixture
+def index():
+    index = SuggestIndex(check_interval=60)
+    index.build(
+        [
+            (1, "Белая краска"),
+            (2, "Эмаль для пола белая"),
+            (3, "Синяя краска для фасада"),
+            (4, "Ёлочная краска"),
+        ],
+        version=10,
+    )
+    return index
+
+
+def names(suggestions):
+    return [name for _, name in suggestions]
+
+
+class TestSuggestIndex:
+    def test_prefix_of_any_word(self, index):
+        assert names(index.suggest("бел")) == ["Белая краска", "Эмаль для пола белая"]
+
+    def test_all_words_must_match(self, index):
+        assert names(index.suggest("краска фас")) == ["Синяя краска для фасада"]
+
+    def test_shorter_names_first(self, index):
+        assert names(index.suggest("краска")) == [
+            "Белая краска",
+            "Ёлочная краска",
+            "Синяя краска для фасада",
+        ]
+
+    def test_yo_is_normalized(self, index):
+        assert names(index.suggest("елочная")) == ["Ёлочная краска"]
+
+    def test_typos_use_trigrams(self, index):
+        assert names(index.suggest("красак", limit=1)) == ["Белая краска"]
+        assert names(index.suggest("краска фосада")) == ["Синяя краска для фасада"]
+        assert index.suggest("зеленый") == []
+
+    def test_limit_and_blank_query(self, index):
+        assert len(index.suggest("к", limit=2)) == 2
+        assert index.suggest("  ") == []
+
+    def test_apply_next_version_keeps_index_current(self, index):
+        index.apply(5, "Белила", version=11)
+        index.apply(1, None, version=12)
+
+        assert names(index.suggest("бел")) == ["Белила", "Эмаль для пола белая"]
+        assert index.version == 12
+
+    def test_apply_after_foreign_change_marks_stale(self, index):
+        index.apply(1, "Белая эмаль", version=15)
+
+        assert names(index.suggest("белая эм"))[0] == "Белая эмаль"
+        assert index.version is None
+
+
+@pytest.mark.django_db
+class TestSuggestEndpoint:
+    def test_suggest_without_queries(self, api_client, django_assert_num_queries):
+        Product.objects.create(name="Белая краска", description="Desc", price=100)
+        Product.objects.create(name="Белила", description="Desc", price=100)
+        api_client.get("/api/products/suggest/", {"q": "x"})
+
+        with django_assert_num_queries(0):
+            response = api_client.get("/api/products/suggest/", {"q": "бел", "limit": 1})
+
+        assert response.status_code == 200
+        assert response.data == [{"id": Product.objects.get(name="Белила").id, "name": "Белила"}]
+
+    def test_signals_update_index_incrementally(
+        self, api_client, django_assert_num_queries, django_capture_on_commit_callbacks
+    ):
+        product = Product.objects.create(name="Белая краска", description="Desc", price=100)
+        api_client.get("/api/products/suggest/", {"q": "x"})
+
+        product.name = "Синяя краска"
+        with django_capture_on_commit_callbacks(execute=True):
+            product.save()
+        with django_assert_num_queries(0):
+            response = api_client.get("/api/products/suggest/", {"q": "син"})
+        assert [s["name"] for s in response.data] == ["Синяя краска"]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product.delete()
+        with django_assert_num_queries(0):
+            assert api_client.get("/api/products/suggest/", {"q": "син"}).data == []
+
+    def test_rolled_back_rename_leaves_index_untouched(
+        self, api_client, fresh_index, django_assert_num_queries
+    ):
+        product = Product.objects.create(name="Белая краска", description="Desc", price=100)
+        api_client.get("/api/products/suggest/", {"q": "x"})
+        version = fresh_index.version
+
+        with pytest.raises(RuntimeError), transaction.atomic():
+            product.name = "Синяя краска"
+            product.save()
+            raise RuntimeError("rollback")
+
+        assert fresh_index.version == version
+        with django_assert_num_queries(0):
+            assert api_client.get("/api/products/suggest/", {"q": "син"}).data == []
+            response = api_client.get("/api/products/suggest/", {"q": "бел"})
+        assert [s["name"] for s in response.data] == ["Белая краска"]
+
+    def test_rebuilds_after_change_in_another_process(
+        self, api_client, fresh_index, django_capture_on_commit_callbacks
+    ):
+        api_client.get("/api/products/suggest/", {"q": "x"})
+        with (
+            patch("products.signals.get_suggest_index"),
+            django_capture_on_commit_callbacks(execute=True),
+        ):
+            # Изменение сделано другим процессом: свой индекс о нем не знает
+            Product.objects.create(name="Белая краска", description="Desc", price=100)
+        assert api_client.get("/api/products/suggest/", {"q": "бел"}).data == []
+
+        fresh_index.checked_at -= fresh_index.check_interval
+        response = api_client.get("/api/products/suggest/", {"q": "бел"})
+        assert [s["name"] for s in response.data] == ["Белая краска"]
+
+    def test_invalid_limit(self, api_client):
+        Product.objects.create(name="Белая краска", description="Desc", price=100)
+        response = api_client.get("/api/products/suggest/", {"q": "бел", "limit": "many"})
+        assert len(response.data) == 1
+
+    def test_unchanged_version_keeps_index(self, api_client, fresh_index):
+        api_client.get("/api/products/suggest/", {"q": "x"})
+        fresh_index.checked_at -= fresh_index.check_interval
+        with patch.object(fresh_index, "rebuild") as rebuild:
+            api_client.get("/api/products/suggest/", {"q": "x"})
+        rebuild.assert_not_called()
+
+    def test_changed_version_rebuilds(self, api_client, fresh_index):
+        api_client.get("/api/products/suggest/", {"q": "x"})
+        invalidate()
+        fresh_index.checked_at -= fresh_index.check_interval
+        with patch.object(fresh_index, "rebuild") as rebuild:
+            api_client.get("/api/products/suggest/", {"q": "x"})
+        rebuild.assert_called_once()
+
+
+@pytest.mark.django_db
+def test_warm_suggest_index(fresh_index):
+    Product.objects.create(name="Белая краска", description="Desc", price=100)
+    warm_suggest_index()
+    assert names(fresh_index.suggest("бел")) == ["Белая краска"]
+
+
+def test_warm_suggest_index_without_database(fresh_index):
+    with patch.object(fresh_index, "rebuild", side_effect=DatabaseError):
+        warm_suggest_index()
+    assert fresh_index.version is None
@@ -1,27 +1,94 @@
+from django.conf import settings
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from olki_backend.export import ExportMixin
+from olki_backend.fieldsets import SparseFieldsetMixin
+
+from .cache import cached_response
+from .conditional import catalog_validators, conditional_response, product_validators
 from .models import Product
+from .search import search_products
 from .serializers import ProductSerializer
+from .suggest import get_suggest_index
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ExportMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet для работы с продукцией"""
 
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    export_name = "products"
+    export_fields = (
+        "id",
+        "sku",
+        "name",
+        "description",
+        "price",
+        "image",
+        "created_at",
+        "updated_at",
+    )
 
     def get_queryset(self):
-        queryset = Product.objects.all()
+        # search_vector нужен только для фильтра в БД, не для ответа
+        queryset = Product.objects.defer("search_vector")
         search = self.request.query_params.get("search", None)
         if search:
-            queryset = queryset.filter(name__icontains=search)
+            queryset = search_products(queryset, search)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            *catalog_validators(request, "list", self.get_queryset()),
+            lambda: cached_response(
+                request, "list", lambda: super(ProductViewSet, self).list(request)
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_field]
+        if not pk.isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        # Ключ версии строится по int, как в сигнале: "05" и "5" - один продукт
+        pk = int(pk)
+        return conditional_response(
+            request,
+            *product_validators(request, self.get_queryset(), pk),
+            lambda: cached_response(
+                request,
+                "retrieve",
+                lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs),
+                pk=pk,
+            ),
+        )
+
     @action(detail=False, methods=["get"])
     def featured(self, request):
         """Получить избранные продукты (первые 3)"""
-        products = self.get_queryset()[:3]
+        return conditional_response(
+            request,
+            *catalog_validators(request, "featured", self.get_queryset()),
+            lambda: cached_response(request, "featured", lambda: self.featured_response()),
+        )
+
+    @action(detail=False, methods=["get"])
+    def suggest(self, request):
+        """Автодополнение по названиям из индекса в памяти, без запросов к БД"""
+        try:
+            limit = int(request.query_params.get("limit", settings.SUGGEST_LIMIT))
+        except ValueError:
+            limit = settings.SUGGEST_LIMIT
+        limit = max(1, min(limit, settings.SUGGEST_MAX_LIMIT))
+
+        index = get_suggest_index()
+        index.ensure_current()
+        suggestions = index.suggest(request.query_params.get("q", ""), limit)
+        return Response([{"id": pk, "name": name} for pk, name in suggestions])
+
+    def featured_response(self):
+        products = self.filter_queryset(self.get_queryset())[:3]
         serializer = self.get_serializer(products, many=True)
         return Response(serializer.data)